@@ -1,8 +1,20 @@
 import streamlit as st
 import pandas as pd
-import os
-import hashlib
-from utils import load_users, load_scores, load_questions
+from bootstrap import startup_profile
+from bulk_io import FORMATS, detect_format
+from media import is_valid_reference
+from metrics import render_prometheus, snapshot
+from retention import RETENTION_DAYS, cutoff
+from score_writer import FlushTimeout
+from utils import (
+    UserExists, search_users, find_user, save_user, update_user_role, update_user_password, delete_user,
+    search_scores, update_scores, delete_user_scores,
+    load_question_page, add_question, upsert_questions, delete_questions,
+    import_questions, export_questions, cache_stats, score_queue_depth,
+    get_question_stats, compact_answer_log, compact_scores, archive_overview, export_archived_scores
+)
+
+PAGE_SIZE = 50  # Rows sent to the browser per table page
 
 def show_admin_panel():
     if not st.session_state.get("is_admin", False):
@@ -15,7 +27,7 @@ def show_admin_panel():
     st.write(f"Welcome, {st.session_state.username}!")
     
     # Create tabs for different admin functions
-    tab1, tab2, tab3 = st.tabs(["User Management", "Question Management", "View Scores"])
+    tab1, tab2, tab3, tab4 = st.tabs(["User Management", "Question Management", "View Scores", "Performance"])
     
     with tab1:
         show_user_management()
@@ -25,25 +37,68 @@ def show_admin_panel():
     
     with tab3:
         show_all_scores()
+    
+    with tab4:
+        show_performance()
+
+def table_controls(key, sort_options, descending=False):
+    """Show search and sort controls for a paged table; returns (prefix, sort column, descending)"""
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        prefix = st.text_input("Search by username prefix", key=f"{key}_search")
+    with col2:
+        sort_label = st.selectbox("Sort by", list(sort_options), key=f"{key}_sort")
+    with col3:
+        descending = st.checkbox("Descending", value=descending, key=f"{key}_descending")
+    return prefix.strip(), sort_options[sort_label], descending
+
+def load_page(key, query):
+    """Run ``query(offset, limit)`` for the current page of a table; returns (rows, total, page count)"""
+    page_number = st.session_state.get(f"{key}_page", 1)
+    rows, total = query((page_number - 1) * PAGE_SIZE, PAGE_SIZE)
+    page_count = max(1, -(-total // PAGE_SIZE))
+    if page_number > page_count:
+        # The table shrank or the search narrowed; show its last page instead
+        page_number = page_count
+        rows, total = query((page_number - 1) * PAGE_SIZE, PAGE_SIZE)
+    st.session_state[f"{key}_page"] = page_number
+    return rows, total, page_count
+
+def page_selector(key, page_count):
+    st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key=f"{key}_page")
 
 def show_user_management():
     st.header("User Management")
     
-    # Load users
-    users = load_users()
+    # Only the visible page of users is loaded and sent to the browser
+    prefix, sort_by, descending = table_controls("users", {"Username": "name", "Role": "role"})
+    users, total, page_count = load_page(
+        "users", lambda offset, limit: search_users(prefix, sort_by, descending, offset, limit)
+    )
     
     # Display users with edit functionality
-    with st.expander("All Users", expanded=True):
+    with st.expander(f"Users ({total} found)", expanded=True):
         edited_users = st.data_editor(
-            users[["id", "name", "role"]], 
+            users, 
             use_container_width=True,
-            num_rows="dynamic", 
             column_config={
                 "id": st.column_config.TextColumn("ID", disabled=True),
-                "name": st.column_config.TextColumn("Username"),
+                "name": st.column_config.TextColumn("Username", disabled=True),
                 "role": st.column_config.SelectboxColumn("Role", options=["user", "admin"])
             }
         )
+        page_selector("users", page_count)
+    
+    # Save role changes made on this page
+    if st.button("Save Changes to Users"):
+        changed = edited_users[edited_users["role"] != users["role"]]
+        if (changed["name"] == st.session_state.username).any():
+            st.error("You cannot remove your own admin privileges.")
+        else:
+            for user_id, role in zip(changed["id"], changed["role"]):
+                update_user_role(user_id, role)
+            st.success(f"Updated {len(changed)} user(s)")
+            st.experimental_rerun()
     
     # User selection for detailed actions
     if not users.empty:
@@ -59,17 +114,14 @@ def show_user_management():
                 if selected_user == st.session_state.username and new_role != "admin":
                     st.error("You cannot remove your own admin privileges.")
                 else:
-                    users.loc[users["name"] == selected_user, "role"] = new_role
-                    users.to_csv("data/users.csv", index=False)
+                    update_user_role(user_id, new_role)
                     st.success(f"Updated {selected_user}'s role to {new_role}")
                     st.experimental_rerun()
             
             # Reset password
             new_password = st.text_input("New password:", type="password")
             if st.button("Reset Password") and new_password:
-                hashed_password = hashlib.sha256(new_password.encode()).hexdigest()
-                users.loc[users["id"] == user_id, "password"] = hashed_password
-                users.to_csv("data/users.csv", index=False)
+                update_user_password(user_id, new_password)
                 st.success(f"Password for {selected_user} has been reset")
         
         with col2:
@@ -78,8 +130,7 @@ def show_user_management():
                 if selected_user == st.session_state.username:
                     st.error("You cannot delete your own account.")
                 else:
-                    users = users[users["name"] != selected_user]
-                    users.to_csv("data/users.csv", index=False)
+                    delete_user(user_id)
                     st.success(f"User {selected_user} has been deleted")
                     st.experimental_rerun()
     
@@ -97,53 +148,112 @@ def show_user_management():
     
     if st.button("Add User"):
         if new_username and new_password:
-            if new_username in users["name"].values:
+            if find_user(new_username) is not None:
                 st.error("Username already exists")
             else:
                 # Create user
-                user_id = str(pd.util.hash_pandas_object([new_username])[0])
-                hashed_password = hashlib.sha256(new_password.encode()).hexdigest()
-                
-                new_user = pd.DataFrame({
-                    "id": [user_id],
-                    "name": [new_username],
-                    "password": [hashed_password],
-                    "role": [new_role]
-                })
-                
-                users = pd.concat([users, new_user], ignore_index=True)
-                users.to_csv("data/users.csv", index=False)
-                st.success(f"User {new_username} added successfully")
-                st.experimental_rerun()
+                try:
+                    save_user(new_username, new_password, role=new_role)
+                except UserExists:
+                    st.error("Username already exists")
+                else:
+                    st.success(f"User {new_username} added successfully")
+                    st.experimental_rerun()
         else:
             st.error("Username and password are required")
 
 def show_question_management():
     st.header("Question Management")
     
-    # Load questions
-    questions = load_questions()
+    # Only one page of the bank is sent to the browser at a time
+    questions, total, page_count = load_page("questions", load_question_page)
     
     # Display and edit questions
-    with st.expander("All Questions", expanded=True):
+    with st.expander(f"Questions ({total} in total)", expanded=True):
         edited_questions = st.data_editor(
             questions,
             use_container_width=True,
             num_rows="dynamic",
             column_config={
+                "id": st.column_config.NumberColumn("ID", disabled=True),
                 "question": st.column_config.TextColumn("Question"),
                 "option_a": st.column_config.TextColumn("Option A"),
                 "option_b": st.column_config.TextColumn("Option B"),
                 "option_c": st.column_config.TextColumn("Option C"),
                 "option_d": st.column_config.TextColumn("Option D"),
-                "correct": st.column_config.SelectboxColumn("Correct Answer", options=["A", "B", "C", "D"])
+                "correct": st.column_config.SelectboxColumn("Correct Answer", options=["A", "B", "C", "D"]),
+                "media": st.column_config.TextColumn("Audio Clip", help="File in data/media, optionally with #t=start,end")
             }
         )
+        page_selector("questions", page_count)
     
-    # Save changes to questions
+    # Save changes to the questions on this page
     if st.button("Save Changes to Questions"):
-        edited_questions.to_csv("data/questions.csv", index=False)
-        st.success("Questions updated successfully")
+        media = edited_questions["media"].dropna().astype(str).str.strip()
+        bad_media = media[(media != "") & ~media.map(is_valid_reference)]
+        if not bad_media.empty:
+            st.error(f"Invalid audio clip: {bad_media.iloc[0]}. Use a file in data/media, optionally followed by #t=start,end")
+        else:
+            removed = set(questions["id"]) - set(edited_questions["id"].dropna())
+            if removed:
+                delete_questions(removed)
+            upsert_questions(edited_questions)
+            st.success("Questions updated successfully")
+    
+    # Answer statistics for the questions on this page, from the compacted event log
+    st.subheader("Answer Statistics")
+    stats = get_question_stats(questions["id"].tolist())
+    stats = questions[["id", "question"]].merge(stats, on="id")
+    st.dataframe(
+        stats,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "id": st.column_config.NumberColumn("ID"),
+            "question": st.column_config.TextColumn("Question"),
+            "answers": st.column_config.NumberColumn("Answers"),
+            "accuracy": st.column_config.ProgressColumn("Accuracy", min_value=0, max_value=1, format="%.2f"),
+            "avg_seconds": st.column_config.NumberColumn("Avg. seconds", format="%.1f"),
+            "timeouts": st.column_config.NumberColumn("Timeouts")
+        }
+    )
+    if st.button("Refresh Statistics"):
+        compact_answer_log()
+        st.experimental_rerun()
+    
+    # Bulk import and export
+    st.markdown("---")
+    st.subheader("Bulk Import / Export")
+    
+    uploaded = st.file_uploader("Import questions", type=[extension[1:] for extension in FORMATS])
+    st.caption("Rows with an existing ID update that question; rows without one are added.")
+    if uploaded is not None and st.button("Import Questions"):
+        progress = st.empty()
+        try:
+            report = import_questions(
+                uploaded, detect_format(uploaded.name),
+                on_progress=lambda report: progress.text(f"{report.rows} rows processed...")
+            )
+        except ValueError as e:
+            st.error(f"Import failed: {e}")
+        else:
+            progress.empty()
+            st.success(f"{report.rows} rows read: {report.inserted} added, {report.updated} updated, {report.error_count} rejected")
+            if report.errors:
+                st.dataframe(pd.DataFrame(report.errors, columns=["Row", "Problem"]), use_container_width=True, hide_index=True)
+                if report.error_count > len(report.errors):
+                    st.caption(f"Showing the first {len(report.errors)} of {report.error_count} problems.")
+    
+    export_format = st.selectbox("Export format", ["csv", "jsonl", "parquet"])
+    if st.button("Prepare Export"):
+        # Written to a temporary file in chunks, which is removed once the button has it
+        with export_questions(export_format) as exported:
+            st.download_button(
+                "Download questions",
+                exported,
+                file_name=f"questions.{export_format}",
+                mime="application/octet-stream"
+            )
     
     # Add new question section
     st.markdown("---")
@@ -160,21 +270,17 @@ def show_question_management():
         option_d = st.text_input("Option D")
     
     correct_answer = st.selectbox("Correct Answer", ["A", "B", "C", "D"])
+    media = st.text_input(
+        "Audio clip (optional)",
+        help="File in data/media, e.g. hymns/amazing_grace.mp3#t=30,45 for seconds 30 to 45"
+    ).strip()
     
     if st.button("Add Question"):
-        if new_question and option_a and option_b and option_c and option_d:
+        if media and not is_valid_reference(media):
+            st.error("The audio clip must be a file in data/media, optionally followed by #t=start,end")
+        elif new_question and option_a and option_b and option_c and option_d:
             # Create question
-            new_question_df = pd.DataFrame({
-                "question": [new_question],
-                "option_a": [option_a],
-                "option_b": [option_b],
-                "option_c": [option_c],
-                "option_d": [option_d],
-                "correct": [correct_answer]
-            })
-            
-            questions = pd.concat([questions, new_question_df], ignore_index=True)
-            questions.to_csv("data/questions.csv", index=False)
+            add_question(new_question, option_a, option_b, option_c, option_d, correct_answer, media)
             st.success("Question added successfully")
             st.experimental_rerun()
         else:
@@ -183,50 +289,50 @@ def show_question_management():
 def show_all_scores():
     st.header("All Scores")
     
-    # Load scores and users
-    scores = load_scores()
-    users = load_users()
+    prefix, sort_by, descending = table_controls(
+        "scores", {"Date": "date", "Score": "score", "Player": "name"}, descending=True
+    )
+    try:
+        all_scores, total, page_count = load_page(
+            "scores", lambda offset, limit: search_scores(prefix, sort_by, descending, offset, limit)
+        )
+    except FlushTimeout as e:
+        st.error(str(e))
+        return
     
-    if scores.empty:
-        st.info("No scores recorded yet.")
+    if all_scores.empty:
+        st.info("No scores found.")
     else:
-        # Convert user_id in scores to the same type as id in users
-        scores['user_id'] = scores['user_id'].astype(str)
-        
-        # Now merge should work
-        all_scores = scores.merge(users[["id", "name"]], left_on="user_id", right_on="id")
-        
-        # Sort by score (highest first)
-        all_scores = all_scores.sort_values(["score", "date"], ascending=[False, True])
-
-        # Keep only the highest score per user
-        all_scores = all_scores.sort_values("score", ascending=False).drop_duplicates(subset=["user_id"])
-        
         # Display scores with ability to edit
-        with st.expander("All Scores", expanded=True):
-            display_scores = all_scores[["name", "score", "date", "user_id"]].reset_index(drop=True)
-            display_scores.columns = ["Player", "Score", "Date", "User ID"]
+        with st.expander(f"Scores ({total} found)", expanded=True):
+            display_scores = all_scores[["id", "name", "score", "date", "user_id"]]
+            display_scores.columns = ["Score ID", "Player", "Score", "Date", "User ID"]
             
             edited_scores = st.data_editor(
                 display_scores,
                 use_container_width=True,
+                hide_index=True,
                 column_config={
+                    "Score ID": None,
                     "Player": st.column_config.TextColumn("Player", disabled=True),
                     "Score": st.column_config.NumberColumn("Score", min_value=0, max_value=20),
                     "Date": st.column_config.TextColumn("Date"),
                     "User ID": st.column_config.TextColumn("User ID", disabled=True)
                 }
             )
+            page_selector("scores", page_count)
         
-        # Save edited scores
+        # Save only the rows that changed, keyed by score ID
         if st.button("Save Changes to Scores"):
-            # Convert back to original format
-            for i, row in edited_scores.iterrows():
-                scores.loc[scores['user_id'] == row['User ID'], 'score'] = row['Score']
-                scores.loc[scores['user_id'] == row['User ID'], 'date'] = row['Date']
-            
-            scores.to_csv("data/scores.csv", index=False)
-            st.success("Scores updated successfully")
+            before = display_scores.set_index("Score ID")[["Score", "Date"]]
+            after = edited_scores.set_index("Score ID")[["Score", "Date"]]
+            changed = after[(after != before).any(axis=1)]
+            try:
+                update_scores(changed.reset_index().rename(columns={"Score ID": "id", "Score": "score", "Date": "date"}))
+            except FlushTimeout as e:
+                st.error(str(e))
+            else:
+                st.success(f"Updated {len(changed)} score(s)")
         
         # Delete score functionality
         st.markdown("---")
@@ -235,7 +341,109 @@ def show_all_scores():
         selected_player = st.selectbox("Select a player:", display_scores["Player"].unique())
         if st.button("Delete All Scores for Selected Player"):
             user_id = all_scores.loc[all_scores["name"] == selected_player, "user_id"].values[0]
-            scores = scores[scores["user_id"] != user_id]
-            scores.to_csv("data/scores.csv", index=False)
-            st.success(f"Deleted all scores for {selected_player}")
-            st.experimental_rerun()
+            try:
+                delete_user_scores(user_id)
+            except FlushTimeout as e:
+                st.error(str(e))
+            else:
+                st.success(f"Deleted all scores for {selected_player}")
+                st.experimental_rerun()
+    
+    show_archived_scores()
+
+def show_archived_scores():
+    # Old scores live on as monthly summaries and compressed archive files
+    st.markdown("---")
+    st.subheader("Archived Scores")
+    st.caption(
+        f"Scores stay in the table above for {RETENTION_DAYS} days. Compacting moves every month before "
+        f"{cutoff():%Y-%m-%d} into the archive; the leaderboard and player statistics still count them."
+    )
+    if st.button("Compact Old Scores"):
+        try:
+            archived = compact_scores()
+        except FlushTimeout as e:
+            st.error(str(e))
+        else:
+            if archived:
+                st.success(f"Archived {sum(archived.values())} score(s) from {len(archived)} month(s)")
+            else:
+                st.info("No scores are old enough to archive.")
+    
+    archive = archive_overview()
+    if archive.empty:
+        st.info("Nothing has been archived yet.")
+        return
+    display_archive = archive.assign(size=(archive["bytes"] / 1024).round(1))[["period", "games", "players", "size"]]
+    display_archive.columns = ["Month", "Games", "Players", "Size (KB)"]
+    st.dataframe(display_archive, use_container_width=True, hide_index=True)
+    
+    periods = st.multiselect("Months to export", archive["period"].tolist(), default=archive["period"].tolist())
+    archive_format = st.selectbox("Archive export format", ["csv", "jsonl", "parquet"])
+    if st.button("Prepare Archive Export"):
+        st.download_button(
+            "Download archived scores",
+            export_archived_scores(archive_format, periods),
+            file_name=f"archived_scores.{archive_format}",
+            mime="application/octet-stream"
+        )
+
+
+def show_performance():
+    st.header("Performance")
+    
+    data = snapshot()
+    cache = cache_stats()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Active sessions", data["gauges"]["quiz_active_sessions"][()])
+    col2.metric("Cache hit rate", f"{cache['hit_rate']:.0%}")
+    col3.metric("Cached tables", f"{cache['entries']} ({cache['bytes'] / 1024:.0f} KB)")
+    col4.metric("Scores queued", score_queue_depth())
+    
+    # Latency per page handler and per data function
+    def latency_table(metric, label):
+        rows = [
+            {
+                label: dict(labels).get(label.lower(), ""),
+                "Calls": h["count"],
+                "p50 (ms)": round(h["p50"] * 1000, 1),
+                "p95 (ms)": round(h["p95"] * 1000, 1),
+                "p99 (ms)": round(h["p99"] * 1000, 1),
+                "Total (s)": round(h["sum"], 2)
+            }
+            for (name, labels), h in data["histograms"].items()
+            if name == metric
+        ]
+        return pd.DataFrame(rows).sort_values("Total (s)", ascending=False) if rows else pd.DataFrame()
+    
+    st.subheader("Page runs")
+    st.dataframe(latency_table("quiz_page_seconds", "Page"), use_container_width=True, hide_index=True)
+    
+    st.subheader("Data functions")
+    st.dataframe(latency_table("quiz_data_seconds", "Function"), use_container_width=True, hide_index=True)
+    
+    # One-time costs of this process: bootstrap steps and first imports of page modules
+    st.subheader("Startup")
+    profile = startup_profile()
+    rerun_setup = [h for (name, _), h in data["histograms"].items() if name == "quiz_rerun_setup_seconds"]
+    if rerun_setup:
+        st.caption(f"Per-rerun app.py overhead before routing: p50 {rerun_setup[0]['p50'] * 1000:.1f} ms, p95 {rerun_setup[0]['p95'] * 1000:.1f} ms")
+    startup = pd.DataFrame(
+        [{"Phase": "bootstrap", "Step": name, "ms": round(seconds * 1000, 1)} for name, seconds in profile["bootstrap"]]
+        + [{"Phase": "page import", "Step": name, "ms": round(seconds * 1000, 1)} for name, seconds in profile["imports"]]
+    )
+    st.dataframe(startup, use_container_width=True, hide_index=True)
+    
+    # Storage I/O and other counters
+    st.subheader("Counters")
+    counters = pd.DataFrame(
+        [
+            {"Metric": name, "Labels": ", ".join(f"{k}={v}" for k, v in labels), "Value": value}
+            for (name, labels), value in sorted(data["counters"].items())
+            if not name.startswith(("quiz_page_", "quiz_data_", "quiz_startup_", "quiz_rerun_"))
+        ]
+    )
+    st.dataframe(counters, use_container_width=True, hide_index=True)
+    
+    st.download_button("Download Prometheus metrics", render_prometheus(), file_name="metrics.prom")
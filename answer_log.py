@@ -0,0 +1,172 @@
+"""Append-only log of every answer and timeout, with per-question aggregates.
+
+``record`` only appends an event to an in-memory buffer; a background thread
+writes the buffer to ``answers.log`` in batches (once ``batch_size`` events
+are waiting or ``flush_interval`` seconds have passed), so answering a
+question never waits for the disk. Each event is one CSV line::
+
+    timestamp,user_id,question_id,choice,seconds,correct
+
+where ``choice`` is empty for a timeout and ``seconds`` is measured from the
+question's ``timer_start``. Every ``compact_interval`` seconds the same
+thread folds the lines written since the last compaction into per-question
+totals (answers, correct, timeouts, summed response time) and saves them
+with the log offset they cover in ``question_stats.json``, so neither a
+restart nor the admin tab ever rescans the whole log. Listeners hear which
+questions each compaction changed. A crash can lose at most the last
+unflushed batch, which is acceptable for analytics.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+# --- Configuration ---
+BATCH_SIZE = int(os.environ.get("QUIZ_EVENT_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.environ.get("QUIZ_EVENT_FLUSH_SECONDS", "1"))
+COMPACT_INTERVAL = float(os.environ.get("QUIZ_EVENT_COMPACT_SECONDS", "30"))
+
+# Per-question totals: [answers, correct, timeouts, seconds]
+ANSWERS, CORRECT, TIMEOUTS, SECONDS = range(4)
+
+
+class AnswerLog:
+    """Buffered answer event log with a background compactor"""
+
+    def __init__(self, log_path, stats_path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 compact_interval=COMPACT_INTERVAL):
+        self.log_path = log_path
+        self.stats_path = stats_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._compact_lock = threading.Lock()
+        self._totals = {}  # question_id -> totals list
+        self._offset = 0   # Bytes of the log already folded into _totals
+        self._listeners = []
+        self._thread = None
+        self._stopping = False
+
+    def add_listener(self, callback):
+        """Call ``callback({question_id: totals})`` with the questions each compaction changed"""
+        self._listeners.append(callback)
+
+    def start(self):
+        """Load the saved aggregates and start the background thread"""
+        if os.path.exists(self.stats_path):
+            with open(self.stats_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            self._offset = saved["offset"]
+            self._totals = {int(question_id): totals for question_id, totals in saved["questions"].items()}
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) < self._offset:
+            # The log was removed or replaced; start over
+            self._offset, self._totals = 0, {}
+        self._thread = threading.Thread(target=self._run, name="answer-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def record(self, user_id, question_id, choice, seconds, correct):
+        """Queue one answer event; ``choice`` is None for a timeout"""
+        line = f"{time.time():.3f},{user_id},{int(question_id)},{choice or ''},{seconds:.3f},{int(bool(correct))}\n"
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.notify()
+
+    def pending(self):
+        """Return the number of events not written to the log yet"""
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """Write every buffered event to the log now"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            # One append per batch; O_APPEND keeps lines whole across processes
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("".join(batch))
+        except OSError:
+            with self._lock:
+                self._buffer = batch + self._buffer
+            raise
+
+    def compact(self):
+        """Fold log lines written since the last compaction into the per-question totals"""
+        with self._compact_lock:
+            if not os.path.exists(self.log_path):
+                return
+            with open(self.log_path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+            # Leave a line that is still being written for next time
+            end = data.rfind(b"\n") + 1
+            if end == 0:
+                return
+            totals = {question_id: list(values) for question_id, values in self._totals.items()}
+            changed = set()
+            for line in data[:end].decode("utf-8").splitlines():
+                try:
+                    _, _, question_id, choice, seconds, correct = line.split(",")
+                    question_id, seconds, correct = int(question_id), float(seconds), correct == "1"
+                except ValueError:
+                    continue
+                entry = totals.setdefault(question_id, [0, 0, 0, 0.0])
+                changed.add(question_id)
+                if choice:
+                    entry[ANSWERS] += 1
+                    entry[CORRECT] += correct
+                    entry[SECONDS] += seconds
+                else:
+                    entry[TIMEOUTS] += 1
+            self._totals, self._offset = totals, self._offset + end
+            self._save()
+        for callback in self._listeners:
+            callback({question_id: totals[question_id] for question_id in changed})
+
+    def question_stats(self):
+        """Return {question_id: totals list} as of the last compaction"""
+        return self._totals
+
+    def stop(self):
+        """Write what is buffered, compact it and stop the thread"""
+        if self._thread is None or self._stopping:
+            return
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+        self.compact()
+
+    # --- Internals ---
+    def _run(self):
+        next_compaction = time.monotonic() + self.compact_interval
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            if stopping:
+                return
+            try:
+                self.flush()
+                if time.monotonic() >= next_compaction:
+                    self.compact()
+                    next_compaction = time.monotonic() + self.compact_interval
+            except OSError:
+                # Try again on the next round
+                time.sleep(self.flush_interval)
+
+    def _save(self):
+        tmp_path = f"{self.stats_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"offset": self._offset, "questions": self._totals}, f)
+        os.replace(tmp_path, self.stats_path)
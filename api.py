@@ -0,0 +1,309 @@
+"""JSON API over the quiz engine for kiosks and other non-browser clients.
+
+Runs the same game rules as the Streamlit pages (``engine.py``) on tornado's
+event loop, so each request is a dictionary lookup and a few engine calls
+instead of a whole page rerun. Games are kept in memory by this process and
+identified by an unguessable ``game_id``; games idle for
+``QUIZ_API_GAME_IDLE_SECONDS`` are dropped. Password checks, score saves and
+leaderboard reads run on a thread pool, so hashing and storage I/O never
+stall the event loop. Start it next to the app, sharing its data directory::
+
+    python api.py --port 8600
+
+Endpoints (request and response bodies are JSON):
+
+- ``POST /api/games`` ``{"username", "password", "adaptive"}``: start a game.
+  Without credentials the game is anonymous and its score is not saved.
+- ``GET /api/games/<game_id>``: the current question, score and deadline
+- ``POST /api/games/<game_id>/answer`` ``{"choice": "A"}``: answer it
+- ``POST /api/games/<game_id>/next``: move on; the score is saved when the
+  last question has been played
+- ``GET /api/leaderboard?window=all&limit=10``: best score per player
+- ``GET /media/<file>``: prepared audio clips (see ``media.py``), with
+  range requests, and ``/media/source/<file>`` for untrimmed sources whose
+  clip is still being built; questions with a clip carry its ``media_url``,
+  and once a question is answered ``next_media_url`` lets clients prefetch
+  the next
+
+Errors are ``{"error": message}`` with a 4xx status. Too many login
+attempts for one account from one client, or from one address, and too many
+score saves by one player get ``429``; when the server is
+overloaded, logins and score saves get ``503``. Both carry ``Retry-After``
+(see ``ratelimit.py``); a game whose score could not be saved reports
+``"score_saved": false`` and saves it on a later ``/next``.
+"""
+import os
+
+# Scores are journaled per process; keep clear of the Streamlit workers' journals
+os.environ.setdefault("QUIZ_WORKER_ID", "api")
+
+import argparse
+import json
+import secrets
+import time
+
+import tornado.ioloop
+import tornado.web
+
+import engine
+import media
+import metrics
+from passwords import PasswordPoolBusy
+from ranking import WINDOWS
+from ratelimit import (
+    RateLimited, auth_keys, auth_limiter, auth_queue, client_address, guarded, score_keys, score_limiter, write_queue
+)
+from utils import authenticate, get_question, get_top_scores, load_questions, question_count, rebuild_leaderboard
+
+# --- Configuration ---
+GAME_IDLE_SECONDS = float(os.environ.get("QUIZ_API_GAME_IDLE_SECONDS", "1800"))
+MAX_GAMES = int(os.environ.get("QUIZ_API_MAX_GAMES", "10000"))
+LEADERBOARD_TTL = 1.0  # Seconds a leaderboard response is reused
+LEADERBOARD_LIMIT = 100
+
+_games = {}        # game_id -> {"game": engine state, "user_id", "last_active"}
+_leaderboards = {}  # (window, limit) -> (expires, body)
+
+metrics.gauge("quiz_api_games", lambda: {(): len(_games)}, description="Games held by the JSON API")
+
+
+def _media_url(question):
+    """Return the URL of a question's audio clip on this server, or None"""
+    reference = media.question_media(question) if question is not None else None
+    if reference is None:
+        return None
+    try:
+        # Never waits for a build on the event loop; the source is served until the clip is ready
+        return media.clip_url(media.prepare_clip(reference, wait=False), base="/media")
+    except media.MediaError:
+        return None
+
+
+def game_view(game_id, entry, now):
+    """Return the client's view of a game: never includes the correct answer before it is given"""
+    game = entry["game"]
+    question = engine.current_question(game, now)
+    view = {
+        "game_id": game_id,
+        "score": game["score"],
+        "total": engine.total_questions(game),
+        "finished": question is None,
+    }
+    if question is not None:
+        view.update({
+            "number": game["question_index"] + 1,
+            "question": question["question"],
+            "options": {option: question[f"option_{option.lower()}"] for option in ("A", "B", "C", "D")},
+            "answered": game["answered"],
+            "deadline": game["deadline"],
+            "remaining": engine.remaining_seconds(game, now),
+            "media_url": _media_url(question),
+        })
+        next_id = engine.next_question_id(game)
+        if game["answered"] and next_id is not None:
+            view["next_media_url"] = _media_url(get_question(next_id))
+    return view
+
+
+def sweep_games(now=None):
+    """Drop games nobody has touched for GAME_IDLE_SECONDS"""
+    cutoff = (time.monotonic() if now is None else now) - GAME_IDLE_SECONDS
+    for game_id in [game_id for game_id, entry in _games.items() if entry["last_active"] < cutoff]:
+        del _games[game_id]
+
+
+def _authenticate(username, password):
+    """Check a password on an executor thread, holding an auth admission slot"""
+    with auth_queue.admit():
+        return authenticate(username, password)
+
+
+def _finish(game, user_id, now):
+    """Save a finished game's score on an executor thread; returns the RateLimited refusal, if any"""
+    try:
+        # Never wait for a slot: if the writers are busy the client calls /next again
+        with guarded(score_limiter, write_queue, score_keys(user_id), timeout=0):
+            engine.finish(game, user_id, now)
+    except RateLimited as e:
+        return e
+    return None
+
+
+class JSONHandler(tornado.web.RequestHandler):
+    """Base handler: JSON bodies in and out, JSON errors, request timing"""
+
+    def prepare(self):
+        self.set_header("Content-Type", "application/json")
+        self.body = {}
+        if self.request.body:
+            try:
+                self.body = json.loads(self.request.body)
+            except ValueError:
+                raise tornado.web.HTTPError(400, reason="Request body is not valid JSON")
+            if not isinstance(self.body, dict):
+                raise tornado.web.HTTPError(400, reason="Request body must be a JSON object")
+
+    def write_error(self, status_code, **kwargs):
+        # Headers set before the error was raised have been cleared by now
+        if getattr(self, "retry_after", None):
+            self.set_header("Retry-After", str(self.retry_after))
+        self.finish({"error": self._reason})
+
+    def refuse(self, error):
+        """Turn a ratelimit.RateLimited error into 429 (this client) or 503 (overload) with Retry-After"""
+        self.retry_after = max(1, round(error.retry_after))
+        if error.scope == "client":
+            raise tornado.web.HTTPError(429, reason="Too many attempts, try again later")
+        raise tornado.web.HTTPError(503, reason="The server is busy, try again later")
+
+    def on_finish(self):
+        metrics.observe(
+            "quiz_api_seconds", self.request.request_time(),
+            description="JSON API request latency", handler=type(self).__name__, status=str(self.get_status())
+        )
+
+    def client(self):
+        """Return the rate-limit key of the requesting client"""
+        return client_address(self.request.remote_ip, self.request.headers.get("X-Forwarded-For"))
+
+    def get_game(self, game_id):
+        entry = _games.get(game_id)
+        if entry is None:
+            raise tornado.web.HTTPError(404, reason="No such game")
+        entry["last_active"] = time.monotonic()
+        return entry
+
+
+class GamesHandler(JSONHandler):
+    async def post(self):
+        if len(_games) >= MAX_GAMES:
+            sweep_games()
+            if len(_games) >= MAX_GAMES:
+                raise tornado.web.HTTPError(503, reason="Too many games in progress, try again later")
+        user_id = None
+        if self.body.get("username"):
+            username = str(self.body["username"])
+            try:
+                client = self.client()
+                auth_limiter.acquire(auth_keys(client, username), client=client)
+                user = await tornado.ioloop.IOLoop.current().run_in_executor(
+                    None, _authenticate, username, str(self.body.get("password", ""))
+                )
+            except RateLimited as e:
+                self.refuse(e)
+            except PasswordPoolBusy:
+                self.retry_after = 1
+                raise tornado.web.HTTPError(503, reason="The server is busy, try again later")
+            if user is None:
+                raise tornado.web.HTTPError(401, reason="Invalid username or password")
+            user_id = user.id
+        game = {}
+        engine.new_game(game, adaptive=bool(self.body.get("adaptive", False)))
+        game_id = secrets.token_urlsafe(16)
+        entry = {"game": game, "user_id": user_id, "last_active": time.monotonic()}
+        _games[game_id] = entry
+        self.set_status(201)
+        self.write(game_view(game_id, entry, time.time()))
+
+
+class GameHandler(JSONHandler):
+    def get(self, game_id):
+        self.write(game_view(game_id, self.get_game(game_id), time.time()))
+
+
+class AnswerHandler(JSONHandler):
+    def post(self, game_id):
+        entry = self.get_game(game_id)
+        choice = self.body.get("choice")
+        if choice not in ("A", "B", "C", "D"):
+            raise tornado.web.HTTPError(400, reason="choice must be one of A, B, C, D")
+        now = time.time()
+        try:
+            outcome, correct_answer = engine.submit_answer(entry["game"], choice, entry["user_id"] or "", now)
+        except engine.GameError as exc:
+            raise tornado.web.HTTPError(409, reason=str(exc))
+        self.write({**game_view(game_id, entry, now), "outcome": outcome, "correct_answer": correct_answer})
+
+
+class NextHandler(JSONHandler):
+    async def post(self, game_id):
+        entry = self.get_game(game_id)
+        game, now = entry["game"], time.time()
+        unsaved = entry["user_id"] is not None and not game.get("score_saved", False)
+        if engine.is_finished(game):
+            if not unsaved:
+                raise tornado.web.HTTPError(409, reason="The game is over")
+        elif not game["answered"]:
+            raise tornado.web.HTTPError(409, reason="Answer the current question first")
+        else:
+            engine.advance(game, now)
+        view = game_view(game_id, entry, now)
+        if view["finished"] and unsaved and not entry.get("saving"):
+            # Another /next for this game arriving meanwhile must not save the score twice
+            entry["saving"] = True
+            try:
+                refused = await tornado.ioloop.IOLoop.current().run_in_executor(
+                    None, _finish, game, entry["user_id"], now
+                )
+            finally:
+                entry["saving"] = False
+            if refused is not None:
+                self.set_header("Retry-After", str(max(1, round(refused.retry_after))))
+        if view["finished"]:
+            view["score_saved"] = game.get("score_saved", False)
+        self.write(view)
+
+
+class LeaderboardHandler(JSONHandler):
+    async def get(self):
+        window = self.get_argument("window", "all")
+        if window != "all" and window not in WINDOWS:
+            raise tornado.web.HTTPError(400, reason=f"window must be all or one of {', '.join(WINDOWS)}")
+        try:
+            limit = min(int(self.get_argument("limit", "10")), LEADERBOARD_LIMIT)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="limit must be a number")
+        # Many kiosks poll the same board; build it at most once per TTL
+        now = time.monotonic()
+        cached = _leaderboards.get((window, limit))
+        if cached is None or cached[0] < now:
+            # Catching up with new scores reads storage, so keep it off the event loop
+            top = await tornado.ioloop.IOLoop.current().run_in_executor(None, get_top_scores, limit, window)
+            body = json.dumps({
+                "window": window,
+                "scores": top[["name", "score", "date"]].to_dict("records"),
+            })
+            cached = _leaderboards[(window, limit)] = (now + LEADERBOARD_TTL, body)
+        self.write(cached[1])
+
+
+def make_app():
+    """Return the tornado application serving the API"""
+    return tornado.web.Application([
+        (r"/api/games", GamesHandler),
+        (r"/api/games/([\w-]+)", GameHandler),
+        (r"/api/games/([\w-]+)/answer", AnswerHandler),
+        (r"/api/games/([\w-]+)/next", NextHandler),
+        (r"/api/leaderboard", LeaderboardHandler),
+        # StaticFileHandler answers Range requests and caches ?v= URLs for good
+        (r"/media/source/(.*)", tornado.web.StaticFileHandler, {"path": media.MEDIA_DIR}),
+        (r"/media/(.*)", tornado.web.StaticFileHandler, {"path": media.CACHE_DIR}),
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the quiz JSON API")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("QUIZ_API_PORT", "8600")))
+    parser.add_argument("--address", default="127.0.0.1")
+    args = parser.parse_args()
+
+    # Load the question bank and leaderboard, and transcode any new clips, now rather than on the first requests
+    question_count()
+    rebuild_leaderboard()
+    media.prepare_all([load_questions()])
+    metrics.start_exporters()
+
+    make_app().listen(args.port, args.address)
+    tornado.ioloop.PeriodicCallback(sweep_games, 60 * 1000).start()
+    print(f"Quiz API listening on http://{args.address}:{args.port}/api")
+    tornado.ioloop.IOLoop.current().start()
@@ -1,14 +1,12 @@
+import time
+_rerun_start = time.perf_counter()
+
 import streamlit as st
-import os
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-# Import page modules
-from welcome import show_welcome
-from auth import show_login, show_register, show_forgot_password, show_admin_login  # Add admin login import
-from game import show_game
-from leaderboard import show_leaderboard
-from admin import show_admin_panel
-from utils import create_admin_if_not_exists
-from pregame import show_pregame
+# Page modules are imported on first use by bootstrap.load_page
+from bootstrap import bootstrap, load_page
+from metrics import observe, timer, touch_session
 
 # Set page configuration
 st.set_page_config(
@@ -18,8 +16,13 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Initialize admin user
-create_admin_if_not_exists()
+# Process-wide setup (exporters, admin user, image assets) runs only on the first rerun
+bootstrap()
+
+# Count this session as active
+ctx = get_script_run_ctx()
+if ctx is not None:
+    touch_session(ctx.session_id)
 
 # Initialize session state
 if "page" not in st.session_state:
@@ -45,14 +48,22 @@ with st.sidebar:
             st.session_state.page = "game"
             st.experimental_rerun()
             
+        if st.button("Live Room", key="live_room_btn"):
+            st.session_state.page = "room"
+            st.experimental_rerun()
+            
         if st.button("Leaderboard", key="view_leaderboard_btn"):
             st.session_state.page = "leaderboard"
             st.experimental_rerun()
             
+        if st.button("My Stats", key="my_stats_btn"):
+            st.session_state.page = "my_stats"
+            st.experimental_rerun()
+            
         if st.button("Logout", key="logout_btn"):
-            # Clear session state
+            # Clear session state, keeping scores still waiting to be saved
             for key in list(st.session_state.keys()):
-                if key != "page":
+                if key not in ("page", "deferred_scores"):
                     del st.session_state[key]
             st.session_state.logged_in = False
             st.session_state.page = "welcome"
@@ -82,31 +93,24 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("© 2025 Church Music Quiz")
 
-# Main content routing
-if st.session_state.page == "welcome":
-    show_welcome()
-elif st.session_state.page == "login":
-    show_login()
-elif st.session_state.page == "register":
-    show_register()
-elif st.session_state.page == "forgot_password":
-    show_forgot_password()
-elif st.session_state.page == "admin_login":  # Add this route
-    show_admin_login()
-elif st.session_state.page == "admin_panel":  # Add this route
-    show_admin_panel()
-elif st.session_state.page == "pregame":  # Add this new route
-    show_pregame()
-elif st.session_state.page == "game":
-    if not st.session_state.get("logged_in", False):
+# Scores refused by the rate limits earlier in this session
+if st.session_state.get("deferred_scores"):
+    from please_wait import save_deferred_scores
+    save_deferred_scores()
+
+# Time spent before routing on every rerun
+observe("quiz_rerun_setup_seconds", time.perf_counter() - _rerun_start, description="Per-rerun overhead of app.py before the page runs")
+
+# Main content routing, timed per page for the admin Performance tab
+with timer("quiz_page", page=st.session_state.page):
+    show_page = load_page(st.session_state.page)
+    if show_page is None:
+        st.error("Page not found")
+        st.session_state.page = "welcome"
+        st.experimental_rerun()
+    elif st.session_state.page == "game" and not st.session_state.get("logged_in", False):
         st.warning("Please login to play the game")
         st.session_state.page = "login"
         st.experimental_rerun()
     else:
-        show_game()
-elif st.session_state.page == "leaderboard":
-    show_leaderboard()
-else:
-    st.error("Page not found")
-    st.session_state.page = "welcome"
-    st.experimental_rerun()
+        show_page()
@@ -0,0 +1,123 @@
+"""Pre-built image variants for the welcome page.
+
+``build_assets`` resizes ``data/church_quiz.jpg`` to a few widths and saves
+each as WebP and progressive JPEG under ``static/welcome/``. File names carry
+a hash of the source image, so a variant is built only once per source
+version; later calls just check that the files exist. Streamlit serves the
+``static`` directory (``server.enableStaticServing`` in
+``.streamlit/config.toml``) and, because every URL carries ``?v=<hash>``,
+tornado sends ``Cache-Control: max-age`` of ten years with an ETag, so
+browsers download the picture once instead of on every rerun.
+
+``welcome_image_html`` returns a ``<picture>`` element that lets the browser
+choose the smallest file for its screen and format support. Build ahead of
+deployment with::
+
+    python assets.py build
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+
+# --- Configuration ---
+SOURCE_IMAGE = os.path.join("data", "church_quiz.jpg")
+STATIC_DIR = "static"
+OUTPUT_DIR = os.path.join(STATIC_DIR, "welcome")
+WIDTHS = (240, 480, 720)
+FORMATS = {"webp": {"format": "WEBP", "quality": 75, "method": 6},
+           "jpg": {"format": "JPEG", "quality": 75, "optimize": True, "progressive": True}}
+
+_manifest = None
+_lock = threading.Lock()
+
+
+def _fingerprint(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:10]
+
+
+def build_assets(source=SOURCE_IMAGE, output_dir=OUTPUT_DIR):
+    """Build any missing variants of ``source`` and return the manifest"""
+    from PIL import Image
+
+    version = _fingerprint(source)
+    name = os.path.splitext(os.path.basename(source))[0]
+    manifest_path = os.path.join(output_dir, f"{name}.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["version"] == version and all(
+            os.path.exists(os.path.join(output_dir, variant["file"])) for variant in manifest["variants"]
+        ):
+            return manifest
+
+    os.makedirs(output_dir, exist_ok=True)
+    variants = []
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        # Never upscale; the largest variant is the source width
+        widths = sorted({min(width, image.width) for width in WIDTHS})
+        for width in widths:
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            for extension, options in FORMATS.items():
+                filename = f"{name}-{version}-{width}.{extension}"
+                path = os.path.join(output_dir, filename)
+                if not os.path.exists(path):
+                    tmp_path = f"{path}.tmp"
+                    resized.save(tmp_path, **options)
+                    os.replace(tmp_path, path)
+                variants.append({"file": filename, "format": extension, "width": width, "height": height})
+
+    manifest = {"source": source, "version": version, "variants": variants}
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def get_manifest():
+    """Return the welcome image manifest, building the variants on first use in this process"""
+    global _manifest
+    if _manifest is None:
+        with _lock:
+            if _manifest is None:
+                _manifest = build_assets()
+    return _manifest
+
+
+def welcome_image_html(alt="Church Music Quiz"):
+    """Return a responsive ``<picture>`` element for the welcome image"""
+    manifest = get_manifest()
+    base = os.path.relpath(OUTPUT_DIR, STATIC_DIR).replace(os.sep, "/")
+
+    def srcset(extension):
+        return ", ".join(
+            f"app/static/{base}/{variant['file']}?v={manifest['version']} {variant['width']}w"
+            for variant in manifest["variants"]
+            if variant["format"] == extension
+        )
+
+    fallback = [variant for variant in manifest["variants"] if variant["format"] == "jpg"][-1]
+    sizes = "(max-width: 640px) 100vw, 240px"
+    return (
+        "<picture>"
+        f'<source type="image/webp" srcset="{srcset("webp")}" sizes="{sizes}">'
+        f'<img src="app/static/{base}/{fallback["file"]}?v={manifest["version"]}" srcset="{srcset("jpg")}" '
+        f'sizes="{sizes}" width="{fallback["width"]}" height="{fallback["height"]}" alt="{alt}" '
+        'style="width:100%;height:auto">'
+        "</picture>"
+    )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        print("Usage: python assets.py build")
+        sys.exit(2)
+    manifest = build_assets()
+    for variant in manifest["variants"]:
+        size = os.path.getsize(os.path.join(OUTPUT_DIR, variant["file"]))
+        print(f"{variant['file']}: {size / 1024:.1f} KB")
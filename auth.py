@@ -1,8 +1,24 @@
 import streamlit as st
-import pandas as pd
-import hashlib
-import os
-from utils import load_users, save_user, verify_login, get_user_id
+from passwords import PasswordPoolBusy
+from please_wait import refuse
+from ratelimit import RateLimited, auth_keys, auth_limiter, auth_queue, guarded, register_limiter, session_client
+from utils import UserExists, authenticate, find_user, save_user, update_user_password, user_count
+
+BUSY_MESSAGE = "Lots of people are logging in right now. Please try again in a moment."
+
+def try_authenticate(username, password):
+    """Authenticate, returning (user, refused) and telling the player when the attempt was refused"""
+    try:
+        # Limited per account as tried from this client, and more loosely per address
+        client = session_client()
+        with guarded(auth_limiter, auth_queue, auth_keys(client, username), client=client):
+            return authenticate(username, password), False
+    except RateLimited as e:
+        refuse(e)
+        return None, True
+    except PasswordPoolBusy:
+        st.warning(BUSY_MESSAGE)
+        return None, True
 
 # In auth.py, modify the show_login function:
 def show_login():
@@ -18,17 +34,18 @@ def show_login():
                 st.error("Username and password cannot be empty")
             else:
                 # Verify login
-                if verify_login(username, password):
+                user, busy = try_authenticate(username, password)
+                if user is not None:
                     # Set session state
                     st.session_state.logged_in = True
                     st.session_state.username = username
-                    st.session_state.user_id = get_user_id(username)
+                    st.session_state.user_id = user.id
                     
                     # Redirect to welcome page instead of game
                     st.session_state.page = "welcome"
                     st.success("Login successful!")
                     st.experimental_rerun()
-                else:
+                elif not busy:
                     st.error("Invalid username or password")
     
     st.button("Forgot Password?", on_click=lambda: set_page("forgot_password"))
@@ -40,8 +57,7 @@ def show_login():
 def show_register():
     st.title("Create an Account")
     
-    users = load_users()
-    if len(users) >= 20:
+    if user_count() >= 20:
         st.warning("Registration limit reached. No more users can be registered.")
         st.button("Back to Welcome Page", on_click=lambda: set_page("welcome"))
         return  # Exit the function to prevent registration form from showing
@@ -57,14 +73,24 @@ def show_register():
                 st.error("Username and password cannot be empty")
             elif password != confirm_password:
                 st.error("Passwords do not match")
-            elif username in users["name"].values:
+            elif find_user(username) is not None:
                 st.error("Username already exists")
             else:
                 # Register new user
-                save_user(username, password)
-                st.success("Registration successful! Please login.")
-                st.session_state.page = "login"
-                st.experimental_rerun()
+                try:
+                    with guarded(register_limiter, auth_queue, [session_client()]):
+                        save_user(username, password)
+                except UserExists:
+                    # Taken by another registration since the check above
+                    st.error("Username already exists")
+                except RateLimited as e:
+                    refuse(e)
+                except PasswordPoolBusy:
+                    st.warning(BUSY_MESSAGE)
+                else:
+                    st.success("Registration successful! Please login.")
+                    st.session_state.page = "login"
+                    st.experimental_rerun()
 
     st.markdown("---")
     st.markdown("Already have an account?")
@@ -87,17 +113,23 @@ def show_forgot_password():
             elif new_password != confirm_password:
                 st.error("Passwords do not match")
             else:
-                users = load_users()
-                if username not in users["name"].values:
+                user = find_user(username)
+                if user is None:
                     st.error("Username does not exist")
                 else:
                     # Update user's password
-                    user_id = get_user_id(username)
-                    users.loc[users["id"] == user_id, "password"] = hashlib.sha256(new_password.encode()).hexdigest()
-                    users.to_csv("data/users.csv", index=False)
-                    st.success("Password reset successful! Please login.")
-                    st.session_state.page = "login"
-                    st.experimental_rerun()
+                    try:
+                        client = session_client()
+                        with guarded(auth_limiter, auth_queue, auth_keys(client, username), client=client):
+                            update_user_password(user.id, new_password)
+                    except RateLimited as e:
+                        refuse(e)
+                    except PasswordPoolBusy:
+                        st.warning(BUSY_MESSAGE)
+                    else:
+                        st.success("Password reset successful! Please login.")
+                        st.session_state.page = "login"
+                        st.experimental_rerun()
     
     st.button("Back to Login", on_click=lambda: set_page("login"))
 
@@ -115,23 +147,21 @@ def show_admin_login():
                 st.error("Username and password cannot be empty")
             else:
                 # Verify login
-                if verify_login(username, password):
+                user, busy = try_authenticate(username, password)
+                if user is not None:
                     # Check if user is admin
-                    users = load_users()
-                    user_role = users.loc[users["name"] == username, "role"].values[0]
-                    
-                    if user_role == "admin":
+                    if user.role == "admin":
                         # Set session state
                         st.session_state.logged_in = True
                         st.session_state.username = username
-                        st.session_state.user_id = get_user_id(username)
+                        st.session_state.user_id = user.id
                         st.session_state.is_admin = True
                         st.session_state.page = "admin_panel"
                         st.success("Admin login successful!")
                         st.experimental_rerun()
                     else:
                         st.error("You do not have admin privileges")
-                else:
+                elif not busy:
                     st.error("Invalid username or password")
     
     st.button("Back to Welcome Page", on_click=lambda: set_page("welcome"), key="admin_back_btn")
@@ -0,0 +1,375 @@
+"""Headless load test for the full player journey.
+
+Drives simulated players through ``app.py`` with Streamlit's AppTest:
+login -> welcome -> pregame -> 20 questions -> game end -> leaderboard.
+Every script run is timed and the report shows, per action and overall:
+
+- p50/p95/p99 script-run latency
+- full script executions per question (including ``st.rerun`` reruns)
+- storage calls and bytes read/written per action
+- peak RSS of the worker processes
+
+Scenarios are fixed so results can be compared between releases::
+
+    python benchmarks/loadtest.py --scenario small-10
+    python benchmarks/loadtest.py --all --output results.json
+    python benchmarks/loadtest.py --all --baseline results.json
+
+Each scenario runs against a fresh copy of the data in a temporary directory,
+with ``--workers`` processes sharing it. AppTest is not thread-safe, so each
+worker interleaves its players one script run at a time. Players are created
+up front because the register page stops at 20 accounts.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+SCENARIOS = {
+    "small-10": {"players": 10, "questions": None},
+    "small-100": {"players": 100, "questions": None},
+    "small-1000": {"players": 1000, "questions": None},
+    "large-10": {"players": 10, "questions": 100000},
+    "large-100": {"players": 100, "questions": 100000},
+    "large-1000": {"players": 1000, "questions": 100000},
+}
+PASSWORD = "benchmark"
+QUESTIONS_PER_GAME = 20
+# A p95 this much slower than the baseline counts as a regression
+REGRESSION_THRESHOLD = 0.20
+
+STORAGE_METHODS = [
+    "load_users", "load_scores", "load_questions", "add_user", "update_user",
+    "delete_user", "add_scores", "update_scores", "delete_scores_for_user",
+    "add_question", "replace_questions",
+]
+
+
+# --- Data setup ---
+def prepare_data(workdir, players, questions):
+    """Create a data directory with ``players`` accounts and a question bank"""
+    import pandas as pd
+
+    data_dir = os.path.join(workdir, "data")
+    os.makedirs(data_dir)
+    shutil.copy(os.path.join(ROOT, "data", "church_quiz.jpg"), data_dir)
+
+    if questions is None:
+        shutil.copy(os.path.join(ROOT, "data", "questions.csv"), data_dir)
+    else:
+        rng = random.Random(0)
+        pd.DataFrame({
+            "id": range(1, questions + 1),
+            "question": [f"Benchmark question {i}?" for i in range(1, questions + 1)],
+            "option_a": "Option A",
+            "option_b": "Option B",
+            "option_c": "Option C",
+            "option_d": "Option D",
+            "correct": [rng.choice("ABCD") for _ in range(questions)],
+        }).to_csv(os.path.join(data_dir, "questions.csv"), index=False)
+
+    # One hash for every player keeps setup fast; logins still pay the full KDF
+    sys.path.insert(0, ROOT)
+    from passwords import hash_password
+    hashed = hash_password(PASSWORD)
+    pd.DataFrame({
+        "id": [f"player-{i}" for i in range(players)] + ["admin-0"],
+        "name": [f"player{i}" for i in range(players)] + ["admin"],
+        "password": [hashed] * players + [hash_password("admin123")],
+        "role": ["user"] * players + ["admin"],
+    }).to_csv(os.path.join(data_dir, "users.csv"), index=False)
+    pd.DataFrame(columns=["id", "user_id", "score", "date"]).to_csv(os.path.join(data_dir, "scores.csv"), index=False)
+    return data_dir
+
+
+# --- Instrumentation ---
+def _io_counters():
+    """Return (bytes read, bytes written) by this process, where available"""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except OSError:
+        return 0, 0
+
+
+class Recorder:
+    """Collects per-action measurements in one worker"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.script_runs = defaultdict(int)
+        self.storage_calls = defaultdict(int)
+        self.bytes_read = defaultdict(int)
+        self.bytes_written = defaultdict(int)
+        self.actions = defaultdict(int)
+        self._script_runs = 0
+        self._storage_calls = 0
+
+    def instrument(self, storage):
+        """Count script executions and storage calls"""
+        from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+        # Called once per script execution, including reruns from st.rerun
+        on_script_finished = LocalScriptRunner._on_script_finished
+
+        def counting_on_script_finished(runner, *args, **kwargs):
+            self._script_runs += 1
+            return on_script_finished(runner, *args, **kwargs)
+
+        LocalScriptRunner._on_script_finished = counting_on_script_finished
+
+        for name in STORAGE_METHODS:
+            method = getattr(storage, name, None)
+            if method is not None:
+                setattr(storage, name, self._count_calls(method))
+
+    def _count_calls(self, method):
+        def counted(*args, **kwargs):
+            self._storage_calls += 1
+            return method(*args, **kwargs)
+        return counted
+
+    def run(self, action, app_test):
+        """Run one script execution of ``app_test`` and record it under ``action``"""
+        runs, calls = self._script_runs, self._storage_calls
+        read, written = _io_counters()
+        start = time.perf_counter()
+        app_test.run()
+        self.latencies[action].append(time.perf_counter() - start)
+        read_after, written_after = _io_counters()
+        self.actions[action] += 1
+        self.script_runs[action] += self._script_runs - runs
+        self.storage_calls[action] += self._storage_calls - calls
+        self.bytes_read[action] += read_after - read
+        self.bytes_written[action] += written_after - written
+        if app_test.exception:
+            raise RuntimeError(f"{action} failed: {app_test.exception[0].message}")
+
+
+# --- Player journey ---
+def journey(at, name):
+    """Yield (action, step) pairs that move one player through a full game"""
+    yield "open", lambda: None
+    yield "login_page", lambda: at.button(key="login_btn").click()
+
+    def submit_login():
+        at.text_input[0].input(name)
+        at.text_input[1].input(PASSWORD)
+        at.button[0].click()
+    yield "login", submit_login
+    yield "pregame", lambda: at.button(key="play_game_button").click()
+    yield "start_game", lambda: at.button(key="start_game_button").click()
+
+    for _ in range(QUESTIONS_PER_GAME):
+        if at.session_state["question_index"] >= len(at.session_state["deck"]):
+            break
+
+        def answer():
+            at.radio[0].set_value(random.choice("ABCD"))
+            at.button(key="submit_answer").click()
+        yield "answer", answer
+        yield "next_question", lambda: at.button(key="next_question").click()
+
+    yield "leaderboard", lambda: at.button(key="view_leaderboard_btn").click()
+
+
+def run_worker(names, data_dir, queue):
+    """Play every player in ``names`` to the end, interleaving their script runs"""
+    os.chdir(os.path.dirname(data_dir))
+    sys.path.insert(0, ROOT)
+    import utils
+    from streamlit.testing.v1 import AppTest
+
+    recorder = Recorder()
+    recorder.instrument(utils.get_storage())
+    utils.create_admin_if_not_exists()
+
+    players = []
+    for name in names:
+        at = AppTest.from_file(APP, default_timeout=60)
+        players.append((at, journey(at, name)))
+
+    try:
+        while players:
+            for player in list(players):
+                at, steps = player
+                try:
+                    action, step = next(steps)
+                except StopIteration:
+                    players.remove(player)
+                    continue
+                step()
+                recorder.run(action, at)
+        utils.flush_scores()
+    except Exception as e:
+        queue.put({"error": repr(e)})
+        return
+
+    queue.put({
+        "latencies": dict(recorder.latencies),
+        "script_runs": dict(recorder.script_runs),
+        "storage_calls": dict(recorder.storage_calls),
+        "bytes_read": dict(recorder.bytes_read),
+        "bytes_written": dict(recorder.bytes_written),
+        "actions": dict(recorder.actions),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+
+
+# --- Reporting ---
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def summarize(name, scenario, results, elapsed):
+    """Merge worker results into one report"""
+    merged = defaultdict(lambda: defaultdict(list))
+    totals = defaultdict(lambda: defaultdict(int))
+    for result in results:
+        for action, values in result["latencies"].items():
+            merged[action]["latencies"].extend(values)
+        for key in ("script_runs", "storage_calls", "bytes_read", "bytes_written", "actions"):
+            for action, value in result[key].items():
+                totals[action][key] += value
+
+    all_latencies = [v for action in merged.values() for v in action["latencies"]]
+    questions_played = totals["answer"]["actions"] or 1
+    question_runs = totals["answer"]["script_runs"] + totals["next_question"]["script_runs"]
+
+    report = {
+        "scenario": name,
+        "players": scenario["players"],
+        "questions": scenario["questions"] or "repo",
+        "elapsed_s": round(elapsed, 2),
+        "script_runs_per_second": round(len(all_latencies) / elapsed, 1) if elapsed else 0,
+        "latency_ms": {
+            "p50": round(percentile(all_latencies, 50) * 1000, 2),
+            "p95": round(percentile(all_latencies, 95) * 1000, 2),
+            "p99": round(percentile(all_latencies, 99) * 1000, 2),
+        },
+        "reruns_per_question": round(question_runs / questions_played, 2),
+        "peak_rss_mb": round(max(r["peak_rss_kb"] for r in results) / 1024, 1),
+        "actions": {},
+    }
+    for action, values in merged.items():
+        count = totals[action]["actions"]
+        report["actions"][action] = {
+            "count": count,
+            "p50_ms": round(percentile(values["latencies"], 50) * 1000, 2),
+            "p95_ms": round(percentile(values["latencies"], 95) * 1000, 2),
+            "p99_ms": round(percentile(values["latencies"], 99) * 1000, 2),
+            "script_runs": round(totals[action]["script_runs"] / count, 2),
+            "storage_calls": round(totals[action]["storage_calls"] / count, 2),
+            "kb_read": round(totals[action]["bytes_read"] / count / 1024, 1),
+            "kb_written": round(totals[action]["bytes_written"] / count / 1024, 1),
+        }
+    return report
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    print(f"\n== {report['scenario']}: {report['players']} players, questions: {report['questions']} ==")
+    print(f"elapsed {report['elapsed_s']} s, {report['script_runs_per_second']} script runs/s, "
+          f"peak RSS {report['peak_rss_mb']} MB")
+    print(f"latency p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms; "
+          f"{report['reruns_per_question']} script runs per question")
+    print(f"{'action':<15}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'runs':>7}{'storage':>9}{'KB read':>9}{'KB write':>9}")
+    for action, row in report["actions"].items():
+        print(f"{action:<15}{row['count']:>7}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+              f"{row['script_runs']:>7}{row['storage_calls']:>9}{row['kb_read']:>9}{row['kb_written']:>9}")
+
+
+def compare(reports, baseline_path):
+    """Print regressions against a saved baseline; return True if any were found"""
+    with open(baseline_path) as f:
+        baseline = {report["scenario"]: report for report in json.load(f)}
+    regressed = False
+    for report in reports:
+        before = baseline.get(report["scenario"])
+        if before is None:
+            continue
+        for metric in ("p95", "p99"):
+            old, new = before["latency_ms"][metric], report["latency_ms"][metric]
+            if old and new > old * (1 + REGRESSION_THRESHOLD):
+                print(f"REGRESSION {report['scenario']} {metric}: {old} ms -> {new} ms")
+                regressed = True
+    return regressed
+
+
+def run_scenario(name, workers):
+    scenario = SCENARIOS[name]
+    workdir = tempfile.mkdtemp(prefix=f"quiz-bench-{name}-")
+    try:
+        data_dir = prepare_data(workdir, scenario["players"], scenario["questions"])
+        os.environ["QUIZ_DATA_DIR"] = data_dir
+        names = [f"player{i}" for i in range(scenario["players"])]
+        workers = max(1, min(workers, len(names)))
+
+        # Spawn rather than fork: the parent already started the hashing pool threads
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        processes = [
+            context.Process(target=run_worker, args=(names[i::workers], data_dir, queue))
+            for i in range(workers)
+        ]
+        start = time.perf_counter()
+        for i, process in enumerate(processes):
+            # Spawned workers read their ID (and so their own score journal) at import
+            os.environ["QUIZ_WORKER_ID"] = str(i)
+            process.start()
+        os.environ.pop("QUIZ_WORKER_ID")
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    errors = [result["error"] for result in results if "error" in result]
+    if errors:
+        raise RuntimeError(f"{name}: {errors[0]}")
+    return summarize(name, scenario, results, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run (repeatable)")
+    parser.add_argument("--all", action="store_true", help="run every scenario")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--output", help="write the reports to this JSON file")
+    parser.add_argument("--baseline", help="compare against a JSON file written by --output")
+    args = parser.parse_args()
+
+    names = sorted(SCENARIOS) if args.all else (args.scenario or ["small-10"])
+    reports = []
+    for name in names:
+        report = run_scenario(name, args.workers)
+        print_report(report)
+        reports.append(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+    if args.baseline and compare(reports, args.baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""One-time process setup and lazy page loading for ``app.py``.
+
+Streamlit re-executes ``app.py`` on every click, so anything at its top level
+runs once per rerun per user. ``bootstrap`` does the process-wide work
+(metrics exporters, the default admin account, the welcome image variants)
+the first time it is called and is a flag check after that. ``load_page``
+imports a page module the first time that page is shown rather than
+importing all of them before routing.
+
+How long each bootstrap step and each first page import took is kept in
+``startup_profile()`` and shown on the admin Performance tab. For a cold
+import-time report of the whole app, with the bootstrap steps timed against
+a scratch data directory (so the live data, static files and metrics
+exporters are left alone), run::
+
+    python bootstrap.py
+"""
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import metrics
+
+# page name -> (module, function)
+PAGES = {
+    "welcome": ("welcome", "show_welcome"),
+    "login": ("auth", "show_login"),
+    "register": ("auth", "show_register"),
+    "forgot_password": ("auth", "show_forgot_password"),
+    "admin_login": ("auth", "show_admin_login"),
+    "admin_panel": ("admin", "show_admin_panel"),
+    "pregame": ("pregame", "show_pregame"),
+    "game": ("game", "show_game"),
+    "leaderboard": ("leaderboard", "show_leaderboard"),
+    "my_stats": ("my_stats", "show_my_stats"),
+    "room": ("room", "show_room"),
+    "please_wait": ("please_wait", "show_please_wait"),
+}
+
+_lock = threading.Lock()
+_done = False
+_profile = {"bootstrap": [], "imports": []}  # lists of (name, seconds)
+
+
+def _step(name, fn):
+    start = time.perf_counter()
+    try:
+        fn()
+    finally:
+        seconds = time.perf_counter() - start
+        _profile["bootstrap"].append((name, seconds))
+        metrics.observe("quiz_startup_seconds", seconds, description="Duration of one-time startup steps", step=name)
+
+
+def _build_assets(output_dir=None):
+    from assets import build_assets, get_manifest
+    try:
+        if output_dir is None:
+            get_manifest()
+        else:
+            build_assets(output_dir=output_dir)
+    except (ImportError, OSError):
+        # The welcome page falls back to the original image
+        pass
+
+
+def bootstrap():
+    """Run the process-wide setup once; later calls return immediately"""
+    global _done
+    if _done:
+        return
+    with _lock:
+        if _done:
+            return
+        from utils import create_admin_if_not_exists
+
+        _step("exporters", metrics.start_exporters)
+        _step("admin_account", create_admin_if_not_exists)
+        _step("welcome_assets", _build_assets)
+        _done = True
+
+
+def load_page(page):
+    """Return the show function for ``page``, importing its module on first use; None if unknown"""
+    if page not in PAGES:
+        return None
+    module_name, function_name = PAGES[page]
+    module = sys.modules.get(module_name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        seconds = time.perf_counter() - start
+        with _lock:
+            _profile["imports"].append((module_name, seconds))
+        metrics.observe("quiz_page_import_seconds", seconds, description="First import of a page module", module=module_name)
+    return getattr(module, function_name)
+
+
+def startup_profile():
+    """Return {"bootstrap": [(step, seconds)], "imports": [(module, seconds)]} for this process"""
+    with _lock:
+        return {key: list(value) for key, value in _profile.items()}
+
+
+def import_time_report(modules=None, top=15):
+    """Import ``modules`` in a fresh interpreter and return the slowest imports as (module, cumulative seconds)"""
+    modules = modules or sorted({module for module, _ in PAGES.values()})
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Names are indented two spaces per nesting level; keep the modules imported
+        # directly and their own imports (pandas, streamlit, ...), whose times include the rest
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            rows.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as scratch:
+        # Set before utils and storage are imported, here and in the import-time subprocess
+        os.environ["QUIZ_DATA_DIR"] = scratch
+        start = time.perf_counter()
+        report = import_time_report()
+        print(f"Cold import of all page modules ({time.perf_counter() - start:.2f}s wall, including interpreter start)")
+        for name, seconds in report:
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+        from utils import create_admin_if_not_exists
+
+        # The exporters step only starts threads and a port; it is not worth a side effect here
+        _step("admin_account", create_admin_if_not_exists)
+        _step("welcome_assets", lambda: _build_assets(os.path.join(scratch, "welcome")))
+        print(f"Bootstrap steps (in a scratch data directory, {scratch})")
+        for name, seconds in startup_profile()["bootstrap"]:
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
@@ -0,0 +1,200 @@
+"""Streaming bulk import and export of the question bank.
+
+Files are read and written in chunks of ``CHUNK_SIZE`` rows, so memory use
+stays flat however big the bank is. Every imported row is validated (question
+and all four options present, ``correct`` one of A-D, ``id`` a whole number
+and ``media`` a path inside the media directory if given); valid rows of
+each chunk are upserted straight away, invalid ones are reported with their
+row number and skipped.
+
+Supported formats are CSV, JSON Lines and Parquet (Parquet needs pyarrow,
+which Streamlit already installs). From the command line::
+
+    python bulk_io.py import questions.parquet
+    python bulk_io.py export backup.jsonl
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+from media import is_valid_reference
+from storage import OPTIONAL_QUESTION_COLUMNS, QUESTION_COLUMNS
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl", ".parquet": "parquet"}
+OPTION_COLUMNS = ["option_a", "option_b", "option_c", "option_d"]
+
+
+class ImportReport:
+    """Counts and errors collected while importing"""
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []  # (row number, message), first MAX_REPORTED_ERRORS only
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+
+def detect_format(filename):
+    """Return the format name for a file name, based on its extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file type '{extension}'. Use CSV, JSON Lines or Parquet.")
+    return FORMATS[extension]
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet support needs pyarrow: pip install pyarrow")
+    return pyarrow.parquet
+
+
+# --- Import ---
+def read_chunks(source, fmt, chunksize=CHUNK_SIZE):
+    """Yield DataFrames of at most ``chunksize`` rows from a file path or file object"""
+    if fmt == "csv":
+        yield from pd.read_csv(source, chunksize=chunksize, dtype=str, keep_default_na=False)
+    elif fmt == "jsonl":
+        yield from pd.read_json(source, lines=True, chunksize=chunksize, dtype=False)
+    elif fmt == "parquet":
+        parquet_file = _require_pyarrow().ParquetFile(source)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def validate_chunk(chunk, first_row_number, report):
+    """Return the valid rows of ``chunk`` in canonical form, recording errors in ``report``"""
+    chunk = chunk.rename(columns=lambda column: str(column).strip().lower())
+    missing = [
+        column for column in QUESTION_COLUMNS[1:]
+        if column not in chunk.columns and column not in OPTIONAL_QUESTION_COLUMNS
+    ]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    chunk = chunk.reindex(columns=QUESTION_COLUMNS).reset_index(drop=True)
+    text_columns = ["question"] + OPTION_COLUMNS
+    for column in text_columns:
+        chunk[column] = chunk[column].fillna("").astype(str).str.strip()
+    chunk["correct"] = chunk["correct"].fillna("").astype(str).str.strip().str.upper()
+    chunk["media"] = chunk["media"].fillna("").astype(str).str.strip().replace("", None)
+    ids = pd.to_numeric(chunk["id"].replace("", None), errors="coerce")
+
+    problems = pd.Series("", index=chunk.index)
+    for column in text_columns:
+        problems[chunk[column] == ""] += f"{column} is empty; "
+    problems[~chunk["correct"].isin(["A", "B", "C", "D"])] += "correct must be A, B, C or D; "
+    bad_id = chunk["id"].notna() & (chunk["id"].astype(str).str.strip() != "") & (ids.isna() | (ids % 1 != 0))
+    problems[bad_id] += "id must be a whole number; "
+    bad_media = chunk["media"].notna() & ~chunk["media"].map(is_valid_reference, na_action="ignore").astype(bool)
+    problems[bad_media] += "media must be a file in the media directory, optionally with #t=start,end; "
+
+    for index in problems[problems != ""].index:
+        report.add_error(first_row_number + index, problems[index].rstrip("; "))
+
+    valid = chunk[problems == ""].copy()
+    valid["id"] = ids[problems == ""].astype("Int64")
+    return valid
+
+
+def import_questions(source, fmt, storage, chunksize=CHUNK_SIZE, on_progress=None):
+    """Validate and upsert questions from ``source`` chunk by chunk; returns an ImportReport"""
+    report = ImportReport()
+    for chunk in read_chunks(source, fmt, chunksize):
+        valid = validate_chunk(chunk, report.rows + 1, report)
+        report.rows += len(chunk)
+        if not valid.empty:
+            inserted, updated = storage.upsert_questions(valid)
+            report.inserted += inserted
+            report.updated += updated
+        if on_progress is not None:
+            on_progress(report)
+    return report
+
+
+# --- Export ---
+def export_questions(destination, fmt, storage, chunksize=CHUNK_SIZE):
+    """Write every question to a file path or binary file object, chunk by chunk"""
+    write_chunks(destination, fmt, storage.iter_questions(chunksize), QUESTION_COLUMNS)
+
+
+def write_chunks(destination, fmt, chunks, columns):
+    """Write DataFrame ``chunks`` with ``columns`` to a file path or binary file object in ``fmt``"""
+    if fmt == "parquet":
+        parquet = _require_pyarrow()
+        import pyarrow
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = parquet.ParquetWriter(destination, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            if writer is None:
+                parquet.write_table(pyarrow.Table.from_pandas(pd.DataFrame(columns=columns)), destination)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
+    close = isinstance(destination, str)
+    f = open(destination, "wb") if close else destination
+    try:
+        for i, chunk in enumerate(chunks):
+            if fmt == "csv":
+                text = chunk.to_csv(header=(i == 0), index=False)
+            elif fmt == "jsonl":
+                text = chunk.to_json(orient="records", lines=True, force_ascii=False)
+                text = text if text.endswith("\n") else text + "\n"
+            else:
+                raise ValueError(f"Unknown format: {fmt}")
+            f.write(text.encode())
+        if fmt == "csv" and f.tell() == 0:
+            f.write(",".join(columns).encode() + b"\n")
+    finally:
+        if close:
+            f.close()
+
+
+@contextmanager
+def exported_questions(fmt, storage, chunksize=CHUNK_SIZE):
+    """Export the question bank chunk by chunk to a temporary file and yield it open for reading"""
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        export_questions(path, fmt, storage, chunksize)
+        with open(path, "rb") as f:
+            yield f
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    import utils
+
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python bulk_io.py import|export <file.csv|file.jsonl|file.parquet>")
+        sys.exit(2)
+    command, path = sys.argv[1:]
+    if command == "import":
+        report = utils.import_questions(path, detect_format(path))
+        print(f"{report.rows} rows read, {report.inserted} added, {report.updated} updated, {report.error_count} rejected")
+        for row_number, message in report.errors:
+            print(f"  row {row_number}: {message}")
+    else:
+        export_questions(path, detect_format(path), utils.get_storage())
+        print(f"Exported questions to {path}")
@@ -0,0 +1,123 @@
+"""Process-wide in-memory cache for loaded tables.
+
+Streamlit imports each module once per server process, so a single
+``TableCache`` instance in ``utils`` is shared by every session. Entries are
+validated on every read against the storage backend's ``signature(table)``:
+the table's change counter (see ``changes.py``), which every write from any
+worker bumps, plus the file mtime and size for CSV files edited outside the
+app. Writes made through ``utils`` invalidate the entry directly.
+
+Hits return the cached DataFrame itself, not a copy, so a hit costs no more
+than the signature check however large the table is. Callers must treat it
+as read-only and ``copy()`` it before changing anything.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+# --- Configuration ---
+MAX_ENTRIES = int(os.environ.get("QUIZ_CACHE_MAX_ENTRIES", "32"))
+MAX_BYTES = int(float(os.environ.get("QUIZ_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+
+def file_signature(*paths):
+    """Return a signature that changes whenever any of the files changes"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class TableCache:
+    """Size-bounded LRU cache of DataFrames keyed by table name"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (signature, df, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, signature, loader):
+        """Return the cached table (shared, read-only), calling ``loader`` on a miss"""
+        df = self._lookup(key, signature)
+        if df is not None:
+            return df
+
+        # Only one session loads a given table at a time; the rest wait for it
+        with self._load_lock(key):
+            df = self._lookup(key, signature, count=False)
+            if df is None:
+                df = loader()
+                self._store(key, signature, df)
+        return df
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when ``key`` is None"""
+        with self._lock:
+            keys = list(self._entries) if key is None else [key]
+            for k in keys:
+                if k in self._entries:
+                    self._drop(k)
+                    self.invalidations += 1
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+    # --- Internals ---
+    def _lookup(self, key, signature, count=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return entry[1]
+            if entry is not None:
+                # The underlying data changed since it was cached
+                self._drop(key)
+                self.invalidations += 1
+            if count:
+                self.misses += 1
+            return None
+
+    def _store(self, key, signature, df):
+        size = int(df.memory_usage(index=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (signature, df, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _load_lock(self, key):
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
@@ -0,0 +1,119 @@
+"""Cross-process change notification and write locking for the data directory.
+
+Several app processes can share one data directory (see ``workers.py``).
+Each keeps its own table cache and in-memory indexes, so each must notice
+when another process writes.
+
+``ChangeFeed`` is a tiny file, ``changes.seq``, holding one 64-bit sequence
+number per table, memory-mapped by every process. A storage write bumps its
+table's number under an exclusive ``flock``; checking for changes is a read
+from the shared mapping, with no system call and no file stat. The storage
+backends fold these numbers into ``signature(table)``, which is what the
+caches and indexes already compare before use. ``score_rewrites`` is bumped
+only by score writes that change or delete rows, so a process can tell that
+the scores table merely grew and read just the new rows.
+
+``ProcessLock`` is a re-entrant lock that is also held across processes
+(``flock`` on ``.lock``), so CSV read-modify-write updates from different
+workers cannot overwrite each other. On platforms without ``fcntl`` both fall
+back to working within a single process only.
+"""
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process mode only
+    fcntl = None
+
+TABLES = ("users", "scores", "questions", "score_summaries", "score_rewrites")
+_COUNTER = struct.Struct("<Q")
+
+
+class ChangeFeed:
+    """Per-table sequence numbers shared between processes through a memory-mapped file"""
+
+    def __init__(self, path, tables=TABLES):
+        self.path = path
+        self.offsets = {table: i * _COUNTER.size for i, table in enumerate(tables)}
+        size = len(tables) * _COUNTER.size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            with self._locked():
+                if os.fstat(self._fd).st_size < size:
+                    os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def read(self, table):
+        """Return the current sequence number of ``table``"""
+        return _COUNTER.unpack_from(self._map, self.offsets[table])[0]
+
+    def bump(self, table):
+        """Record that ``table`` changed and return its new sequence number"""
+        offset = self.offsets[table]
+        with self._lock, self._locked():
+            value = _COUNTER.unpack_from(self._map, offset)[0] + 1
+            _COUNTER.pack_into(self._map, offset, value)
+        return value
+
+    def _locked(self):
+        return _FileLock(self._fd)
+
+
+class _FileLock:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return False
+
+
+class ProcessLock:
+    """Re-entrant lock held across threads and, through ``flock``, across processes"""
+
+    # One instance per file: two descriptors of one file would block each other in a single process
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __new__(cls, path):
+        with cls._instances_lock:
+            key = os.path.abspath(path)
+            if key not in cls._instances:
+                lock = super().__new__(cls)
+                lock._open(path)
+                cls._instances[key] = lock
+            return cls._instances[key]
+
+    def _open(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+        return False
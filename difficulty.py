@@ -0,0 +1,137 @@
+"""Question difficulty index for adaptive games.
+
+A question's difficulty is the share of players who missed it, smoothed so
+questions with few answers start near 0.5::
+
+    difficulty = 1 - (correct + 1) / (answers + timeouts + 2)
+
+``DifficultyIndex`` keeps every question in one of ``BUCKETS`` difficulty
+buckets and a Fenwick tree of bucket sizes. Taken together the buckets are
+the bank sorted by difficulty, and the tree finds the k-th question of that
+order, or how many questions are easier than a target, in O(log BUCKETS).
+Moving a question to another bucket when its statistics change is O(1) plus
+a tree update, so the index follows new answer data without rebuilding.
+"""
+import random
+import threading
+
+BUCKETS = 100
+NEIGHBOURHOOD = 5  # Questions either side of the target to choose from at random
+MAX_TRIES = 50
+
+
+def difficulty_from_totals(answers, correct, timeouts):
+    """Return the smoothed share of players who missed a question"""
+    return 1 - (correct + 1) / (answers + timeouts + 2)
+
+
+class DifficultyIndex:
+    """Questions grouped into difficulty buckets, with a Fenwick tree over bucket sizes"""
+
+    def __init__(self):
+        self._buckets = [[] for _ in range(BUCKETS)]
+        self._where = {}  # question_id -> (bucket, position in bucket)
+        self._tree = [0] * (BUCKETS + 1)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._where)
+
+    def rebuild(self, difficulties):
+        """Replace the index contents from {question_id: difficulty}"""
+        with self._lock:
+            self._buckets = [[] for _ in range(BUCKETS)]
+            self._where = {}
+            self._tree = [0] * (BUCKETS + 1)
+            for question_id, difficulty in difficulties.items():
+                self._insert(question_id, _bucket(difficulty))
+
+    def set(self, question_id, difficulty):
+        """Add a question or move it to the bucket for its new difficulty"""
+        bucket = _bucket(difficulty)
+        with self._lock:
+            current = self._where.get(question_id)
+            if current is not None:
+                if current[0] == bucket:
+                    return
+                self._remove(question_id)
+            self._insert(question_id, bucket)
+
+    def remove(self, question_id):
+        """Drop a question from the index"""
+        with self._lock:
+            if question_id in self._where:
+                self._remove(question_id)
+
+    def pick(self, target, exclude=(), rng=random):
+        """Return a question near ``target`` difficulty (0-1) that is not in ``exclude``, or None"""
+        with self._lock:
+            total = len(self._where)
+            if total <= len(exclude):
+                return None
+            # Rank the target would have in the difficulty order
+            rank = self._prefix(_bucket(target))
+            spread = NEIGHBOURHOOD
+            for attempt in range(MAX_TRIES):
+                k = min(max(rank + rng.randint(-spread, spread), 0), total - 1)
+                question_id = self._kth(k)
+                if question_id not in exclude:
+                    return question_id
+                # Widen the neighbourhood when it is used up
+                spread += len(exclude) // MAX_TRIES + 1
+            # Everything nearby was excluded; walk the order from the target
+            for offset in range(total):
+                for k in (rank + offset, rank - offset - 1):
+                    if 0 <= k < total:
+                        question_id = self._kth(k)
+                        if question_id not in exclude:
+                            return question_id
+            return None
+
+    # --- Internals ---
+    def _insert(self, question_id, bucket):
+        members = self._buckets[bucket]
+        self._where[question_id] = (bucket, len(members))
+        members.append(question_id)
+        self._add(bucket, 1)
+
+    def _remove(self, question_id):
+        bucket, position = self._where.pop(question_id)
+        members = self._buckets[bucket]
+        # Swap with the last member so removal is O(1)
+        last = members.pop()
+        if last != question_id:
+            members[position] = last
+            self._where[last] = (bucket, position)
+        self._add(bucket, -1)
+
+    def _add(self, bucket, delta):
+        i = bucket + 1
+        while i <= BUCKETS:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, bucket):
+        """Number of questions in buckets below ``bucket``"""
+        count, i = 0, bucket
+        while i > 0:
+            count += self._tree[i]
+            i -= i & -i
+        return count
+
+    def _kth(self, k):
+        """Return the question at 0-based position ``k`` of the difficulty order"""
+        position, remaining = 0, k
+        step = 1 << BUCKETS.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= BUCKETS and self._tree[nxt] <= remaining:
+                position = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        # ``position`` buckets hold k or fewer questions; the k-th is in the next one
+        return self._buckets[position][remaining]
+
+
+def _bucket(difficulty):
+    return min(BUCKETS - 1, max(0, int(difficulty * BUCKETS)))
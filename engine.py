@@ -0,0 +1,185 @@
+"""Quiz game rules, independent of any user interface.
+
+A game is a mutable mapping of plain values: ``deck``, ``question_index``,
+``score``, ``timer_start``, ``deadline``, ``answered``, ``game_length``,
+``adaptive`` and ``score_saved``. The Streamlit game page passes
+``st.session_state`` and the JSON API (``api.py``) passes a dict, so both
+follow exactly the same question flow, scoring and deadline rules.
+
+Every function takes ``now`` (seconds since the epoch) so callers and tests
+can control the clock; it defaults to the current time. The deadline is
+enforced here, on the server, whatever countdown the client showed.
+"""
+import time
+from datetime import datetime
+
+from utils import (
+    draw_question_deck, get_question, pick_adaptive_question, question_count, record_answer, save_score
+)
+
+QUESTIONS_PER_GAME = 20
+QUESTION_SECONDS = 10
+# Allowance for the round trip between the client countdown and the server
+GRACE_SECONDS = 0.5
+
+# Outcomes of an answer
+CORRECT, WRONG, TIMEOUT = "correct", "wrong", "timeout"
+
+
+class GameError(Exception):
+    """Raised for actions a game does not allow in its current state"""
+
+
+def _now(now):
+    return time.time() if now is None else now
+
+
+def start_question(game, now=None):
+    """Start the clock for the current question and record its deadline"""
+    game["timer_start"] = _now(now)
+    game["deadline"] = game["timer_start"] + QUESTION_SECONDS
+
+
+def new_game(game, adaptive=None, now=None):
+    """Reset ``game`` for a fresh game with a newly shuffled deck.
+
+    In adaptive mode the deck starts with one question and each next one is
+    chosen to match the player's running accuracy. ``adaptive`` None keeps
+    the mode of the previous game.
+    """
+    if adaptive is not None:
+        game["adaptive"] = adaptive
+    if game.get("adaptive", False):
+        first = pick_adaptive_question(0, 0)
+        game["deck"] = [first] if first is not None else []
+        game["game_length"] = min(QUESTIONS_PER_GAME, question_count())
+    else:
+        game["deck"] = draw_question_deck(QUESTIONS_PER_GAME)
+        game["game_length"] = len(game["deck"])
+    game["question_index"] = 0
+    game["score"] = 0
+    game["answered"] = False
+    game["score_saved"] = False
+    start_question(game, now)
+
+
+def ensure_game(game, now=None):
+    """Start a game if ``game`` has none in progress, e.g. a session that skipped new_game"""
+    if "question_index" not in game:
+        # Whatever else is left (deck, deadline, score_saved) belongs to an earlier game
+        new_game(game, now=now)
+        return
+    if "deck" not in game:
+        game["deck"] = draw_question_deck(QUESTIONS_PER_GAME)
+    game.setdefault("question_index", 0)
+    game.setdefault("score", 0)
+    game.setdefault("answered", False)
+    if "deadline" not in game:
+        start_question(game, now)
+
+
+def total_questions(game):
+    """Return the number of questions this game will have"""
+    return game.get("game_length", len(game["deck"]))
+
+
+def is_finished(game):
+    """True once every question of the game has been played"""
+    return game["question_index"] >= total_questions(game)
+
+
+def current_question(game, now=None):
+    """Return the current question dict, skipping questions deleted mid-game; None once finished"""
+    while not is_finished(game):
+        question = get_question(game["deck"][game["question_index"]])
+        if question is not None:
+            return question
+        advance(game, now)
+    return None
+
+
+def is_expired(game, now=None):
+    """True once the current question's deadline (plus grace) has passed"""
+    return _now(now) > game["deadline"] + GRACE_SECONDS
+
+
+def remaining_seconds(game, now=None):
+    """Seconds left before the current question's deadline"""
+    return max(0.0, game["deadline"] - _now(now))
+
+
+def next_question_id(game):
+    """Return the ID of the question after the current one, if it is already known"""
+    index = game["question_index"] + 1
+    if index < total_questions(game) and index < len(game["deck"]):
+        return game["deck"][index]
+    return None
+
+
+def _extend_deck(game, index):
+    """In adaptive mode, choose the question at ``index`` if it has not been chosen yet"""
+    deck = game["deck"]
+    if game.get("adaptive", False) and len(deck) <= index < total_questions(game):
+        next_id = pick_adaptive_question(game["score"], index, exclude=deck)
+        if next_id is None:
+            # The bank ran out of unseen questions; end the game here
+            game["game_length"] = len(deck)
+        else:
+            deck.append(next_id)
+
+
+def _answered(game):
+    game["answered"] = True
+    # The score is final now, so the next adaptive question can be chosen (and its clip prefetched)
+    _extend_deck(game, game["question_index"] + 1)
+
+
+def _log(game, user_id, choice, correct, now):
+    record_answer(user_id, game["deck"][game["question_index"]], choice, now - game["timer_start"], correct)
+
+
+def expire(game, user_id="", now=None):
+    """Mark the current question as unanswered because its deadline passed"""
+    now = _now(now)
+    _log(game, user_id, None, False, now)
+    _answered(game)
+    return TIMEOUT
+
+
+def submit_answer(game, choice, user_id="", now=None):
+    """Score ``choice`` for the current question and return (outcome, correct answer)"""
+    now = _now(now)
+    if is_finished(game):
+        raise GameError("The game is over")
+    if game["answered"]:
+        raise GameError("This question has already been answered")
+    question = current_question(game, now)
+    if question is None:
+        raise GameError("The game is over")
+    if is_expired(game, now):
+        return expire(game, user_id, now), question["correct"]
+    correct = choice == question["correct"]
+    _log(game, user_id, choice, correct, now)
+    if correct:
+        game["score"] += 1
+    _answered(game)
+    if correct:
+        return CORRECT, question["correct"]
+    return WRONG, question["correct"]
+
+
+def advance(game, now=None):
+    """Move on to the next question, choosing it now in adaptive mode"""
+    game["question_index"] += 1
+    game["answered"] = False
+    _extend_deck(game, game["question_index"])
+    start_question(game, now)
+
+
+def finish(game, user_id=None, now=None, save=save_score):
+    """Save the final score for ``user_id`` once per game with ``save(user_id, score, date)``; returns True if saved now"""
+    if not is_finished(game) or not user_id or game.get("score_saved", False):
+        return False
+    game["score_saved"] = True
+    save(user_id, game["score"], datetime.fromtimestamp(_now(now)).strftime("%Y-%m-%d %H:%M:%S"))
+    return True
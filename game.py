@@ -1,28 +1,77 @@
 import streamlit as st
 import pandas as pd
-import time
-from datetime import datetime
-from utils import load_questions, save_score
+import engine
+from engine import QUESTIONS_PER_GAME, QUESTION_SECONDS
+from media import MediaError, audio_html, clip_path, clip_url, prepare_clip, question_media
+from metrics import inc
+from please_wait import save_score_or_defer
+from utils import get_question, question_count
+
+# The game rules live in engine.py; this page keeps the game in st.session_state
+
+def start_question_timer():
+    """Start the clock for the current question and record its deadline"""
+    engine.start_question(st.session_state)
+
+def reset_game(adaptive=None):
+    """Reset the session for a fresh game (see ``engine.new_game``)"""
+    engine.new_game(st.session_state, adaptive)
+    st.session_state.feedback = None
+
+def advance_question():
+    """Move on to the next question, choosing it now in adaptive mode"""
+    engine.advance(st.session_state)
+    st.session_state.feedback = None
+
+def expire_question():
+    """Mark the current question as unanswered once its deadline has passed"""
+    engine.expire(st.session_state, st.session_state.get("user_id", ""))
+    st.session_state.feedback = "Time's up! ⏰"
+
+def show_clip(question):
+    """Play the question's audio clip, if it has one"""
+    reference = question_media(question)
+    if reference is None:
+        return
+    try:
+        # The untrimmed source plays until the clip is ready
+        clip = prepare_clip(reference, wait=False)
+    except MediaError:
+        st.warning("The audio clip for this question is unavailable.")
+        return
+    url = clip_url(clip)
+    if url is None:
+        st.audio(clip_path(clip), start_time=int(clip.start))
+    else:
+        st.markdown(audio_html(url), unsafe_allow_html=True)
+
+def prefetch_next_clip():
+    """Start downloading the next question's clip while the player reads the feedback"""
+    next_id = engine.next_question_id(st.session_state)
+    question = get_question(next_id) if next_id is not None else None
+    reference = question_media(question) if question is not None else None
+    if reference is None:
+        return
+    try:
+        # Starts trimming and transcoding it in the background if no one has yet
+        clip = prepare_clip(reference, wait=False)
+    except MediaError:
+        return
+    url = clip_url(clip)
+    if url is not None:
+        st.markdown(audio_html(url, hidden=True), unsafe_allow_html=True)
 
 def show_game():
     # Initialize or retrieve session state variables
-    if "question_index" not in st.session_state:
-        st.session_state.question_index = 0
-    if "score" not in st.session_state:
-        st.session_state.score = 0
-    if "timer_start" not in st.session_state:
-        st.session_state.timer_start = time.time()
-    if "answered" not in st.session_state:
-        st.session_state.answered = False
+    engine.ensure_game(st.session_state)
     if "feedback" not in st.session_state:
         st.session_state.feedback = None
     
-    # Load questions
-    questions = load_questions()
-    total_questions = len(questions)
+    # The deck holds question IDs drawn when the game started
+    total_questions = engine.total_questions(st.session_state)
     
-    if total_questions < 20:
-        st.warning(f"Warning: Only {total_questions} questions available. The quiz is designed for 20 questions.")
+    if question_count() < QUESTIONS_PER_GAME:
+        st.warning(f"Warning: Only {question_count()} questions available. The quiz is designed for {QUESTIONS_PER_GAME} questions.")
     
     # Display header with score - FIX SCORE DISPLAY FORMAT
     col1, col2 = st.columns([3, 1])
@@ -31,24 +80,27 @@ def show_game():
     with col2:
         # Show questions answered as denominator rather than question index
         st.metric("Score", f"{st.session_state.score}/{total_questions}")
+
+    # Get current question, skipping any deleted mid-game
+    question = engine.current_question(st.session_state)
     # End game if all questions answered
-    if st.session_state.question_index >= min(20, total_questions):
+    if question is None:
         show_game_end()
         return
     
-    # Get current question
-    question = questions.iloc[st.session_state.question_index]
-    
     # Display question
     st.subheader(f"Question {st.session_state.question_index + 1}: {question['question']}")
+    show_clip(question)
     
-    # Calculate remaining time
-    elapsed = time.time() - st.session_state.timer_start
-    remaining = max(0, 10 - elapsed)
+    # Time's up if the deadline passed while no rerun was happening
+    if not st.session_state.answered and engine.is_expired(st.session_state):
+        expire_question()
     
     # Display timer
-    progress = st.progress(remaining / 10)
-    st.write(f"Time remaining: {int(remaining)} seconds")
+    if st.session_state.answered:
+        st.progress(0.0)
+    else:
+        show_countdown()
     
     # Display options
     options = {
@@ -77,38 +129,39 @@ def show_game():
             st.error(st.session_state.feedback)
         else:
             st.warning(st.session_state.feedback)
+    if st.session_state.answered:
+        prefetch_next_clip()
     
     # Check answer when selected
     if not st.session_state.answered and st.button("Submit Answer", key="submit_answer"):
-        correct_answer = question["correct"]
-        if selected_option == correct_answer:
-            st.session_state.score += 1
+        # The server's deadline is authoritative, whatever the browser showed
+        outcome, correct_answer = engine.submit_answer(
+            st.session_state, selected_option, st.session_state.get("user_id", "")
+        )
+        if outcome == engine.TIMEOUT:
+            st.session_state.feedback = "Time's up! ⏰"
+        elif outcome == engine.CORRECT:
             st.session_state.feedback = f"✅ Correct! The answer is {correct_answer}."
         else:
             st.session_state.feedback = f"❌ Wrong! The correct answer is {correct_answer}."
-        st.session_state.answered = True
         st.rerun()
     
     # Next question button
     if st.session_state.answered and st.button("Next Question", key="next_question"):
-        st.session_state.question_index += 1
-        st.session_state.timer_start = time.time()
-        st.session_state.answered = False
-        st.session_state.feedback = None
+        advance_question()
         st.rerun()
+
+@st.experimental_fragment(run_every=1)
+def show_countdown():
+    """Countdown that reruns on its own once a second without rerunning the page"""
+    inc("quiz_fragment_runs_total", description="Partial reruns of page fragments", fragment="countdown")
+    remaining = engine.remaining_seconds(st.session_state)
+    st.progress(remaining / QUESTION_SECONDS)
+    st.write(f"Time remaining: {int(remaining)} seconds")
     
-  
- 
-    
-    # Auto-advance if time's up
+    # Rerun the whole page once, when time runs out
     if remaining <= 0 and not st.session_state.answered:
-        st.session_state.feedback = "Time's up! ⏰"
-        st.session_state.answered = True
-        st.rerun()
-    
-    # Auto-refresh timer
-    if not st.session_state.answered and remaining > 0:
-        time.sleep(0.1)  # Small delay to prevent excessive reruns
+        expire_question()
         st.rerun()
 
 def show_game_end():
@@ -116,25 +169,18 @@ def show_game_end():
     
     # Display final score
     st.balloons()
-    st.success(f"Congratulations! Your final score is: {st.session_state.score}/20")
+    st.success(f"Congratulations! Your final score is: {st.session_state.score}/{len(st.session_state.deck)}")
     
-    # Save score to leaderboard
+    # Save score to leaderboard, once per game however often this page reruns;
+    # a score refused by the rate limits is kept in the session and saved later
     if st.session_state.get("logged_in", False):
-        save_score(
-            st.session_state.user_id,
-            st.session_state.score,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        )
+        engine.finish(st.session_state, st.session_state.user_id, save=save_score_or_defer)
     
     # Show options
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Play Again"):
-            st.session_state.question_index = 0
-            st.session_state.score = 0
-            st.session_state.timer_start = time.time()
-            st.session_state.answered = False
-            st.session_state.feedback = None
+            reset_game()
             st.experimental_rerun()
     with col2:
         if st.button("View Leaderboard"):
@@ -1,40 +1,22 @@
 import streamlit as st
-import pandas as pd
-from utils import load_scores, load_users
+from game import reset_game
+from utils import get_top_scores
 
 def show_leaderboard():
     st.title("🏆 Leaderboard 🏆")
     
-    # Load scores and users data
-    scores_df = load_scores()
-    users_df = load_users()
-
-    # Ensure matching data types
-    scores_df["user_id"] = scores_df["user_id"].astype(str)
-    users_df["id"] = users_df["id"].astype(str)
+    # Each window is read from its own pre-aggregated bucket
+    windows = {"All time": "all", "This month": "month", "This week": "week", "Today": "today"}
+    window = st.radio("Show", list(windows), horizontal=True, key="leaderboard_window")
     
-    if scores_df.empty:
+    # Best score per player, straight from the leaderboard index
+    top_10 = get_top_scores(10, window=windows[window])
+
+    if top_10.empty:
         st.info("No scores yet. Be the first to play!")
     else:
-        # Sort scores by score (descending) and date (ascending)
-        sorted_scores = scores_df.sort_values(["score", "date"], ascending=[False, True])
-        
-        # Get the highest score per user
-        best_scores = sorted_scores.groupby("user_id", as_index=False).first()
-
-        # Merge with usernames
-        leaderboard = best_scores.merge(users_df[["id", "name"]], left_on="user_id", right_on="id")
-
-        # Sort final leaderboard again in case grouping affected order
-        leaderboard = leaderboard.sort_values(["score", "date"], ascending=[False, True])
-        # Keep only the highest score per user
-        leaderboard = leaderboard.sort_values("score", ascending=False).drop_duplicates(subset=["user_id"])
-        
-        # Take top 10
-        top_10 = leaderboard.head(10)
-        
         # Display formatted leaderboard
-        st.write("### Top 10 Players")
+        st.write(f"### Top 10 Players ({window.lower()})")
         
         # Create a clean df for display
         display_df = top_10[["name", "score", "date"]].reset_index(drop=True)
@@ -52,11 +34,7 @@ def show_leaderboard():
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Play Again"):
-            st.session_state.question_index = 0
-            st.session_state.score = 0
-            st.session_state.timer_start = 0
-            st.session_state.answered = False
-            st.session_state.feedback = None
+            reset_game()
             st.session_state.page = "game"
             st.experimental_rerun()
     with col2:
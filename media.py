@@ -0,0 +1,251 @@
+"""Audio clips for "name this hymn" questions.
+
+A question's optional ``media`` column names an audio file under
+``data/media``, optionally followed by a Media Fragments time range:
+``hymns/amazing_grace.mp3#t=30,45`` plays seconds 30 to 45, and without an
+end the clip is ``CLIP_SECONDS`` long. ``prepare_clip`` trims and transcodes
+each clip once to small mono MP3 (``CLIP_BITRATE``) in ``data/media_cache``,
+under a name that changes when the source or the range does, so the file
+can be cached by browsers for good. Without ``ffmpeg`` on the PATH the
+source is cached as it is and the range is left to the browser, which
+honours ``#t=`` in the URL.
+
+Clips are built on a small thread pool, one build per clip however many
+sessions ask for it. Pages and the API never wait for a build: until the
+clip is ready they get the untrimmed source, served from ``/media/source/``
+with the range left to the browser.
+
+The JSON API process (``api.py``) serves the cache at ``/media/`` with HTTP
+range requests and long-lived caching. Set ``QUIZ_MEDIA_URL`` to where
+browsers reach it (e.g. ``http://quiz.local:8600/media``) so the game page
+can play clips from there and prefetch the next one; without it the page
+hands the clip to Streamlit. Prepare every clip ahead of an event with::
+
+    python media.py build
+"""
+import hashlib
+import html
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import metrics
+from storage import DATA_DIR
+
+# --- Configuration ---
+MEDIA_DIR = os.path.join(DATA_DIR, "media")
+CACHE_DIR = os.path.join(DATA_DIR, "media_cache")
+MEDIA_URL = os.environ.get("QUIZ_MEDIA_URL", "").rstrip("/") or None
+CLIP_SECONDS = 15
+CLIP_BITRATE = "48k"
+FFMPEG = shutil.which("ffmpeg")
+BUILD_WORKERS = 2
+SOURCE_PREFIX = "source/"  # Clip files under this prefix are untrimmed sources in MEDIA_DIR
+
+_FRAGMENT = re.compile(r"t=(\d+(?:\.\d+)?)?(?:,(\d+(?:\.\d+)?))?")
+
+# file: name in CACHE_DIR, or SOURCE_PREFIX + path in MEDIA_DIR while it is built; start: where playback of that file begins;
+# fragment: "#t=start,end" still to apply in the browser, or "" once trimmed
+Clip = namedtuple("Clip", ["file", "start", "fragment"])
+
+_clips = {}   # (reference, source size, source mtime) -> Clip, once built
+_builds = {}  # same key -> Future of the build in progress
+_failed = {}  # same key -> error message of a build that failed
+_lock = threading.Lock()  # Guards the three dicts above, never held during a build
+_executor = ThreadPoolExecutor(max_workers=BUILD_WORKERS, thread_name_prefix="clip-build")
+
+
+class MediaError(Exception):
+    """Raised when a question's clip cannot be prepared"""
+
+
+def parse_reference(reference):
+    """Split a media reference into (path relative to MEDIA_DIR, start, end seconds)"""
+    path, _, fragment = str(reference).strip().partition("#")
+    path = os.path.normpath(path)
+    if not path or path == "." or os.path.isabs(path) or path.split(os.sep)[0] == "..":
+        raise ValueError(f"Media must be a file inside {MEDIA_DIR}: {reference}")
+    start, end = 0.0, None
+    if fragment:
+        match = _FRAGMENT.fullmatch(fragment)
+        if match is None:
+            raise ValueError(f"Media time range must look like #t=30,45: {reference}")
+        start = float(match.group(1) or 0)
+        end = float(match.group(2)) if match.group(2) else None
+    if end is None:
+        end = start + CLIP_SECONDS
+    if end <= start:
+        raise ValueError(f"Media time range ends before it starts: {reference}")
+    return path, start, end
+
+
+def is_valid_reference(reference):
+    """True if ``reference`` is a well-formed media reference (the file need not exist yet)"""
+    try:
+        parse_reference(reference)
+    except ValueError:
+        return False
+    return True
+
+
+def question_media(question):
+    """Return the media reference of a question dict, or None for a text-only question"""
+    reference = question.get("media")
+    if reference is None or pd.isna(reference) or not str(reference).strip():
+        return None
+    return str(reference).strip()
+
+
+def prepare_clip(reference, wait=True):
+    """Return the cached Clip for ``reference``, trimming and transcoding it on first use.
+
+    With ``wait=False`` a clip still being built is returned as its untrimmed
+    source instead, so request handlers never wait for ffmpeg.
+    """
+    try:
+        path, start, end = parse_reference(reference)
+        source = os.path.join(MEDIA_DIR, path)
+        stat = os.stat(source)
+    except (ValueError, OSError) as e:
+        raise MediaError(str(e)) from e
+    key = (reference, stat.st_size, stat.st_mtime_ns)
+    clip = _clips.get(key)
+    if clip is not None:
+        return clip
+    with _lock:
+        if key in _failed:
+            raise MediaError(_failed[key])
+        clip = _clips.get(key)
+        if clip is None:
+            target = _target(source, start, end, stat)
+            if os.path.exists(os.path.join(CACHE_DIR, target.file)):
+                # Built by an earlier run
+                clip = _clips[key] = target
+            else:
+                future = _builds.get(key)
+                if future is None:
+                    future = _builds[key] = _executor.submit(_build_clip, key, target, source, start, end)
+    if clip is not None:
+        return clip
+    if not wait:
+        return Clip(SOURCE_PREFIX + path.replace(os.sep, "/"), start, f"#t={start:g},{end:g}")
+    return future.result()
+
+
+def _target(source, start, end, stat):
+    """Return the Clip that ``source`` trimmed to ``start``-``end`` is cached as"""
+    version = hashlib.sha256(
+        f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{start}|{end}|{CLIP_BITRATE}|{bool(FFMPEG)}".encode()
+    ).hexdigest()[:12]
+    stem, extension = os.path.splitext(os.path.basename(source))
+    if FFMPEG:
+        return Clip(f"{stem}-{version}.mp3", 0, "")
+    return Clip(f"{stem}-{version}{extension}", start, f"#t={start:g},{end:g}")
+
+
+def _build_clip(key, clip, source, start, end):
+    """Build a clip on the pool and record the result (runs on a clip-build thread)"""
+    try:
+        _build(clip, source, start, end)
+    except MediaError as e:
+        with _lock:
+            _failed[key] = str(e)
+        raise
+    else:
+        with _lock:
+            _clips[key] = clip
+        return clip
+    finally:
+        with _lock:
+            _builds.pop(key, None)
+
+
+def _build(clip, source, start, end):
+    path = os.path.join(CACHE_DIR, clip.file)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    began = time.perf_counter()
+    try:
+        if FFMPEG:
+            subprocess.run(
+                [FFMPEG, "-v", "error", "-y", "-ss", f"{start:g}", "-t", f"{end - start:g}", "-i", source,
+                 "-vn", "-ac", "1", "-b:a", CLIP_BITRATE, "-f", "mp3", tmp_path],
+                check=True, capture_output=True, timeout=120
+            )
+        else:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, path)
+    except (OSError, subprocess.SubprocessError) as e:
+        os.unlink(tmp_path)
+        raise MediaError(f"Could not prepare {source}: {e}") from e
+    metrics.observe(
+        "quiz_media_prepare_seconds", time.perf_counter() - began,
+        description="Time to trim and transcode one audio clip", transcoded=str(bool(FFMPEG))
+    )
+
+
+def clip_path(clip):
+    """Return the file system path of a prepared clip, or of the source standing in for it"""
+    if clip.file.startswith(SOURCE_PREFIX):
+        return os.path.join(MEDIA_DIR, clip.file[len(SOURCE_PREFIX):])
+    return os.path.join(CACHE_DIR, clip.file)
+
+
+def clip_url(clip, base=MEDIA_URL):
+    """Return the URL of a prepared clip under ``base``, or None if no media server is configured"""
+    if base is None:
+        return None
+    if clip.file.startswith(SOURCE_PREFIX):
+        # Sources can be replaced under the same name, so they are not cached for good
+        return f"{base}/{clip.file}{clip.fragment}"
+    # ``v`` makes the media server send far-future caching headers
+    return f"{base}/{clip.file}?v=1{clip.fragment}"
+
+
+def audio_html(url, hidden=False):
+    """Return an ``<audio>`` element that starts downloading ``url`` straight away"""
+    src = html.escape(url, quote=True)
+    if hidden:
+        return f'<audio preload="auto" src="{src}" style="display:none"></audio>'
+    return f'<audio controls preload="auto" src="{src}" style="width:100%"></audio>'
+
+
+def prepare_all(questions):
+    """Prepare the clips of every question in ``questions`` (DataFrame chunks); returns (ready, [(id, error)])"""
+    ready, failures = [], []
+    for chunk in questions:
+        for question in chunk.to_dict("records"):
+            reference = question_media(question)
+            if reference is None:
+                continue
+            try:
+                ready.append((question["id"], prepare_clip(reference)))
+            except MediaError as e:
+                failures.append((question["id"], str(e)))
+    return ready, failures
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        print("Usage: python media.py build")
+        sys.exit(2)
+    from storage import create_storage
+
+    ready, failures = prepare_all(create_storage().iter_questions(1000))
+    for question_id, clip in ready:
+        print(f"Question {question_id}: {clip.file} ({os.path.getsize(clip_path(clip)) / 1024:.1f} KB)")
+    for question_id, error in failures:
+        print(f"Question {question_id}: {error}")
+    if not FFMPEG:
+        print("ffmpeg not found: clips were cached untrimmed at their original bitrate")
+    print(f"{len(ready)} clips ready, {len(failures)} failed")
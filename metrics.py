@@ -0,0 +1,260 @@
+"""Process-wide counters, gauges and latency histograms.
+
+Page handlers routed in ``app.py`` and the data functions in ``utils`` record
+their call counts and latencies here; the storage backends record bytes and
+rows read and written. Everything is shown on the admin "Performance" tab and
+can be exported in Prometheus text format:
+
+- ``QUIZ_METRICS_FILE=/path/metrics.prom`` rewrites that file every
+  ``QUIZ_METRICS_INTERVAL`` seconds (for node_exporter's textfile collector).
+  A process with ``QUIZ_WORKER_ID`` set (each worker, and the API) writes
+  ``/path/metrics-<id>.prom`` instead, with a ``worker`` label on every
+  series, so processes sharing the setting never overwrite each other
+- ``QUIZ_METRICS_PORT=9100`` serves ``/metrics`` over HTTP
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+METRICS_FILE = os.environ.get("QUIZ_METRICS_FILE")
+METRICS_PORT = os.environ.get("QUIZ_METRICS_PORT")
+WORKER_ID = os.environ.get("QUIZ_WORKER_ID")
+EXPORT_INTERVAL = float(os.environ.get("QUIZ_METRICS_INTERVAL", "15"))
+SESSION_TIMEOUT = 300  # Seconds without a rerun before a session stops counting as active
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SAMPLES = 1000  # Samples kept per histogram for percentiles on the admin tab
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> Histogram
+_gauges = {}      # name -> callback returning {labels: value}
+_help = {}
+_sessions = {}    # session id -> last seen
+_exporters_started = False
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent samples"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+
+def _percentile(samples, pct):
+    """Return the ``pct`` percentile of already sorted samples"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+# --- Recording ---
+def inc(name, value=1, description="", **labels):
+    """Add ``value`` to a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        _help.setdefault(name, description)
+
+
+def observe(name, seconds, description="", **labels):
+    """Record a latency sample"""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+            _help.setdefault(name, description)
+        histogram.observe(seconds)
+
+
+def gauge(name, callback, description=""):
+    """Register a gauge; ``callback`` returns {labels tuple: value} at export time"""
+    with _lock:
+        _gauges[name] = callback
+        _help.setdefault(name, description)
+
+
+class timer:
+    """Context manager that counts and times a block under ``name``"""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(f"{self.name}_seconds", time.perf_counter() - self.start, description=f"Latency of {self.name}", **self.labels)
+        inc(f"{self.name}_total", description=f"Calls of {self.name}", **self.labels)
+        return False
+
+
+def timed(name, **labels):
+    """Decorator that counts and times every call of a function"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, function=fn.__name__, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def touch_session(session_id):
+    """Mark a browser session as active"""
+    now = time.monotonic()
+    with _lock:
+        _sessions[session_id] = now
+        if len(_sessions) % 100 == 0:
+            for sid, seen in list(_sessions.items()):
+                if now - seen > SESSION_TIMEOUT:
+                    del _sessions[sid]
+
+
+def active_sessions():
+    """Return the number of sessions that reran in the last few minutes"""
+    now = time.monotonic()
+    with _lock:
+        return sum(1 for seen in _sessions.values() if now - seen <= SESSION_TIMEOUT)
+
+
+# --- Reading ---
+def snapshot():
+    """Return counters, histograms and gauges as plain Python data"""
+    # Copy under the lock and sort outside it, so observe() never waits on a scrape
+    with _lock:
+        counters = dict(_counters)
+        copies = {key: (h.count, h.sum, list(h.buckets), list(h.recent)) for key, h in _histograms.items()}
+        gauges = dict(_gauges)
+    histograms = {}
+    for key, (count, total, buckets, recent) in copies.items():
+        recent.sort()
+        histograms[key] = {
+            "count": count,
+            "sum": total,
+            "buckets": buckets,
+            "p50": _percentile(recent, 50),
+            "p95": _percentile(recent, 95),
+            "p99": _percentile(recent, 99),
+        }
+    gauge_values = {}
+    for name, callback in gauges.items():
+        try:
+            gauge_values[name] = callback()
+        except Exception:
+            gauge_values[name] = {}
+    gauge_values["quiz_active_sessions"] = {(): active_sessions()}
+    return {"counters": counters, "histograms": histograms, "gauges": gauge_values}
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus(common_labels=()):
+    """Return every metric in Prometheus text exposition format, with ``common_labels`` on every series"""
+    common_labels = tuple(common_labels)
+    data = snapshot()
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            if _help.get(name):
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(data["counters"].items()):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(common_labels + labels)} {value}")
+    for (name, labels), h in sorted(data["histograms"].items()):
+        header(name, "histogram")
+        labels = common_labels + labels
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), h["buckets"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {h['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {h['count']}")
+    for name, values in sorted(data["gauges"].items()):
+        header(name, "gauge")
+        for labels, value in values.items():
+            lines.append(f"{name}{_format_labels(common_labels + tuple(labels))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Export ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def metrics_file_path(path, worker_id=WORKER_ID):
+    """Return the metrics file of one process: ``metrics.prom`` becomes ``metrics-<worker_id>.prom``"""
+    if not worker_id:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}-{worker_id}{extension}"
+
+
+def _write_file_forever(path, common_labels):
+    while True:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(render_prometheus(common_labels))
+        os.replace(tmp_path, path)
+        time.sleep(EXPORT_INTERVAL)
+
+
+def start_exporters():
+    """Start the file and HTTP exporters configured by environment variables, once"""
+    global _exporters_started
+    with _lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if METRICS_FILE:
+        common_labels = (("worker", WORKER_ID),) if WORKER_ID else ()
+        threading.Thread(
+            target=_write_file_forever, args=(metrics_file_path(METRICS_FILE), common_labels), name="metrics-file", daemon=True
+        ).start()
+    if METRICS_PORT:
+        server = ThreadingHTTPServer(("127.0.0.1", int(METRICS_PORT)), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
@@ -0,0 +1,48 @@
+import streamlit as st
+import pandas as pd
+from game import reset_game
+from utils import get_player_stats, get_user_id
+
+def show_my_stats():
+    if not st.session_state.get("logged_in", False):
+        st.warning("Please login to see your statistics")
+        st.session_state.page = "login"
+        st.experimental_rerun()
+        return
+
+    st.title("📊 My Stats")
+
+    # Rollups kept up to date on every saved score, so this is a lookup
+    stats = get_player_stats(get_user_id(st.session_state.username))
+
+    if stats is None:
+        st.info("You haven't finished a game yet. Play one to start your history!")
+    else:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Games played", stats["attempts"])
+        col2.metric("Best score", stats["best"])
+        col3.metric("Average score", f"{stats['average']:.1f}")
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Current streak", f"{stats['current_streak']} day(s)")
+        col2.metric("Longest streak", f"{stats['longest_streak']} day(s)")
+        col3.metric("Trend", f"{stats['trend']:+.1f}", help="Your recent games compared with the ones before them")
+
+        st.caption(f"Best score reached on {stats['best_date']}")
+
+        # Most recent games
+        st.write("### Recent Games")
+        recent = pd.DataFrame(stats["recent"], columns=["Date", "Score"])
+        st.line_chart(recent, x="Date", y="Score")
+
+    # Navigation buttons
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Play Again"):
+            reset_game()
+            st.session_state.page = "game"
+            st.experimental_rerun()
+    with col2:
+        if st.button("Main Menu"):
+            st.session_state.page = "welcome"
+            st.experimental_rerun()
@@ -0,0 +1,105 @@
+"""Password hashing and verification.
+
+Passwords are stored as salted PBKDF2-SHA256 hashes in the form
+``pbkdf2_sha256$<iterations>$<salt>$<hash>``. The cost is set with
+``QUIZ_PBKDF2_ITERATIONS``. Accounts created before this used a bare SHA-256
+hex digest; those still verify, and ``verify_password`` reports that they
+need rehashing so the caller can upgrade them on the next successful login.
+
+Hashing runs on a small bounded worker pool (``QUIZ_HASH_WORKERS`` threads,
+``QUIZ_HASH_QUEUE`` waiting jobs). hashlib releases the GIL while it works,
+so a burst of logins at the start of an event cannot take every core away
+from the sessions already playing; when the queue is full, callers get
+``PasswordPoolBusy`` instead of piling up. Successful verifications are
+remembered for ``QUIZ_VERIFIED_TTL`` seconds so a repeated login with the
+same password does not pay for the KDF again.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+ALGORITHM = "pbkdf2_sha256"
+ITERATIONS = int(os.environ.get("QUIZ_PBKDF2_ITERATIONS", "600000"))
+WORKERS = int(os.environ.get("QUIZ_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_QUEUED = int(os.environ.get("QUIZ_HASH_QUEUE", "64"))
+QUEUE_TIMEOUT = float(os.environ.get("QUIZ_HASH_QUEUE_TIMEOUT", "5"))
+VERIFIED_TTL = float(os.environ.get("QUIZ_VERIFIED_TTL", "300"))
+VERIFIED_MAX_ENTRIES = 10000
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many hashing jobs are already waiting"""
+
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="password-hash")
+_slots = threading.BoundedSemaphore(MAX_QUEUED)
+
+# Verified (stored hash, password) pairs; keyed by an HMAC so no password is kept
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+_verified_secret = secrets.token_bytes(32)
+
+
+def _run(fn, *args):
+    """Run ``fn`` on the hashing pool and wait for the result"""
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        raise PasswordPoolBusy("Too many logins in progress, please try again")
+    try:
+        return _executor.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations).hex()
+
+
+def _hash(password, iterations):
+    salt = secrets.token_bytes(16)
+    return f"{ALGORITHM}${iterations}${salt.hex()}${_pbkdf2(password, salt, iterations)}"
+
+
+def _check(password, stored):
+    """Return (matches, needs_rehash) for a stored hash"""
+    parts = str(stored).split("$")
+    if len(parts) == 4 and parts[0] == ALGORITHM:
+        iterations = int(parts[1])
+        matches = hmac.compare_digest(_pbkdf2(password, bytes.fromhex(parts[2]), iterations), parts[3])
+        return matches, iterations != ITERATIONS
+    # Legacy unsalted SHA-256
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy, str(stored)), True
+
+
+def hash_password(password):
+    """Hash a password for storage"""
+    return _run(_hash, password, ITERATIONS)
+
+
+def verify_password(password, stored):
+    """Check a password against a stored hash.
+
+    Returns (matches, needs_rehash); ``needs_rehash`` is True for legacy
+    SHA-256 hashes and hashes made with a different iteration count.
+    """
+    key = hmac.new(_verified_secret, f"{stored}\0{password}".encode(), hashlib.sha256).digest()
+    now = time.monotonic()
+    with _verified_lock:
+        expires = _verified.get(key)
+        if expires is not None and expires > now:
+            return True, False
+
+    matches, needs_rehash = _run(_check, password, stored)
+    if matches and not needs_rehash:
+        with _verified_lock:
+            _verified[key] = now + VERIFIED_TTL
+            _verified.move_to_end(key)
+            while len(_verified) > VERIFIED_MAX_ENTRIES:
+                _verified.popitem(last=False)
+    return matches, needs_rehash
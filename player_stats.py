@@ -0,0 +1,160 @@
+"""Per-player score rollups for the "My Stats" page.
+
+``PlayerStatsIndex`` keeps a small running summary per user (attempts, total,
+best, play streaks and the most recent scores) that ``save_score`` updates in
+O(1), so a player's statistics never need a scan of the score history. A
+streak is a run of consecutive calendar days with at least one game.
+
+Scores compacted into the archive are folded in from their monthly
+summaries (see ``retention.py``), which carry just enough (count, total,
+best, days played, last scores) to give the same rollup as the scores did.
+"""
+import json
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+RECENT_SCORES = 10  # Scores kept per player for the trend
+
+
+def parse_date(value):
+    """Parse a stored score date, or return None if it is not a timestamp"""
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+class PlayerStats:
+    """Running totals for one player"""
+
+    __slots__ = ("attempts", "total", "best", "best_date", "last_day", "current_streak", "longest_streak", "recent")
+
+    def __init__(self):
+        self.attempts = 0
+        self.total = 0
+        self.best = None
+        self.best_date = None
+        self.last_day = None
+        self.current_streak = 0
+        self.longest_streak = 0
+        self.recent = deque(maxlen=RECENT_SCORES)  # (date, score), oldest first
+
+    def add(self, score, date):
+        self.attempts += 1
+        self.total += score
+        if self.best is None or score > self.best:
+            self.best, self.best_date = score, date
+        self.recent.append((date, score))
+
+        parsed = parse_date(date)
+        if parsed is not None:
+            self.add_day(parsed.date())
+
+    def add_summary(self, games, total, best, best_date, days, recent):
+        """Fold in a compacted period as if its scores were added one by one"""
+        self.attempts += games
+        self.total += total
+        if self.best is None or best > self.best:
+            self.best, self.best_date = best, best_date
+        self.recent.extend(recent)
+        for day in days:
+            self.add_day(day)
+
+    def add_day(self, day):
+        """Extend the streaks with a day played"""
+        if self.last_day is None or day == self.last_day + timedelta(days=1):
+            self.current_streak += 1
+        elif day > self.last_day:
+            self.current_streak = 1
+        # Same day or an older date leaves the streak as it is
+        if self.last_day is None or day > self.last_day:
+            self.last_day = day
+        self.longest_streak = max(self.longest_streak, self.current_streak)
+
+    def trend(self):
+        """Average of the newer half of the recent scores minus the older half"""
+        scores = [score for _, score in self.recent]
+        if len(scores) < 2:
+            return 0.0
+        half = len(scores) // 2
+        older, newer = scores[:half], scores[-half:]
+        return sum(newer) / len(newer) - sum(older) / len(older)
+
+    def as_dict(self, today=None):
+        today = today or datetime.now().date()
+        # A streak only counts as current if the player played today or yesterday
+        active = self.last_day is not None and today - self.last_day <= timedelta(days=1)
+        return {
+            "attempts": self.attempts,
+            "best": self.best,
+            "best_date": self.best_date,
+            "average": self.total / self.attempts if self.attempts else 0.0,
+            "current_streak": self.current_streak if active else 0,
+            "longest_streak": self.longest_streak,
+            "trend": self.trend(),
+            "recent": list(self.recent),
+        }
+
+
+class PlayerStatsIndex:
+    """Score rollups for every player, keyed by user ID"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._stats)
+
+    def add(self, user_id, score, date):
+        """Fold a new score into its player's rollup"""
+        with self._lock:
+            stats = self._stats.get(user_id)
+            if stats is None:
+                stats = self._stats[user_id] = PlayerStats()
+            stats.add(int(score), str(date))
+
+    def remove_user(self, user_id):
+        """Forget a user's statistics"""
+        with self._lock:
+            self._stats.pop(user_id, None)
+
+    def rebuild(self, scores, summaries=None):
+        """Replace the index contents from a scores DataFrame and the summaries of compacted scores"""
+        # Streaks and recent scores assume scores arrive oldest first
+        parsed = pd.to_datetime(scores["date"].astype(str), errors="coerce", format="ISO8601")
+        ordered = scores.assign(_parsed=parsed).sort_values("_parsed", kind="stable", na_position="first")
+        undated = ordered[ordered["_parsed"].isna()]
+        dated = ordered[ordered["_parsed"].notna()]
+        rollups = {}
+
+        def stats_for(user_id):
+            stats = rollups.get(str(user_id))
+            if stats is None:
+                stats = rollups[str(user_id)] = PlayerStats()
+            return stats
+
+        for user_id, score, date in zip(undated["user_id"], undated["score"], undated["date"]):
+            stats_for(user_id).add(int(score), str(date))
+        # Compacted scores are older than every dated score still in the table
+        if summaries is not None:
+            for summary in summaries.sort_values("period", kind="stable").to_dict("records"):
+                year, month = (int(part) for part in str(summary["period"]).split("-"))
+                stats_for(summary["user_id"]).add_summary(
+                    int(summary["games"]), int(summary["total"]), int(summary["best"]), str(summary["best_date"]),
+                    [datetime(year, month, int(day)).date() for day in str(summary["days"]).split()],
+                    [(str(played), int(score)) for played, score in json.loads(summary["recent"])],
+                )
+        for user_id, score, date in zip(dated["user_id"], dated["score"], dated["date"]):
+            stats_for(user_id).add(int(score), str(date))
+        with self._lock:
+            self._stats = rollups
+
+    def get(self, user_id):
+        """Return a user's statistics as a dict, or None if they have no scores"""
+        with self._lock:
+            stats = self._stats.get(user_id)
+            return stats.as_dict() if stats is not None else None
@@ -0,0 +1,58 @@
+import math
+import time
+
+import streamlit as st
+from ratelimit import RateLimited, guarded, score_keys, score_limiter, write_queue
+from utils import save_score
+
+def refuse(error):
+    """Tell the player an attempt was refused (a ratelimit.RateLimited error).
+
+    Too many attempts from this player gets an inline message; an overloaded
+    server sends them to the please-wait page, which returns them to where
+    they were once the wait is over.
+    """
+    if error.scope == "client":
+        st.error(f"Too many attempts. Please try again in {math.ceil(error.retry_after)} seconds.")
+        return
+    st.session_state.retry_at = time.time() + error.retry_after
+    st.session_state.retry_page = st.session_state.page
+    st.session_state.page = "please_wait"
+    st.experimental_rerun()
+
+def save_score_or_defer(user_id, score, date):
+    """Save a score within the score limits; a refused one is kept and retried by save_deferred_scores"""
+    try:
+        with guarded(score_limiter, write_queue, score_keys(user_id)):
+            save_score(user_id, score, date)
+    except RateLimited as e:
+        st.session_state.setdefault("deferred_scores", []).append((user_id, score, date))
+        st.info("Your score is kept and will be saved as soon as possible.")
+        refuse(e)
+
+def save_deferred_scores():
+    """Try again to save refused scores (runs on every rerun while any are waiting, and never waits)"""
+    deferred = st.session_state.get("deferred_scores", [])
+    while deferred:
+        user_id, score, date = deferred[0]
+        try:
+            with guarded(score_limiter, write_queue, score_keys(user_id), timeout=0):
+                save_score(user_id, score, date)
+        except RateLimited:
+            return
+        deferred.pop(0)
+
+def show_please_wait():
+    st.title("Please Wait")
+    st.write("Lots of people are joining at once, so you are in the queue. This only takes a moment.")
+    show_wait_countdown()
+
+@st.experimental_fragment(run_every=1)
+def show_wait_countdown():
+    """Count down without rerunning the page, then send the player back"""
+    remaining = st.session_state.get("retry_at", 0) - time.time()
+    if remaining > 0:
+        st.write(f"Trying again in {math.ceil(remaining)} seconds...")
+    else:
+        st.session_state.page = st.session_state.get("retry_page", "welcome")
+        st.rerun()
@@ -1,6 +1,6 @@
 # Create a new file called pregame.py or add this to an existing file
 import streamlit as st
-import time
+from game import reset_game
 
 def show_pregame():
     st.title("Get Ready to Play!")
@@ -18,17 +18,19 @@ def show_pregame():
     Good luck and enjoy the quiz!
     """)
     
+    adaptive = st.checkbox(
+        "Adaptive difficulty",
+        value=st.session_state.get("adaptive", False),
+        help="Each next question is picked to match how well you are doing"
+    )
+    
     col1, col2 = st.columns(2)
     
     with col1:
         # This button will actually start the game
         if st.button("Start Game", key="start_game_button"):
             # Initialize game state variables
-            st.session_state.question_index = 0
-            st.session_state.score = 0
-            st.session_state.timer_start = time.time()
-            st.session_state.answered = False
-            st.session_state.feedback = None
+            reset_game(adaptive=adaptive)
             # Navigate to the game page
             st.session_state.page = "game"
             st.experimental_rerun()
@@ -0,0 +1,169 @@
+"""Best-score-per-user index for the leaderboard.
+
+The index keeps each player's best attempt in a list sorted by
+(score descending, date ascending), which is the same order the leaderboard
+has always used: the highest score wins and ties go to whoever got there
+first. New scores are placed with a binary search, so recording a score and
+reading the top K never touch the full score history.
+
+``WindowedLeaderboard`` keeps one such index per calendar day, ISO week and
+month, keyed by the parsed score timestamp, so the "today", "this week" and
+"this month" boards are read straight from their bucket. Buckets of past
+days, weeks and months are never read again and are dropped as scores come in.
+"""
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+
+import pandas as pd
+
+WINDOWS = ("today", "week", "month")
+
+
+def _rank_key(user_id, score, date):
+    return (-score, date, user_id)
+
+
+class LeaderboardIndex:
+    """Sorted index of each user's best score"""
+
+    def __init__(self):
+        self._best = {}   # user_id -> (score, date)
+        self._order = []  # sorted rank keys, best first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._best)
+
+    def add(self, user_id, score, date):
+        """Record a score, keeping it only if it beats the user's current best"""
+        score = int(score)
+        date = str(date)
+        with self._lock:
+            current = self._best.get(user_id)
+            if current is not None:
+                if _rank_key(user_id, score, date) >= _rank_key(user_id, *current):
+                    return False
+                self._remove(user_id, current)
+            self._best[user_id] = (score, date)
+            insort(self._order, _rank_key(user_id, score, date))
+            return True
+
+    def remove_user(self, user_id):
+        """Forget a user's best score"""
+        with self._lock:
+            current = self._best.pop(user_id, None)
+            if current is not None:
+                self._remove(user_id, current)
+
+    def rebuild(self, scores, summaries=None):
+        """Replace the index contents from a scores DataFrame and the summaries of compacted scores"""
+        if summaries is not None:
+            # Each summary's best attempt stands in for the compacted scores of its period
+            scores = pd.concat([
+                scores[["user_id", "score", "date"]],
+                summaries.rename(columns={"best": "score", "best_date": "date"})[["user_id", "score", "date"]],
+            ], ignore_index=True)
+        best = (
+            scores.sort_values(["score", "date"], ascending=[False, True])
+            .drop_duplicates(subset=["user_id"])
+        )
+        entries = {
+            str(user_id): (int(score), str(date))
+            for user_id, score, date in zip(best["user_id"], best["score"], best["date"])
+        }
+        order = sorted(_rank_key(user_id, *entry) for user_id, entry in entries.items())
+        with self._lock:
+            self._best = entries
+            self._order = order
+
+    def best(self, user_id):
+        """Return a user's best (score, date), or None"""
+        return self._best.get(user_id)
+
+    def top(self, k=None):
+        """Return [(user_id, score, date)] from best to worst, up to ``k`` entries"""
+        with self._lock:
+            order = self._order if k is None else self._order[:k]
+            return [(user_id, -neg_score, date) for neg_score, date, user_id in order]
+
+    # --- Internals ---
+    def _remove(self, user_id, current):
+        key = _rank_key(user_id, *current)
+        i = bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+
+
+def _bucket_keys(timestamp):
+    """Return the (window, period) bucket keys a timestamp falls into"""
+    year, week, _ = timestamp.isocalendar()
+    return (
+        ("today", timestamp.strftime("%Y-%m-%d")),
+        ("week", f"{year}-W{week:02d}"),
+        ("month", timestamp.strftime("%Y-%m")),
+    )
+
+
+class WindowedLeaderboard:
+    """Best score per user within each day, week and month"""
+
+    def __init__(self):
+        self._buckets = {}  # (window, period) -> LeaderboardIndex
+        self._lock = threading.Lock()
+
+    def add(self, user_id, score, date, now=None):
+        """Record a score in the buckets of its day, week and month"""
+        try:
+            timestamp = datetime.fromisoformat(str(date).strip())
+        except ValueError:
+            # Only the all-time board can place scores without a real timestamp
+            return
+        current = dict(_bucket_keys(now or datetime.now()))
+        with self._lock:
+            self._buckets = {key: index for key, index in self._buckets.items() if key[1] >= current[key[0]]}
+        for key in _bucket_keys(timestamp):
+            if key[1] < current[key[0]]:
+                # A late score for a window that is already over
+                continue
+            with self._lock:
+                index = self._buckets.get(key)
+                if index is None:
+                    index = self._buckets[key] = LeaderboardIndex()
+            index.add(user_id, score, date)
+
+    def remove_user(self, user_id):
+        """Forget a user's scores in every bucket"""
+        with self._lock:
+            buckets = list(self._buckets.values())
+        for index in buckets:
+            index.remove_user(user_id)
+
+    def rebuild(self, scores, now=None):
+        """Replace the current (and any later) buckets from a scores DataFrame"""
+        timestamps = pd.to_datetime(scores["date"].astype(str), errors="coerce", format="ISO8601")
+        scores = scores[timestamps.notna()]
+        timestamps = timestamps[timestamps.notna()]
+        periods = {
+            "today": timestamps.dt.strftime("%Y-%m-%d"),
+            "week": timestamps.dt.isocalendar().year.astype(str) + "-W" + timestamps.dt.isocalendar().week.map("{:02d}".format),
+            "month": timestamps.dt.strftime("%Y-%m"),
+        }
+        current = dict(_bucket_keys(now or datetime.now()))
+        buckets = {}
+        for window, period in periods.items():
+            recent = period >= current[window]
+            for key, group in scores[recent].groupby(period[recent]):
+                index = LeaderboardIndex()
+                index.rebuild(group)
+                buckets[(window, key)] = index
+        with self._lock:
+            self._buckets = buckets
+
+    def top(self, window, k=None, now=None):
+        """Return [(user_id, score, date)] for the current ``window``, best first"""
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown leaderboard window: {window}")
+        key = dict(_bucket_keys(now or datetime.now()))[window]
+        index = self._buckets.get((window, key))
+        return index.top(k) if index is not None else []
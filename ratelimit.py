@@ -0,0 +1,232 @@
+"""Rate limits and admission control for logins, registrations and score writes.
+
+``RateLimiter`` keeps a token bucket per key, optionally a looser bucket
+per client address, and one global bucket. An attempt takes a token from
+every bucket it names or, if any is empty, from none, and is refused with the
+time until the emptiest bucket refills. Logins are limited per account as
+tried from one address, and score saves per signed-in player, so one client
+cannot hammer the login form or the score table; the global bucket caps the
+total work a burst can start.
+
+A whole church group or class usually shares one address (one NAT or Wi-Fi
+network), so nothing is limited by address alone at the rate of a single
+player: the per-address login bucket (``QUIZ_AUTH_PER_CLIENT_PER_MINUTE``)
+and registration bucket (``QUIZ_REGISTER_PER_HOUR``) are sized for a room
+full of people starting together. Raise them for larger events.
+
+``AdmissionQueue`` bounds how many of those operations run at once. Up to
+``capacity`` run; up to ``max_waiting`` more wait (at most ``timeout``
+seconds) for a slot; anything beyond that is turned away at once instead of
+queueing on the data files. Both raise ``RateLimited``; ``scope`` tells
+pages whether to show "too many attempts" (``"client"``) or a "please wait"
+page (``"server"``).
+
+Limits are per process, so with several workers (see ``workers.py``) the
+global limits apply to each worker. Behind a reverse proxy that sets
+``X-Forwarded-For``, set ``QUIZ_TRUST_FORWARDED=1`` (``workers.py`` does)
+so clients are told apart by their own address rather than the proxy's.
+The address the proxy appended last is used, since earlier entries come
+from the client and can be forged.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import metrics
+
+# --- Configuration ---
+AUTH_PER_MINUTE = float(os.environ.get("QUIZ_AUTH_PER_MINUTE", "10"))  # Per account, per address
+AUTH_PER_CLIENT_PER_MINUTE = float(os.environ.get("QUIZ_AUTH_PER_CLIENT_PER_MINUTE", "300"))
+AUTH_GLOBAL_PER_SECOND = float(os.environ.get("QUIZ_AUTH_GLOBAL_PER_SECOND", "20"))
+REGISTER_PER_HOUR = float(os.environ.get("QUIZ_REGISTER_PER_HOUR", "200"))  # Per address
+REGISTER_GLOBAL_PER_SECOND = float(os.environ.get("QUIZ_REGISTER_GLOBAL_PER_SECOND", "5"))
+SCORE_PER_MINUTE = float(os.environ.get("QUIZ_SCORE_PER_MINUTE", "6"))  # Per player
+SCORE_GLOBAL_PER_SECOND = float(os.environ.get("QUIZ_SCORE_GLOBAL_PER_SECOND", "100"))
+ADMISSION_ACTIVE = int(os.environ.get("QUIZ_ADMISSION_ACTIVE", "8"))
+ADMISSION_QUEUE = int(os.environ.get("QUIZ_ADMISSION_QUEUE", "32"))
+ADMISSION_WAIT_SECONDS = float(os.environ.get("QUIZ_ADMISSION_WAIT_SECONDS", "3"))
+TRUST_FORWARDED = os.environ.get("QUIZ_TRUST_FORWARDED", "0") == "1"
+MAX_KEYS = 100000  # Per-key buckets kept; the least recently used are dropped
+
+
+class RateLimited(Exception):
+    """Raised when an attempt is refused; ``retry_after`` is in seconds"""
+
+    def __init__(self, action, retry_after, scope):
+        super().__init__(f"{action} refused for {retry_after:.1f}s ({scope} limit)")
+        self.action = action
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+class TokenBucket:
+    """``burst`` tokens, refilled at ``rate`` tokens per second"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def wait(self, now):
+        """Refill for the time elapsed and return seconds until a token is available"""
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per key, optionally per client address, plus one shared global bucket"""
+
+    def __init__(self, action, key_rate, key_burst, global_rate, global_burst,
+                 client_rate=None, client_burst=None, max_keys=MAX_KEYS):
+        self.action = action
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_keys = max_keys
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._buckets = OrderedDict()  # key -> TokenBucket, least recently used first
+        self._lock = threading.Lock()
+
+    def acquire(self, keys=(), now=None, client=None):
+        """Take a token for each key, the client's address and the global bucket, or raise RateLimited and take none"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            buckets = [self._bucket(key, now, self.key_rate, self.key_burst) for key in keys if key]
+            if client and self.client_rate:
+                buckets.append(self._bucket(("client", client), now, self.client_rate, self.client_burst))
+            key_wait = max((bucket.wait(now) for bucket in buckets), default=0.0)
+            global_wait = self._global.wait(now)
+            if key_wait or global_wait:
+                scope = "client" if key_wait >= global_wait else "server"
+                metrics.inc("quiz_rate_limited_total", description="Attempts refused by rate limits",
+                            action=self.action, scope=scope)
+                raise RateLimited(self.action, max(key_wait, global_wait), scope)
+            for bucket in buckets + [self._global]:
+                bucket.tokens -= 1
+
+    def _bucket(self, key, now, rate, burst):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+class AdmissionQueue:
+    """At most ``capacity`` operations at once, with a bounded wait for the rest"""
+
+    def __init__(self, name, capacity=ADMISSION_ACTIVE, max_waiting=ADMISSION_QUEUE, timeout=ADMISSION_WAIT_SECONDS):
+        self.name = name
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._slots = threading.Condition()
+        metrics.gauge(f"quiz_admission_{name}_active", lambda: {(): self.active},
+                      description=f"{name} operations running")
+        metrics.gauge(f"quiz_admission_{name}_waiting", lambda: {(): self.waiting},
+                      description=f"{name} operations waiting for a slot")
+
+    @contextmanager
+    def admit(self, timeout=None):
+        """Hold a slot for the duration of the block; ``timeout`` 0 never waits"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        with self._slots:
+            if self.active >= self.capacity:
+                if self.waiting >= self.max_waiting or timeout <= 0:
+                    self._refuse()
+                self.waiting += 1
+                try:
+                    admitted = self._slots.wait_for(lambda: self.active < self.capacity, timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self._refuse()
+            self.active += 1
+        metrics.observe("quiz_admission_wait_seconds", time.perf_counter() - start,
+                        description="Time spent waiting for an admission slot", queue=self.name)
+        try:
+            yield
+        finally:
+            with self._slots:
+                self.active -= 1
+                self._slots.notify()
+
+    def _refuse(self):
+        metrics.inc("quiz_rate_limited_total", description="Attempts refused by rate limits",
+                    action=self.name, scope="server")
+        raise RateLimited(self.name, self.timeout, "server")
+
+
+# Process-wide limits
+auth_limiter = RateLimiter(
+    "auth", AUTH_PER_MINUTE / 60, AUTH_PER_MINUTE / 2, AUTH_GLOBAL_PER_SECOND, AUTH_GLOBAL_PER_SECOND * 2,
+    client_rate=AUTH_PER_CLIENT_PER_MINUTE / 60, client_burst=AUTH_PER_CLIENT_PER_MINUTE / 2
+)
+register_limiter = RateLimiter(
+    "register", REGISTER_PER_HOUR / 3600, REGISTER_PER_HOUR / 4, REGISTER_GLOBAL_PER_SECOND, REGISTER_GLOBAL_PER_SECOND * 2
+)
+score_limiter = RateLimiter("score", SCORE_PER_MINUTE / 60, 3, SCORE_GLOBAL_PER_SECOND, SCORE_GLOBAL_PER_SECOND * 2)
+# Password hashing and user writes
+auth_queue = AdmissionQueue("auth")
+# Score writes
+write_queue = AdmissionQueue("write")
+
+
+@contextmanager
+def guarded(limiter, queue, keys=(), timeout=None, client=None):
+    """Apply ``limiter`` to ``keys`` and ``client``, then hold a slot of ``queue`` for the block"""
+    limiter.acquire(keys, client=client)
+    with queue.admit(timeout):
+        yield
+
+
+def auth_keys(client, username):
+    """Return the rate-limit keys of a login attempt: the account as tried from this client.
+
+    The bucket is per client, so failed guesses from one place never lock the
+    account out for its owner logging in from another; pass ``client`` to the
+    limiter as well for the looser per-address bucket.
+    """
+    return [f"user:{str(username).strip().lower()}@{client}"]
+
+
+def score_keys(user_id):
+    """Return the rate-limit keys of a score save: the signed-in player, whatever network they share"""
+    return [f"user:{user_id}"]
+
+
+def client_address(remote_ip, forwarded_for=None):
+    """Return the address to limit a request by, honouring X-Forwarded-For from a trusted proxy"""
+    if TRUST_FORWARDED and forwarded_for:
+        # The trusted proxy appends the address it saw; anything before it is the client's say-so
+        return forwarded_for.split(",")[-1].strip()
+    return remote_ip
+
+
+def session_client():
+    """Return the rate-limit key of the current Streamlit session: its client address where known"""
+    from streamlit import runtime
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    try:
+        request = runtime.get_instance().get_client(ctx.session_id).request
+    except (AttributeError, RuntimeError):
+        # No browser connection (e.g. a headless test run); limit the session itself
+        return f"session:{ctx.session_id}"
+    return client_address(request.remote_ip, request.headers.get("X-Forwarded-For"))
@@ -0,0 +1,199 @@
+"""Retention for the score history: compaction into summaries and archives.
+
+Every score stays in the scores table for ``QUIZ_SCORE_RETENTION_DAYS``.
+``compact`` then moves whole calendar months out of it:
+
+- the raw rows go to a gzipped CSV per month, ``data/archive/scores-YYYY-MM.csv.gz``,
+  which nothing on a page or API request ever reads;
+- each player's month becomes one ``score_summaries`` row (games, total,
+  best score and its date, days played, last scores; see ``storage.py``).
+
+The leaderboard and player statistics are rebuilt from the summaries plus the
+scores still in the table, so they come out the same as before compaction.
+The current day, week and month are never compacted, so the windowed
+leaderboards only ever need the table. A month's summaries are always
+recomputed from its whole archive file, so compacting again (after a crash,
+or once a late score dated in that month turns up) is safe.
+
+Archived scores can be exported for any months, and deleting a player's
+scores deletes their archived rows too. From the command line::
+
+    python retention.py compact
+    python retention.py export scores.csv [2024-01 2024-02 ...]
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import metrics
+from bulk_io import write_chunks
+from changes import ProcessLock
+from player_stats import RECENT_SCORES
+from storage import DATA_DIR, LOCK_FILE, SCORE_COLUMNS, SUMMARY_COLUMNS
+
+# --- Configuration ---
+RETENTION_DAYS = int(os.environ.get("QUIZ_SCORE_RETENTION_DAYS", "180"))
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+
+
+def cutoff(now=None, retention_days=RETENTION_DAYS):
+    """Return the start of the oldest month that stays in the scores table"""
+    now = now or datetime.now()
+    # Never reach into the current week, whatever the retention period
+    oldest = min(now - timedelta(days=retention_days), now - timedelta(days=now.weekday()))
+    return datetime(oldest.year, oldest.month, 1)
+
+
+def _parse(dates):
+    return pd.to_datetime(dates.astype(str), errors="coerce", format="ISO8601")
+
+
+def summarize(scores, period):
+    """Return one summary row per player for the scores of one month"""
+    # Oldest first, as the player statistics fold them
+    ordered = scores.assign(_parsed=_parse(scores["date"])).sort_values("_parsed", kind="stable")
+    rows = []
+    for user_id, group in ordered.groupby("user_id", sort=True):
+        best = int(group["score"].max())
+        recent = group.iloc[-RECENT_SCORES:]
+        rows.append({
+            "user_id": str(user_id),
+            "period": period,
+            "games": len(group),
+            "total": int(group["score"].sum()),
+            "best": best,
+            # The earliest of the best attempts, as the leaderboard breaks ties
+            "best_date": group.loc[group["score"] == best, "date"].astype(str).min(),
+            "days": " ".join(str(day) for day in sorted(set(group["_parsed"].dt.day))),
+            "recent": json.dumps([[str(date), int(score)] for date, score in zip(recent["date"], recent["score"])]),
+        })
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+# --- Archive files ---
+def partition_path(period, directory=ARCHIVE_DIR):
+    """Return the archive file of a month ("YYYY-MM")"""
+    return os.path.join(directory, f"scores-{period}.csv.gz")
+
+
+def list_partitions(directory=ARCHIVE_DIR):
+    """Return [(period, path, size in bytes)] of the archive files, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    partitions = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("scores-") and name.endswith(".csv.gz"):
+            path = os.path.join(directory, name)
+            partitions.append((name[len("scores-"):-len(".csv.gz")], path, os.path.getsize(path)))
+    return partitions
+
+
+def read_partition(path):
+    """Return the scores in one archive file"""
+    return pd.read_csv(path, dtype={"id": str, "user_id": str, "date": str})
+
+
+def _save_partition(path, scores):
+    """Rewrite an archive file atomically, or remove it once it is empty"""
+    if scores.empty:
+        os.unlink(path)
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        scores.to_csv(tmp_path, index=False, compression="gzip")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _archive(directory, period, scores):
+    """Add scores to a month's archive file and return everything it now holds"""
+    path = partition_path(period, directory)
+    if os.path.exists(path):
+        # Rows archived before a crash are already there
+        scores = pd.concat([read_partition(path), scores], ignore_index=True).drop_duplicates(subset=["id"])
+    scores = scores.reindex(columns=SCORE_COLUMNS)
+    scores = scores.iloc[_parse(scores["date"]).argsort(kind="stable")]
+    _save_partition(path, scores)
+    return scores
+
+
+# --- Jobs ---
+def compact(storage, now=None, retention_days=RETENTION_DAYS, directory=ARCHIVE_DIR):
+    """Archive and summarize every month of scores before ``cutoff``; returns {period: scores archived}"""
+    started = time.perf_counter()
+    limit = cutoff(now, retention_days)
+    os.makedirs(directory, exist_ok=True)
+    with ProcessLock(os.path.join(directory, LOCK_FILE)):
+        scores = storage.load_scores()
+        parsed = _parse(scores["date"])
+        # Scores without a real date cannot be placed in a month and stay in the table
+        old = parsed < limit
+        if not old.any():
+            return {}
+        summaries, archived = [], {}
+        for period, rows in scores[old].groupby(parsed[old].dt.strftime("%Y-%m"), sort=True):
+            summaries.append(summarize(_archive(directory, period, rows), period))
+            archived[period] = len(rows)
+        storage.compact_scores(pd.concat(summaries, ignore_index=True), scores.loc[old, "id"])
+    metrics.inc("quiz_scores_archived_total", int(old.sum()), description="Scores moved into the archive")
+    metrics.observe("quiz_score_compaction_seconds", time.perf_counter() - started,
+                    description="Time to compact old scores into the archive")
+    return archived
+
+
+def purge_user(user_id, directory=ARCHIVE_DIR):
+    """Delete a user's archived scores; returns the number deleted"""
+    if not os.path.isdir(directory):
+        return 0
+    deleted = 0
+    with ProcessLock(os.path.join(directory, LOCK_FILE)):
+        for _, path, _ in list_partitions(directory):
+            scores = read_partition(path)
+            mine = scores["user_id"] == str(user_id)
+            if mine.any():
+                _save_partition(path, scores[~mine])
+                deleted += int(mine.sum())
+    return deleted
+
+
+def export_archive(destination, fmt, periods=None, directory=ARCHIVE_DIR):
+    """Write the archived scores of ``periods`` (all months if None) as CSV, JSON Lines or Parquet"""
+    chunks = (
+        read_partition(path) for period, path, _ in list_partitions(directory)
+        if periods is None or period in periods
+    )
+    write_chunks(destination, fmt, chunks, SCORE_COLUMNS)
+
+
+def export_archive_bytes(fmt, periods=None, directory=ARCHIVE_DIR):
+    """Return the exported archived scores as bytes, for download buttons"""
+    buffer = io.BytesIO()
+    export_archive(buffer, fmt, periods, directory)
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    from bulk_io import detect_format
+    from storage import create_storage
+
+    if sys.argv[1:] == ["compact"]:
+        archived = compact(create_storage())
+        for period, count in archived.items():
+            print(f"{period}: {count} scores archived")
+        print(f"Scores before {cutoff():%Y-%m-%d} are archived in {ARCHIVE_DIR}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "export":
+        path, periods = sys.argv[2], sys.argv[3:] or None
+        export_archive(path, detect_format(path), periods)
+        print(f"Exported archived scores to {path}")
+    else:
+        print("Usage: python retention.py compact | export <file.csv|file.jsonl|file.parquet> [YYYY-MM ...]")
+        sys.exit(2)
@@ -0,0 +1,175 @@
+import streamlit as st
+import pandas as pd
+import time
+from datetime import datetime
+from engine import QUESTIONS_PER_GAME, QUESTION_SECONDS, GRACE_SECONDS
+from metrics import inc
+from please_wait import save_score_or_defer
+from rooms import LOBBY, QUESTION, REVEAL, RoomError, broker
+from utils import draw_question_deck, get_question
+
+def show_room():
+    if not st.session_state.get("logged_in", False):
+        st.warning("Please login to join a live room")
+        st.session_state.page = "login"
+        st.experimental_rerun()
+        return
+
+    st.title("🎤 Live Room")
+
+    room = broker.get(st.session_state.get("room_code", ""))
+    if room is None:
+        show_room_entry()
+    else:
+        show_room_live()
+
+def show_room_entry():
+    if st.session_state.get("room_code"):
+        st.warning("That room has closed.")
+        st.session_state.room_code = None
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Host a room")
+        st.write("Open a room and share its code with the hall.")
+        if st.button("Open Room", key="open_room_button"):
+            # The host draws the deck once; every player gets the same questions
+            questions = [get_question(question_id) for question_id in draw_question_deck(QUESTIONS_PER_GAME)]
+            room = broker.create_room(
+                st.session_state.user_id,
+                [question for question in questions if question is not None],
+                QUESTION_SECONDS,
+                GRACE_SECONDS
+            )
+            st.session_state.room_code = room.code
+            st.session_state.room_host = True
+            st.experimental_rerun()
+    with col2:
+        st.subheader("Join a room")
+        code = st.text_input("Room code", key="room_code_input")
+        if st.button("Join Room", key="join_room_button") and code:
+            room = broker.get(code)
+            if room is None:
+                st.error("No room with that code")
+            else:
+                try:
+                    room.join(st.session_state.user_id, st.session_state.username)
+                except RoomError as e:
+                    st.error(str(e))
+                else:
+                    st.session_state.room_code = room.code
+                    st.session_state.room_host = False
+                    st.session_state.room_score_saved = False
+                    st.experimental_rerun()
+
+@st.experimental_fragment(run_every=1)
+def show_room_live():
+    """Room view; polls the room's shared snapshot once a second without rerunning the page"""
+    inc("quiz_fragment_runs_total", description="Partial reruns of page fragments", fragment="room")
+    room = broker.get(st.session_state.room_code)
+    if room is None:
+        st.rerun()
+    snapshot = room.snapshot()
+    is_host = st.session_state.get("room_host", False)
+
+    st.write(f"Room code: **{snapshot['code']}** · {snapshot['player_count']} player(s)")
+
+    if snapshot["phase"] == LOBBY:
+        if is_host:
+            st.info("Waiting for players to join. Start when everyone is in.")
+            if st.button("Start Game", key="room_start"):
+                if snapshot["player_count"] == 0:
+                    st.warning("Nobody has joined yet.")
+                else:
+                    room.next_question()
+                    st.rerun()
+        else:
+            st.info("Waiting for the host to start the game...")
+
+    elif snapshot["phase"] in (QUESTION, REVEAL):
+        question = snapshot["question"]
+        st.subheader(f"Question {snapshot['question_number']}/{snapshot['question_total']}: {question['question']}")
+        options = {key: question[f"option_{key.lower()}"] for key in ["A", "B", "C", "D"]}
+
+        if snapshot["phase"] == QUESTION:
+            remaining = max(0, snapshot["deadline"] - time.time())
+            st.progress(remaining / QUESTION_SECONDS)
+            st.write(f"Time remaining: {int(remaining)} seconds")
+            if is_host:
+                st.metric("Answers received", f"{room.answered}/{snapshot['player_count']}")
+            else:
+                show_room_answer(room, snapshot, options)
+        else:
+            show_room_reveal(room, snapshot, options, is_host)
+
+    else:
+        show_room_finished(room, snapshot, is_host)
+
+def show_room_answer(room, snapshot, options):
+    player = room.player(st.session_state.user_id)
+    if player is None:
+        st.warning("You are not in this room.")
+        return
+    if player["answer"] is not None:
+        st.info(f"Answer locked in: {player['answer']}. Waiting for the others...")
+        return
+    selected_option = st.radio(
+        "Select your answer:",
+        ["A", "B", "C", "D"],
+        format_func=lambda x: f"{x}: {options[x]}",
+        key=f"room_{snapshot['code']}_{snapshot['question_number']}"
+    )
+    if st.button("Submit Answer", key="room_submit"):
+        if not room.submit_answer(st.session_state.user_id, selected_option):
+            st.warning("Time's up! ⏰")
+        st.rerun()
+
+def show_room_reveal(room, snapshot, options, is_host):
+    correct = snapshot["correct"]
+    st.success(f"The correct answer is {correct}: {options[correct]}")
+
+    if not is_host:
+        player = room.player(st.session_state.user_id)
+        if player is not None:
+            if player["answer"] == correct:
+                st.write("✅ You got it!")
+            elif player["answer"] is None:
+                st.write("⏰ No answer this time.")
+            else:
+                st.write(f"❌ You answered {player['answer']}.")
+            st.metric("Your score", player["score"])
+
+    # How the room answered
+    st.bar_chart(pd.DataFrame({"Answers": snapshot["counts"]}))
+    show_standings(snapshot)
+
+    if is_host:
+        last = snapshot["question_number"] >= snapshot["question_total"]
+        if st.button("Show Results" if last else "Next Question", key="room_next"):
+            room.next_question()
+            st.rerun()
+
+def show_room_finished(room, snapshot, is_host):
+    st.subheader("Game over!")
+    show_standings(snapshot)
+
+    player = room.player(st.session_state.user_id)
+    if player is not None:
+        st.success(f"Your final score is: {player['score']}/{snapshot['question_total']}")
+        # Each player's session saves its own score, once
+        if not st.session_state.get("room_score_saved", False):
+            st.session_state.room_score_saved = True
+            # A score refused by the rate limits is kept in the session and saved later
+            save_score_or_defer(st.session_state.user_id, player["score"], datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    if st.button("Close Room" if is_host else "Leave Room", key="room_leave"):
+        if is_host:
+            broker.close(room.code)
+        st.session_state.room_code = None
+        st.rerun()
+
+def show_standings(snapshot):
+    st.write("### Standings")
+    standings = pd.DataFrame(snapshot["standings"], columns=["Player", "Score"])
+    standings.index = standings.index + 1
+    st.dataframe(standings, use_container_width=True)
@@ -0,0 +1,205 @@
+"""Live multiplayer rooms served from one in-process broker.
+
+A host opens a room and every player who joins with its code answers the
+same question against the same deadline. Each ``Room`` holds the only copy
+of that state; sessions never keep their own timer or question stream.
+
+Fan-out works by publishing versioned snapshots: every phase change (a
+player joining, a question starting, answers being revealed) builds one
+immutable snapshot dict and bumps ``version``. Streamlit sessions poll the
+current snapshot from a fragment once a second, which is a reference read
+however many players are polling. Answers are folded into
+per-option counters and the player's score as they arrive, so a submission
+costs O(1) and the reveal only has to pick the top few players.
+"""
+import heapq
+import secrets
+import threading
+import time
+
+import metrics
+
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # No 0/O or 1/I lookalikes
+CODE_LENGTH = 5
+ROOM_IDLE_SECONDS = 2 * 60 * 60  # Rooms untouched this long are closed
+STANDINGS_SHOWN = 10
+OPTIONS = ("A", "B", "C", "D")
+
+LOBBY, QUESTION, REVEAL, FINISHED = "lobby", "question", "reveal", "finished"
+
+
+class RoomError(Exception):
+    """Raised for actions a room does not allow in its current state"""
+
+
+class Room:
+    """One live game: its deck, current question, deadline and players"""
+
+    def __init__(self, code, host_id, questions, question_seconds, grace_seconds=0.5):
+        self.code = code
+        self.host_id = host_id
+        self.questions = questions  # list of question dicts, fixed when the room opens
+        self.question_seconds = question_seconds
+        self.grace_seconds = grace_seconds
+        self.phase = LOBBY
+        self.question_index = -1
+        self.deadline = None
+        self.players = {}   # user_id -> {"name", "score", "answer"}
+        self.counts = dict.fromkeys(OPTIONS, 0)
+        self.answered = 0
+        self.version = 0
+        self.last_active = time.monotonic()
+        self._snapshot = None
+        self._lock = threading.RLock()
+
+    # --- Actions ---
+    def join(self, user_id, name):
+        """Add a player; rejoining keeps their score"""
+        with self._lock:
+            if user_id not in self.players:
+                if self.phase == FINISHED:
+                    raise RoomError("This game has already finished")
+                self.players[user_id] = {"name": name, "score": 0, "answer": None}
+                self._publish()
+
+    def next_question(self, now=None):
+        """Start the next question, or finish the game after the last one"""
+        now = now or time.time()
+        with self._lock:
+            if self.phase == QUESTION:
+                raise RoomError("The current question is still open")
+            if self.phase == FINISHED:
+                raise RoomError("This game has already finished")
+            self.question_index += 1
+            if self.question_index >= len(self.questions):
+                self.phase = FINISHED
+            else:
+                self.phase = QUESTION
+                self.deadline = now + self.question_seconds
+                self.counts = dict.fromkeys(OPTIONS, 0)
+                self.answered = 0
+                for player in self.players.values():
+                    player["answer"] = None
+            self._publish()
+
+    def submit_answer(self, user_id, choice, now=None):
+        """Record a player's answer to the open question; returns False if it came too late"""
+        now = now or time.time()
+        with self._lock:
+            player = self.players.get(user_id)
+            if player is None:
+                raise RoomError("Join the room before answering")
+            if self.phase != QUESTION or player["answer"] is not None:
+                return False
+            if now > self.deadline + self.grace_seconds:
+                self._reveal()
+                return False
+            player["answer"] = choice
+            self.counts[choice] += 1
+            self.answered += 1
+            if choice == self.questions[self.question_index]["correct"]:
+                player["score"] += 1
+            self.last_active = time.monotonic()
+            if self.answered == len(self.players):
+                # Everyone has answered; no need to wait for the clock
+                self._reveal()
+            return True
+
+    def tick(self, now=None):
+        """Reveal the answer once the deadline has passed; called by anyone polling the room"""
+        now = now or time.time()
+        if self.phase == QUESTION and now > self.deadline + self.grace_seconds:
+            with self._lock:
+                if self.phase == QUESTION and now > self.deadline + self.grace_seconds:
+                    self._reveal()
+
+    # --- Reading ---
+    def snapshot(self):
+        """Return the latest published state, shared by every reader"""
+        self.tick()
+        return self._snapshot
+
+    def player(self, user_id):
+        """Return a copy of one player's entry, or None"""
+        player = self.players.get(user_id)
+        return dict(player) if player is not None else None
+
+    # --- Internals ---
+    def _reveal(self):
+        self.phase = REVEAL
+        self._publish()
+
+    def _publish(self):
+        """Build and publish the next snapshot (caller holds the lock)"""
+        self.version += 1
+        self.last_active = time.monotonic()
+        snapshot = {
+            "code": self.code,
+            "version": self.version,
+            "phase": self.phase,
+            "player_count": len(self.players),
+            "question_number": self.question_index + 1,
+            "question_total": len(self.questions),
+            "deadline": self.deadline,
+            "question": None,
+        }
+        if self.phase in (QUESTION, REVEAL):
+            question = self.questions[self.question_index]
+            snapshot["question"] = {key: question[key] for key in ("question", "option_a", "option_b", "option_c", "option_d")}
+        if self.phase in (REVEAL, FINISHED):
+            if self.phase == REVEAL:
+                snapshot["correct"] = self.questions[self.question_index]["correct"]
+                snapshot["counts"] = dict(self.counts)
+            top = heapq.nlargest(STANDINGS_SHOWN, self.players.values(), key=lambda player: player["score"])
+            snapshot["standings"] = [(player["name"], player["score"]) for player in top]
+        self._snapshot = snapshot
+
+
+class RoomBroker:
+    """Registry of open rooms"""
+
+    def __init__(self):
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def create_room(self, host_id, questions, question_seconds, grace_seconds=0.5):
+        """Open a room with a fixed list of questions and return it"""
+        with self._lock:
+            self._close_idle()
+            code = self._new_code()
+            room = self._rooms[code] = Room(code, host_id, questions, question_seconds, grace_seconds)
+            with room._lock:
+                room._publish()
+            return room
+
+    def get(self, code):
+        """Return an open room by code, or None"""
+        return self._rooms.get(str(code).strip().upper())
+
+    def close(self, code):
+        """Close a room; players polling it see it disappear"""
+        with self._lock:
+            self._rooms.pop(code, None)
+
+    def player_count(self):
+        return sum(len(room.players) for room in list(self._rooms.values()))
+
+    def _new_code(self):
+        while True:
+            code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+            if code not in self._rooms:
+                return code
+
+    def _close_idle(self):
+        cutoff = time.monotonic() - ROOM_IDLE_SECONDS
+        for code in [code for code, room in self._rooms.items() if room.last_active < cutoff]:
+            del self._rooms[code]
+
+
+broker = RoomBroker()
+
+metrics.gauge("quiz_rooms_open", lambda: {(): len(broker)}, description="Live multiplayer rooms open")
+metrics.gauge("quiz_room_players", lambda: {(): broker.player_count()}, description="Players in live multiplayer rooms")
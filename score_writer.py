@@ -0,0 +1,154 @@
+"""Write-behind queue for game scores.
+
+``save_score`` hands new scores to a ``ScoreWriter`` instead of writing them
+from the Streamlit script thread. Each score is first appended to a small
+journal file, then a background thread commits queued scores to storage in
+batches once ``batch_size`` scores are waiting or ``flush_interval`` seconds
+have passed. The journal is fsynced once per batch (group commit) and
+replayed on startup, so scores queued before a crash are not lost; replay
+skips score IDs that already reached storage and queues the rest for the
+writer thread, so starting the writer never writes to storage itself.
+
+Scores that are queued but not yet committed are available from
+``pending()``, which ``utils.load_scores`` merges in so a player's own
+leaderboard view already includes the score they just set.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+# --- Configuration ---
+BATCH_SIZE = int(os.environ.get("QUIZ_SCORE_BATCH_SIZE", "50"))
+FLUSH_INTERVAL = float(os.environ.get("QUIZ_SCORE_FLUSH_SECONDS", "0.5"))
+
+
+class FlushTimeout(Exception):
+    """Raised when queued scores could not be written in time"""
+
+
+class ScoreWriter:
+    """Background writer that commits scores to storage in batches"""
+
+    def __init__(self, commit, journal_path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.commit = commit
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._in_flight = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._journal = None
+        self._thread = None
+        self._stopping = False
+
+    def start(self, committed_ids=()):
+        """Queue scores left in the journal and start the writer thread; returns how many were recovered"""
+        committed_ids = set(committed_ids)
+        recovered = {}
+        for row in self._read_journal():
+            if row["id"] not in committed_ids:
+                recovered[row["id"]] = row
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        # Keep just the recovered rows (and no torn line) in the journal until their batch is committed
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in recovered.values())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._pending = list(recovered.values())
+        self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return len(recovered)
+
+    def submit(self, row):
+        """Queue a score row for writing"""
+        with self._lock:
+            self._journal.write(json.dumps(row) + "\n")
+            self._journal.flush()
+            self._pending.append(row)
+            # The first score starts the flush_interval batching window; a full batch ends it early
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def pending(self):
+        """Return scores that have been queued but not committed yet"""
+        with self._lock:
+            return self._in_flight + self._pending
+
+    def flush(self, timeout=10):
+        """Block until every queued score has been committed"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._wakeup.notify()
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stop(self):
+        """Commit what is left and stop the writer thread"""
+        if self._thread is None or self._stopping:
+            return
+        self.flush()
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        self._thread.join(timeout=5)
+        self._journal.close()
+
+    # --- Internals ---
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._stopping:
+                    self._wakeup.wait()
+                if self._stopping and not self._pending:
+                    return
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    # Give a burst of finishing players a moment to join the batch
+                    self._wakeup.wait(self.flush_interval)
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+
+            try:
+                # Everything in the batch is durable in the journal before it is committed
+                os.fsync(self._journal.fileno())
+                self.commit(batch)
+                failed = False
+            except Exception:
+                failed = True
+
+            with self._lock:
+                self._in_flight = []
+                if failed:
+                    # Put the batch back and try again on the next round
+                    self._pending = batch + self._pending
+                elif not self._pending:
+                    # Everything in the journal has reached storage
+                    self._journal.seek(0)
+                    self._journal.truncate()
+                self._idle.notify_all()
+            if failed:
+                time.sleep(self.flush_interval)
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        rows = []
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    break
+        return rows
@@ -0,0 +1,852 @@
+"""Storage backends for users, scores and questions.
+
+Both backends expose the same interface and return pandas DataFrames with the
+columns listed below, so the rest of the app does not care where data lives:
+
+- ``CSVStorage`` keeps the original ``data/*.csv`` files. Inserts are appended
+  as a single row; updates and deletes rewrite the file atomically.
+- ``SQLiteStorage`` keeps everything in one indexed SQLite database and applies
+  every insert/update/delete as a single-row statement in its own transaction.
+
+Alongside the scores both keep ``score_summaries``: one row per player per
+month of scores that have been compacted out of the scores table into the
+archive (see ``retention.py``).
+
+The backend is chosen with the ``QUIZ_STORAGE`` environment variable
+(``csv`` or ``sqlite``, default ``csv``). ``QUIZ_DATA_DIR`` moves the data
+directory. Every write bumps its table's counter in the shared change feed
+(``changes.py``), so several processes can use one data directory and still
+see each other's changes. ``load_scores_since`` returns only the scores
+appended after a high-water mark (the SQLite rowid, or the CSV byte offset),
+so the leaderboard can follow other processes' scores without reloading. Existing CSV data can be copied into SQLite once with::
+
+    python storage.py migrate
+"""
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from cache import file_signature
+from changes import ChangeFeed, ProcessLock
+
+# --- Configuration ---
+DATA_DIR = os.environ.get("QUIZ_DATA_DIR", "data")
+STORAGE_BACKEND = os.environ.get("QUIZ_STORAGE", "csv").lower()
+DATABASE_FILE = "quiz.db"
+CHANGES_FILE = "changes.seq"
+LOCK_FILE = ".lock"
+
+# Values coming out of DataFrames are numpy scalars, which sqlite3 rejects
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.float64, float)
+
+USER_COLUMNS = ["id", "name", "password", "role"]
+SCORE_COLUMNS = ["id", "user_id", "score", "date"]
+# ``days``: days of the month played, space separated; ``recent``: JSON [[date, score], ...] of the last scores
+SUMMARY_COLUMNS = ["user_id", "period", "games", "total", "best", "best_date", "days", "recent"]
+QUESTION_COLUMNS = ["id", "question", "option_a", "option_b", "option_c", "option_d", "correct", "media"]
+# Question columns that may be left empty: ``media`` names an audio clip (see media.py)
+OPTIONAL_QUESTION_COLUMNS = ["media"]
+
+# Columns returned by the paged admin queries, and the ones they can sort by
+USER_PAGE_COLUMNS = ["id", "name", "role"]
+SCORE_PAGE_COLUMNS = ["id", "user_id", "name", "score", "date"]
+USER_SORT_COLUMNS = ("name", "role")
+SCORE_SORT_COLUMNS = ("date", "score", "name")
+
+SAMPLE_QUESTIONS = {
+    "question": [
+        "Which of these is NOT one of the four parts in traditional hymn singing?",
+        "Who composed 'Amazing Grace'?",
+        "What instrument is traditionally used to lead congregational singing?",
+        "Which book of the Bible contains most of the Psalms?",
+        "What is the term for a song of praise to God?"
+    ],
+    "option_a": ["Soprano", "John Newton", "Piano", "Proverbs", "Hymn"],
+    "option_b": ["Alto", "Charles Wesley", "Guitar", "Psalms", "Anthem"],
+    "option_c": ["Tenor", "Isaac Watts", "Organ", "Ecclesiastes", "Spiritual"],
+    "option_d": ["Baritone", "Fanny Crosby", "Trumpet", "Song of Solomon", "Carol"],
+    "correct": ["D", "A", "C", "B", "A"]
+}
+
+
+def new_id():
+    """Return a new unique row ID"""
+    return str(uuid.uuid4())
+
+
+def sample_questions():
+    """Return the built-in sample questions with IDs"""
+    questions = pd.DataFrame(SAMPLE_QUESTIONS)
+    questions.insert(0, "id", range(1, len(questions) + 1))
+    questions["media"] = None
+    return questions
+
+
+def _record_read(path, rows, size):
+    table = os.path.splitext(os.path.basename(path))[0]
+    metrics.inc("quiz_storage_rows_read_total", rows, description="Rows read from storage", backend="csv", table=table)
+    metrics.inc("quiz_storage_bytes_read_total", size, description="Bytes read from storage files", backend="csv", table=table)
+
+
+def _record_write(path, rows, size):
+    table = os.path.splitext(os.path.basename(path))[0]
+    metrics.inc("quiz_storage_rows_written_total", rows, description="Rows written to storage", backend="csv", table=table)
+    metrics.inc("quiz_storage_bytes_written_total", size, description="Bytes written to storage files", backend="csv", table=table)
+
+
+def _number_questions(questions, max_existing_id):
+    """Keep the last row for each ID and number rows without one above every ID in use or in ``questions``"""
+    questions = questions.reindex(columns=QUESTION_COLUMNS).reset_index(drop=True)
+    has_id = questions["id"].notna()
+    questions = questions[~(has_id & questions["id"].duplicated(keep="last"))].reset_index(drop=True)
+    missing = questions["id"].isna()
+    next_id = int(max([max_existing_id, *questions.loc[~missing, "id"]])) + 1
+    questions.loc[missing, "id"] = range(next_id, next_id + int(missing.sum()))
+    questions["id"] = questions["id"].astype(int)
+    return questions
+
+
+def _page(df, prefix, sort_by, descending, offset, limit):
+    """Filter ``df`` by name prefix, sort it and return (rows at offset, total matches)"""
+    if prefix:
+        df = df[df["name"].str.startswith(prefix)]
+    df = df.sort_values([sort_by, "name"], ascending=[not descending, True], kind="stable")
+    return df.iloc[offset:offset + limit].reset_index(drop=True), len(df)
+
+
+class UserExists(Exception):
+    """Raised by ``add_user`` when the username is already taken"""
+
+
+class Storage:
+    """Interface shared by all storage backends"""
+
+    def signature(self, table):
+        """Return a cheap value that changes whenever ``table`` changes"""
+        raise NotImplementedError
+
+    def locked(self):
+        """Return the data directory's lock, held across processes, for check-then-write steps"""
+        return self._lock
+
+    # --- Users ---
+    def load_users(self):
+        raise NotImplementedError
+
+    def add_user(self, user):
+        """Insert ``user``, raising ``UserExists`` if the name is taken"""
+        raise NotImplementedError
+
+    def update_user(self, user_id, **fields):
+        raise NotImplementedError
+
+    def delete_user(self, user_id):
+        raise NotImplementedError
+
+    def query_users(self, prefix="", sort_by="name", descending=False, offset=0, limit=50):
+        """Return one page of users whose name starts with ``prefix``, and the number of matches"""
+        if sort_by not in USER_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort users by {sort_by}")
+        users = self.load_users()[USER_PAGE_COLUMNS]
+        return _page(users, prefix, sort_by, descending, offset, limit)
+
+    # --- Scores ---
+    def load_scores(self):
+        raise NotImplementedError
+
+    def add_score(self, score):
+        self.add_scores([score])
+
+    def add_scores(self, scores):
+        raise NotImplementedError
+
+    def load_scores_since(self, mark=None):
+        """Return (scores appended after ``mark``, new mark), all scores if ``mark`` is None.
+
+        Returns None if scores were changed or deleted since ``mark`` was taken,
+        and the caller must load everything again.
+        """
+        raise NotImplementedError
+
+    def update_scores(self, changes):
+        """Set the score and date of the rows in ``changes`` (id, score, date) in one write"""
+        raise NotImplementedError
+
+    def delete_scores_for_user(self, user_id):
+        """Delete a user's scores and score summaries"""
+        raise NotImplementedError
+
+    def query_scores(self, prefix="", sort_by="date", descending=True, offset=0, limit=50):
+        """Return one page of scores whose player name starts with ``prefix``, and the number of matches"""
+        if sort_by not in SCORE_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort scores by {sort_by}")
+        users = self.load_users()[["id", "name"]].rename(columns={"id": "user_id"})
+        scores = self.load_scores().merge(users, on="user_id")[SCORE_PAGE_COLUMNS]
+        return _page(scores, prefix, sort_by, descending, offset, limit)
+
+    # --- Score summaries ---
+    def load_score_summaries(self):
+        raise NotImplementedError
+
+    def compact_scores(self, summaries, score_ids):
+        """Replace the summaries of every period in ``summaries`` and delete the scores they now cover"""
+        raise NotImplementedError
+
+    # --- Questions ---
+    def load_questions(self):
+        raise NotImplementedError
+
+    def add_question(self, question):
+        raise NotImplementedError
+
+    def replace_questions(self, questions):
+        raise NotImplementedError
+
+    def upsert_questions(self, questions):
+        """Update questions whose ID exists and add the rest; returns (inserted, updated)"""
+        raise NotImplementedError
+
+    def delete_questions(self, question_ids):
+        raise NotImplementedError
+
+    def iter_questions(self, chunksize):
+        """Yield the questions as DataFrames of at most ``chunksize`` rows"""
+        raise NotImplementedError
+
+    def load_questions_page(self, offset, limit):
+        """Return ``limit`` questions starting at position ``offset``, reading only those rows"""
+        raise NotImplementedError
+
+
+class CSVStorage(Storage):
+    """Storage backed by one CSV file per table"""
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.users_file = os.path.join(data_dir, "users.csv")
+        self.scores_file = os.path.join(data_dir, "scores.csv")
+        self.questions_file = os.path.join(data_dir, "questions.csv")
+        self.summaries_file = os.path.join(data_dir, "score_summaries.csv")
+        self.changes = ChangeFeed(os.path.join(data_dir, CHANGES_FILE))
+        # Held across processes, so read-modify-write updates from several workers do not interleave
+        self._lock = ProcessLock(os.path.join(data_dir, LOCK_FILE))
+        self._unconfirmed_scores = set()  # IDs of scores whose append failed, and may be in the file anyway
+
+    def signature(self, table):
+        # The file stat still catches edits made outside the app
+        return self.changes.read(table), file_signature(os.path.join(self.data_dir, f"{table}.csv"))
+
+    def _changed(self, path):
+        self.changes.bump(os.path.splitext(os.path.basename(path))[0])
+
+    # --- File helpers ---
+    def _read(self, path, columns, dtype):
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            pd.DataFrame(columns=columns).to_csv(path, index=False)
+        df = pd.read_csv(path, dtype=dtype)
+        _record_read(path, len(df), os.path.getsize(path))
+        return df
+
+    def _write(self, path, df):
+        """Rewrite a whole file atomically so readers never see half a file"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", newline="") as f:
+                df.to_csv(f, index=False)
+                _record_write(path, len(df), f.tell())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if path == self.scores_file:
+            self.changes.bump("score_rewrites")
+        self._changed(path)
+
+    def _append(self, path, columns, rows, sync=False):
+        """Append rows without rewriting the file"""
+        with open(path, "a", newline="") as f:
+            start = f.tell()
+            pd.DataFrame(rows, columns=columns).to_csv(f, header=False, index=False)
+            _record_write(path, len(rows), f.tell() - start)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._changed(path)
+
+    def _header(self, path):
+        """Return the column names of a file, or None if it does not exist"""
+        if not os.path.exists(path):
+            return None
+        with open(path, newline="") as f:
+            return f.readline().strip().split(",")
+
+    # --- Users ---
+    def load_users(self):
+        with self._lock:
+            return self._read(self.users_file, USER_COLUMNS, {"id": str, "name": str})
+
+    def add_user(self, user):
+        # Check and append under one lock, so two registrations can't both add the name
+        with self._lock:
+            if (self.load_users()["name"] == user["name"]).any():
+                raise UserExists(user["name"])
+            self._append(self.users_file, USER_COLUMNS, [user])
+
+    def update_user(self, user_id, **fields):
+        with self._lock:
+            users = self.load_users()
+            for column, value in fields.items():
+                users.loc[users["id"] == user_id, column] = value
+            self._write(self.users_file, users)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            users = self.load_users()
+            self._write(self.users_file, users[users["id"] != user_id])
+
+    # --- Scores ---
+    def load_scores(self):
+        with self._lock:
+            scores = self._read(self.scores_file, SCORE_COLUMNS, {"id": str, "user_id": str})
+            if "id" not in scores.columns:
+                # Older files have no score IDs; add them once
+                scores.insert(0, "id", [new_id() for _ in range(len(scores))])
+                self._write(self.scores_file, scores)
+            return scores
+
+    def add_scores(self, scores):
+        with self._lock:
+            if "id" not in (self._header(self.scores_file) or []):
+                # Creates the file, or adds score IDs to an older one
+                self.load_scores()
+            if self._unconfirmed_scores & {score["id"] for score in scores}:
+                # A retried batch: skip rows the failed attempt already wrote
+                written = set(self.load_scores()["id"])
+                scores = [score for score in scores if score["id"] not in written]
+                self._unconfirmed_scores.clear()
+            try:
+                self._append(self.scores_file, SCORE_COLUMNS, scores, sync=True)
+            except BaseException:
+                self._unconfirmed_scores.update(score["id"] for score in scores)
+                raise
+
+    def load_scores_since(self, mark=None):
+        with self._lock:
+            if mark is None:
+                scores = self.load_scores()
+                stat = os.stat(self.scores_file)
+                return scores, (self.changes.read("score_rewrites"), stat.st_ino, stat.st_size)
+            rewrites, inode, offset = mark
+            try:
+                stat = os.stat(self.scores_file)
+            except FileNotFoundError:
+                return None
+            # Rewrites replace the file, so a new inode or a shorter file also means start over
+            if rewrites != self.changes.read("score_rewrites") or stat.st_ino != inode or stat.st_size < offset:
+                return None
+            with open(self.scores_file, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            if data.strip():
+                scores = pd.read_csv(io.BytesIO(data), header=None, names=SCORE_COLUMNS, dtype={"id": str, "user_id": str})
+            else:
+                scores = pd.DataFrame(columns=SCORE_COLUMNS)
+            _record_read(self.scores_file, len(scores), len(data))
+            return scores, (rewrites, inode, offset + len(data))
+
+    def update_scores(self, changes):
+        changes = changes.set_index("id")[["score", "date"]]
+        with self._lock:
+            scores = self.load_scores().set_index("id")
+            # Aligned on score ID, so only the listed rows change
+            scores.update(changes)
+            scores["score"] = scores["score"].astype(int)
+            self._write(self.scores_file, scores.reset_index()[SCORE_COLUMNS])
+
+    def delete_scores_for_user(self, user_id):
+        with self._lock:
+            summaries = self.load_score_summaries()
+            self._write(self.summaries_file, summaries[summaries["user_id"] != user_id])
+            scores = self.load_scores()
+            self._write(self.scores_file, scores[scores["user_id"] != user_id])
+
+    # --- Score summaries ---
+    def load_score_summaries(self):
+        with self._lock:
+            return self._read(
+                self.summaries_file, SUMMARY_COLUMNS,
+                {"user_id": str, "period": str, "best_date": str, "days": str, "recent": str}
+            )
+
+    def compact_scores(self, summaries, score_ids):
+        with self._lock:
+            kept = self.load_score_summaries()
+            kept = kept[~kept["period"].isin(summaries["period"])]
+            # Summaries first: a crash in between leaves scores counted twice until the
+            # next compaction, rather than missing from the leaderboard
+            self._write(self.summaries_file, pd.concat([kept, summaries], ignore_index=True)[SUMMARY_COLUMNS])
+            scores = self.load_scores()
+            self._write(self.scores_file, scores[~scores["id"].isin(set(score_ids))])
+
+    # --- Questions ---
+    def load_questions(self):
+        with self._lock:
+            if not os.path.exists(self.questions_file):
+                os.makedirs(os.path.dirname(self.questions_file) or ".", exist_ok=True)
+                self._write(self.questions_file, sample_questions())
+            questions = pd.read_csv(self.questions_file, dtype={"media": str})
+            _record_read(self.questions_file, len(questions), os.path.getsize(self.questions_file))
+            if "id" not in questions.columns:
+                # Older files have no question IDs; number the rows once
+                questions.insert(0, "id", range(1, len(questions) + 1))
+                self._write(self.questions_file, questions)
+            if "media" not in questions.columns:
+                # Older files have no media column; add it once
+                questions["media"] = None
+                self._write(self.questions_file, questions)
+            return questions
+
+    def add_question(self, question):
+        with self._lock:
+            questions = self.load_questions()
+            question_id = int(questions["id"].max()) + 1 if not questions.empty else 1
+            self._append(self.questions_file, QUESTION_COLUMNS, [{**question, "id": question_id}])
+            return question_id
+
+    def replace_questions(self, questions):
+        with self._lock:
+            questions = questions.reset_index(drop=True).copy()
+            if "id" not in questions.columns:
+                questions.insert(0, "id", pd.NA)
+            # Rows added in the editor have no ID yet
+            missing = questions["id"].isna()
+            next_id = int(questions["id"].max()) + 1 if not missing.all() else 1
+            questions.loc[missing, "id"] = range(next_id, next_id + int(missing.sum()))
+            questions["id"] = questions["id"].astype(int)
+            self._write(self.questions_file, questions.reindex(columns=QUESTION_COLUMNS))
+
+    def upsert_questions(self, questions):
+        with self._lock:
+            if not {"id", "media"} <= set(self._header(self.questions_file) or []):
+                # Creates the file, or adds question IDs and media to an older one
+                self.load_questions()
+            # Only the ID column is needed to tell updates from inserts
+            existing_ids = pd.read_csv(self.questions_file, usecols=["id"])["id"]
+            questions = _number_questions(questions, int(existing_ids.max()) if len(existing_ids) else 0)
+            is_update = questions["id"].isin(existing_ids)
+            updates = questions[is_update]
+            new = questions[~is_update]
+
+            if not updates.empty:
+                self._rewrite_questions(updates.set_index("id"))
+            if not new.empty:
+                self._append(self.questions_file, QUESTION_COLUMNS, new.to_dict("records"))
+            return len(new), len(updates)
+
+    def _rewrite_questions(self, updates, chunksize=10000):
+        """Stream the questions file through, replacing the rows in ``updates``"""
+        columns = QUESTION_COLUMNS[1:]
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.questions_file) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", newline="") as f:
+                for i, chunk in enumerate(pd.read_csv(self.questions_file, chunksize=chunksize, dtype={"media": str})):
+                    mask = chunk["id"].isin(updates.index)
+                    if mask.any():
+                        chunk.loc[mask, columns] = updates.loc[chunk.loc[mask, "id"], columns].values
+                    chunk.reindex(columns=QUESTION_COLUMNS).to_csv(f, header=(i == 0), index=False)
+                _record_write(self.questions_file, len(updates), f.tell())
+            os.replace(tmp_path, self.questions_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._changed(self.questions_file)
+
+    def delete_questions(self, question_ids):
+        with self._lock:
+            questions = self.load_questions()
+            self._write(self.questions_file, questions[~questions["id"].isin(list(question_ids))])
+
+    def iter_questions(self, chunksize):
+        if not {"id", "media"} <= set(self._header(self.questions_file) or []):
+            self.load_questions()
+        for chunk in pd.read_csv(self.questions_file, chunksize=chunksize, dtype={"media": str}):
+            _record_read(self.questions_file, len(chunk), 0)
+            yield chunk.reindex(columns=QUESTION_COLUMNS)
+
+    def load_questions_page(self, offset, limit):
+        if not {"id", "media"} <= set(self._header(self.questions_file) or []):
+            self.load_questions()
+        # The rows before the page are parsed and dropped, never kept
+        page = pd.read_csv(self.questions_file, skiprows=range(1, offset + 1), nrows=limit, dtype={"media": str})
+        _record_read(self.questions_file, len(page), 0)
+        return page.reindex(columns=QUESTION_COLUMNS)
+
+
+class SQLiteStorage(Storage):
+    """Storage backed by a single SQLite database with indexed tables"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user'
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_role ON users (role);
+
+        CREATE TABLE IF NOT EXISTS scores (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            date TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_scores_user ON scores (user_id);
+        CREATE INDEX IF NOT EXISTS idx_scores_rank ON scores (score DESC, date);
+        CREATE INDEX IF NOT EXISTS idx_scores_date ON scores (date);
+
+        CREATE TABLE IF NOT EXISTS score_summaries (
+            user_id TEXT NOT NULL,
+            period TEXT NOT NULL,
+            games INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            best INTEGER NOT NULL,
+            best_date TEXT NOT NULL,
+            days TEXT NOT NULL,
+            recent TEXT NOT NULL,
+            PRIMARY KEY (user_id, period)
+        );
+
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY,
+            question TEXT NOT NULL,
+            option_a TEXT NOT NULL,
+            option_b TEXT NOT NULL,
+            option_c TEXT NOT NULL,
+            option_d TEXT NOT NULL,
+            correct TEXT NOT NULL CHECK (correct IN ('A', 'B', 'C', 'D')),
+            media TEXT
+        );
+    """
+
+    def __init__(self, db_path=None, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.db_path = db_path or os.path.join(data_dir, DATABASE_FILE)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.changes = ChangeFeed(os.path.join(data_dir, CHANGES_FILE))
+        self._lock = ProcessLock(os.path.join(data_dir, LOCK_FILE))
+        # Workers starting together must not all see a new database and migrate into it
+        with self._lock:
+            is_new = not os.path.exists(self.db_path)
+            with self._connect() as conn:
+                conn.executescript(self.SCHEMA)
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(questions)")}
+                if "media" not in columns:
+                    # Databases created before audio questions
+                    conn.execute("ALTER TABLE questions ADD COLUMN media TEXT")
+            if is_new:
+                self._initialize()
+
+    def signature(self, table):
+        # Bumped after every committed write, so a write to one table leaves the others' caches valid
+        return (self.changes.read(table),)
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize(self):
+        """Fill a brand new database from the CSV files, or with sample questions"""
+        csv_storage = CSVStorage(self.data_dir)
+        if any(os.path.exists(path) for path in (csv_storage.users_file, csv_storage.scores_file, csv_storage.questions_file)):
+            migrate_csv_to_sqlite(csv_storage, self)
+        else:
+            self.replace_questions(sample_questions())
+
+    def _query(self, sql, columns, params=()):
+        df = pd.read_sql_query(sql, self._connect(), params=params).reindex(columns=columns)
+        metrics.inc("quiz_storage_rows_read_total", len(df), description="Rows read from storage", backend="sqlite")
+        return df
+
+    def _execute(self, table, sql, params=()):
+        with self._connect() as conn:
+            cursor = conn.execute(sql, params)
+        self.changes.bump(table)
+        metrics.inc("quiz_storage_rows_written_total", max(cursor.rowcount, 0), description="Rows written to storage", backend="sqlite")
+        return cursor
+
+    def _update(self, table, key_column, key, fields):
+        if not fields:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        self._execute(table, f"UPDATE {table} SET {assignments} WHERE {key_column} = ?", (*fields.values(), key))
+
+    # --- Users ---
+    def load_users(self):
+        return self._query("SELECT id, name, password, role FROM users ORDER BY rowid", USER_COLUMNS)
+
+    def add_user(self, user):
+        try:
+            self._execute(
+                "users",
+                "INSERT INTO users (id, name, password, role) VALUES (?, ?, ?, ?)",
+                tuple(user[column] for column in USER_COLUMNS)
+            )
+        except sqlite3.IntegrityError:
+            raise UserExists(user["name"]) from None
+
+    def update_user(self, user_id, **fields):
+        self._update("users", "id", user_id, fields)
+
+    def delete_user(self, user_id):
+        self._execute("users", "DELETE FROM users WHERE id = ?", (user_id,))
+
+    # --- Scores ---
+    def load_scores(self):
+        return self._query("SELECT id, user_id, score, date FROM scores ORDER BY rowid", SCORE_COLUMNS)
+
+    def add_scores(self, scores):
+        # One transaction for the whole batch
+        with self._connect() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO scores (id, user_id, score, date) VALUES (?, ?, ?, ?)",
+                [tuple(score[column] for column in SCORE_COLUMNS) for score in scores]
+            )
+        self.changes.bump("scores")
+        metrics.inc("quiz_storage_rows_written_total", max(cursor.rowcount, 0), description="Rows written to storage", backend="sqlite")
+
+    def load_scores_since(self, mark=None):
+        rewrites = self.changes.read("score_rewrites")
+        if mark is not None and mark[0] != rewrites:
+            return None
+        after = mark[1] if mark is not None else 0
+        # Rowids only grow while nothing is deleted, and deletes bump score_rewrites
+        rows = self._connect().execute(
+            "SELECT rowid, id, user_id, score, date FROM scores WHERE rowid > ? ORDER BY rowid", (after,)
+        ).fetchall()
+        metrics.inc("quiz_storage_rows_read_total", len(rows), description="Rows read from storage", backend="sqlite")
+        scores = pd.DataFrame([row[1:] for row in rows], columns=SCORE_COLUMNS)
+        return scores, (rewrites, rows[-1][0] if rows else after)
+
+    def _page_query(self, select, prefix, sort_by, descending, offset, limit, columns):
+        # A name range instead of LIKE so the unique index on users.name is used
+        where, params = "", []
+        if prefix:
+            where, params = "WHERE u.name >= ? AND u.name < ?", [prefix, prefix + "\U0010ffff"]
+        direction = "DESC" if descending else "ASC"
+        page = self._query(
+            f"{select} {where} ORDER BY {sort_by} {direction}, u.name LIMIT ? OFFSET ?",
+            columns, params + [limit, offset]
+        )
+        count_sql = f"SELECT COUNT(*) {select[select.index(' FROM '):]} {where}"
+        total = self._connect().execute(count_sql, params).fetchone()[0]
+        return page, total
+
+    def query_users(self, prefix="", sort_by="name", descending=False, offset=0, limit=50):
+        if sort_by not in USER_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort users by {sort_by}")
+        return self._page_query(
+            "SELECT u.id, u.name, u.role FROM users u",
+            prefix, f"u.{sort_by}", descending, offset, limit, USER_PAGE_COLUMNS
+        )
+
+    def update_scores(self, changes):
+        rows = [(int(score), str(date), score_id) for score_id, score, date in zip(changes["id"], changes["score"], changes["date"])]
+        # One transaction for the whole batch
+        with self._connect() as conn:
+            conn.executemany("UPDATE scores SET score = ?, date = ? WHERE id = ?", rows)
+        self.changes.bump("score_rewrites")
+        self.changes.bump("scores")
+        metrics.inc("quiz_storage_rows_written_total", len(rows), description="Rows written to storage", backend="sqlite")
+
+    def query_scores(self, prefix="", sort_by="date", descending=True, offset=0, limit=50):
+        if sort_by not in SCORE_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort scores by {sort_by}")
+        return self._page_query(
+            "SELECT s.id, s.user_id, u.name, s.score, s.date FROM scores s JOIN users u ON u.id = s.user_id",
+            prefix, "u.name" if sort_by == "name" else f"s.{sort_by}", descending, offset, limit, SCORE_PAGE_COLUMNS
+        )
+
+    def delete_scores_for_user(self, user_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM score_summaries WHERE user_id = ?", (user_id,))
+            cursor = conn.execute("DELETE FROM scores WHERE user_id = ?", (user_id,))
+        self.changes.bump("score_summaries")
+        self.changes.bump("score_rewrites")
+        self.changes.bump("scores")
+        metrics.inc("quiz_storage_rows_written_total", max(cursor.rowcount, 0), description="Rows written to storage", backend="sqlite")
+
+    # --- Score summaries ---
+    def load_score_summaries(self):
+        return self._query(
+            "SELECT user_id, period, games, total, best, best_date, days, recent FROM score_summaries ORDER BY period, user_id",
+            SUMMARY_COLUMNS
+        )
+
+    def compact_scores(self, summaries, score_ids):
+        periods = sorted(set(summaries["period"]))
+        # One transaction, so other processes see either the scores or their summaries, never both
+        with self._connect() as conn:
+            conn.execute("DELETE FROM score_summaries WHERE period IN (SELECT value FROM json_each(?))", (json.dumps(periods),))
+            conn.executemany(
+                "INSERT INTO score_summaries (user_id, period, games, total, best, best_date, days, recent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                summaries.reindex(columns=SUMMARY_COLUMNS).astype(object).itertuples(index=False, name=None)
+            )
+            cursor = conn.execute("DELETE FROM scores WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(list(score_ids)),))
+        self.changes.bump("score_summaries")
+        self.changes.bump("score_rewrites")
+        self.changes.bump("scores")
+        metrics.inc("quiz_storage_rows_written_total", len(summaries) + max(cursor.rowcount, 0),
+                    description="Rows written to storage", backend="sqlite")
+
+    # --- Questions ---
+    def load_questions(self):
+        return self._query(
+            "SELECT id, question, option_a, option_b, option_c, option_d, correct, media FROM questions ORDER BY id",
+            QUESTION_COLUMNS
+        )
+
+    def add_question(self, question):
+        cursor = self._execute(
+            "questions",
+            "INSERT INTO questions (question, option_a, option_b, option_c, option_d, correct, media) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            tuple(question.get(column) for column in QUESTION_COLUMNS[1:])
+        )
+        return cursor.lastrowid
+
+    def replace_questions(self, questions):
+        rows = [
+            (None if pd.isna(row["id"]) else int(row["id"]), *(row[column] for column in QUESTION_COLUMNS[1:]))
+            for row in questions.reindex(columns=QUESTION_COLUMNS).to_dict("records")
+        ]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM questions")
+            conn.executemany(
+                "INSERT INTO questions (id, question, option_a, option_b, option_c, option_d, correct, media) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        self.changes.bump("questions")
+
+    def upsert_questions(self, questions):
+        with self._connect() as conn:
+            # Take the write lock first so no other process adds a question between MAX(id) and the insert
+            conn.execute("BEGIN IMMEDIATE")
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM questions").fetchone()[0]
+            # IDs are assigned here rather than by SQLite, so a generated ID never collides with an explicit one
+            questions = _number_questions(questions, max_id)
+            rows = [
+                (int(row["id"]), *(row[column] for column in QUESTION_COLUMNS[1:]))
+                for row in questions.to_dict("records")
+            ]
+            ids = [row[0] for row in rows]
+            existing = {
+                question_id for (question_id,) in conn.execute(
+                    "SELECT id FROM questions WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),)
+                )
+            }
+            conn.executemany(
+                """INSERT INTO questions (id, question, option_a, option_b, option_c, option_d, correct, media)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    question = excluded.question, option_a = excluded.option_a, option_b = excluded.option_b,
+                    option_c = excluded.option_c, option_d = excluded.option_d, correct = excluded.correct,
+                    media = excluded.media""",
+                rows
+            )
+        self.changes.bump("questions")
+        updated = len(existing)
+        metrics.inc("quiz_storage_rows_written_total", len(rows), description="Rows written to storage", backend="sqlite")
+        return len(rows) - updated, updated
+
+    def delete_questions(self, question_ids):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM questions WHERE id = ?", [(int(question_id),) for question_id in question_ids])
+        self.changes.bump("questions")
+
+    def iter_questions(self, chunksize):
+        cursor = self._connect().execute(
+            "SELECT id, question, option_a, option_b, option_c, option_d, correct, media FROM questions ORDER BY id"
+        )
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            metrics.inc("quiz_storage_rows_read_total", len(rows), description="Rows read from storage", backend="sqlite")
+            yield pd.DataFrame(rows, columns=QUESTION_COLUMNS)
+
+    def load_questions_page(self, offset, limit):
+        return self._query(
+            "SELECT id, question, option_a, option_b, option_c, option_d, correct, media FROM questions ORDER BY id LIMIT ? OFFSET ?",
+            QUESTION_COLUMNS, (limit, offset)
+        )
+
+
+# --- Migration ---
+def migrate_csv_to_sqlite(csv_storage=None, sqlite_storage=None):
+    """Copy users, scores, score summaries and questions from the CSV files into SQLite.
+
+    Rows already present (same ID) are skipped, so running it twice is safe.
+    """
+    csv_storage = csv_storage or CSVStorage()
+    sqlite_storage = sqlite_storage or SQLiteStorage()
+
+    users = csv_storage.load_users().reindex(columns=USER_COLUMNS)
+    scores = csv_storage.load_scores().reindex(columns=SCORE_COLUMNS)
+    questions = csv_storage.load_questions().reindex(columns=QUESTION_COLUMNS)
+    summaries = csv_storage.load_score_summaries().reindex(columns=SUMMARY_COLUMNS)
+    users["role"] = users["role"].fillna("user")
+
+    with sqlite_storage._connect() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (id, name, password, role) VALUES (?, ?, ?, ?)",
+            users.astype(object).itertuples(index=False, name=None)
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO scores (id, user_id, score, date) VALUES (?, ?, ?, ?)",
+            scores.astype(object).itertuples(index=False, name=None)
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO score_summaries (user_id, period, games, total, best, best_date, days, recent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            summaries.astype(object).itertuples(index=False, name=None)
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO questions (id, question, option_a, option_b, option_c, option_d, correct, media) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            questions.astype(object).itertuples(index=False, name=None)
+        )
+    for table in ("users", "scores", "questions", "score_summaries"):
+        sqlite_storage.changes.bump(table)
+    return {"users": len(users), "scores": len(scores), "questions": len(questions)}
+
+
+def create_storage(backend=STORAGE_BACKEND, data_dir=DATA_DIR):
+    """Create the storage backend named by ``backend``"""
+    if backend == "sqlite":
+        return SQLiteStorage(data_dir=data_dir)
+    if backend == "csv":
+        return CSVStorage(data_dir)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        counts = migrate_csv_to_sqlite()
+        print(f"Migrated {counts['users']} users, {counts['scores']} scores and {counts['questions']} questions")
+    else:
+        print("Usage: python storage.py migrate")
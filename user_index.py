@@ -0,0 +1,69 @@
+"""In-memory hash index of user accounts.
+
+Login used to read users.csv and scan the ``name`` column several times per
+attempt. ``UserIndex`` maps usernames and IDs to a ``UserRecord`` so a login
+is a single dictionary lookup whatever the number of users.
+"""
+import threading
+from collections import namedtuple
+
+UserRecord = namedtuple("UserRecord", ["id", "name", "password", "role"])
+
+
+class UserIndex:
+    """Username and ID lookups for user accounts"""
+
+    def __init__(self):
+        self._by_name = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def rebuild(self, users):
+        """Replace the index contents from a users DataFrame"""
+        by_name = {}
+        by_id = {}
+        for user_id, name, password, role in zip(users["id"], users["name"], users["password"], users["role"]):
+            record = UserRecord(str(user_id), str(name), password, role)
+            by_id[record.id] = record
+            # Keep the first account if a name was ever stored twice
+            by_name.setdefault(record.name, record)
+        with self._lock:
+            self._by_name = by_name
+            self._by_id = by_id
+
+    def put(self, user_id, name, password, role):
+        """Add or replace a user"""
+        record = UserRecord(str(user_id), name, password, role)
+        with self._lock:
+            self._by_id[record.id] = record
+            self._by_name.setdefault(record.name, record)
+
+    def update(self, user_id, **fields):
+        """Change some fields of a user"""
+        with self._lock:
+            record = self._by_id.get(user_id)
+            if record is None:
+                return
+            updated = record._replace(**fields)
+            self._by_id[user_id] = updated
+            if self._by_name.get(record.name) is record:
+                del self._by_name[record.name]
+            self._by_name.setdefault(updated.name, updated)
+
+    def remove(self, user_id):
+        """Forget a user"""
+        with self._lock:
+            record = self._by_id.pop(user_id, None)
+            if record is not None and self._by_name.get(record.name) is record:
+                del self._by_name[record.name]
+
+    def get(self, name):
+        """Return the UserRecord for a username, or None"""
+        return self._by_name.get(name)
+
+    def get_by_id(self, user_id):
+        """Return the UserRecord for a user ID, or None"""
+        return self._by_id.get(user_id)
@@ -1,154 +1,610 @@
-import pandas as pd
 import os
-import hashlib
-import uuid
+import random
+import threading
+
+import pandas as pd
+
+import bulk_io
+import metrics
+import retention
+from answer_log import ANSWERS, CORRECT, SECONDS, TIMEOUTS, AnswerLog
+from cache import TableCache
+from difficulty import DifficultyIndex, difficulty_from_totals
+from metrics import timed
+from passwords import hash_password, verify_password
+from player_stats import PlayerStatsIndex
+from ranking import LeaderboardIndex, WindowedLeaderboard
+from score_writer import FlushTimeout, ScoreWriter
+from storage import SCORE_COLUMNS, UserExists, create_storage, new_id
+from user_index import UserIndex
+
+# --- Storage backend ---
+_storage = None
+_cache = TableCache()
+
+def get_storage():
+    """Return the process-wide storage backend, creating it on first use"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+def _load(table):
+    """Load a table through the shared cache; the DataFrame is shared, so copy it before changing it"""
+    storage = get_storage()
+    loader = getattr(storage, f"load_{table}")
+    return _cache.get(table, storage.signature(table), loader)
+
+def _invalidate(table):
+    """Drop a cached table after writing to it"""
+    _cache.invalidate(table)
+
+def _own_writes(before, after):
+    """True if one write of our own is the only change between two signatures of a table.
 
-# --- File paths ---
-USERS_FILE = "data/users.csv"
-SCORES_FILE = "data/scores.csv"
-QUESTIONS_FILE = "data/questions.csv"
+    Another process writing in between advances the change counter further, and the
+    in-memory index must then be rebuilt rather than patched.
+    """
+    return after[0] - before[0] == 1
+
+def cache_stats():
+    """Return hit/miss counters of the shared table cache"""
+    return _cache.stats()
+
+for _stat in ("hits", "misses", "evictions", "invalidations", "entries", "bytes"):
+    metrics.gauge(
+        f"quiz_cache_{_stat}",
+        lambda stat=_stat: {(): _cache.stats()[stat]},
+        description=f"Table cache {_stat}"
+    )
 
 # --- User management functions ---
+@timed("quiz_data")
 def load_users():
-    """Load users from CSV or create it if it doesn't exist"""
-    if not os.path.exists(USERS_FILE):
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(USERS_FILE), exist_ok=True)
-        
-        # Create empty users file with columns
-        users = pd.DataFrame(columns=["id", "name", "password", "role"])
-        users.to_csv(USERS_FILE, index=False)
-        return users
-    else:
-        return pd.read_csv(USERS_FILE)
+    """Load all users"""
+    return _load("users")
+
+# Username/ID index kept in step with writes made through utils
+_user_index = UserIndex()
+_user_index_signature = None  # Users signature the index was built from
+_user_index_lock = threading.RLock()
+
+def _ensure_user_index():
+    """Rebuild the user index if users changed outside utils"""
+    global _user_index_signature
+    with _user_index_lock:
+        signature = get_storage().signature("users")
+        if _user_index_signature != signature:
+            _user_index.rebuild(load_users())
+            _user_index_signature = signature
+    return _user_index
+
+def _write_users(write, apply):
+    """Run a storage write and apply the same change to the user index"""
+    global _user_index_signature
+    storage = get_storage()
+    with _user_index_lock:
+        before = storage.signature("users")
+        in_sync = _user_index_signature == before
+        write(storage)
+        _invalidate("users")
+        after = storage.signature("users")
+        if in_sync and _own_writes(before, after):
+            apply(_user_index)
+            _user_index_signature = after
 
+@timed("quiz_data")
 def save_user(username, password, role="user"):
-    """Save a new user to the users file"""
-    users = load_users()
-    
+    """Save a new user and return their ID, raising ``UserExists`` if the name is taken"""
     # Create a unique ID
-    user_id = str(uuid.uuid4())
-    
-    # Hash the password
-    hashed_password = hashlib.sha256(password.encode()).hexdigest()
-    
-    # Add the new user
-    new_user = pd.DataFrame({
-        "id": [user_id],
-        "name": [username],
-        "password": [hashed_password],
-        "role": [role]
-    })
-    
-    users = pd.concat([users, new_user], ignore_index=True)
-    users.to_csv(USERS_FILE, index=False)
-    
+    user_id = new_id()
+    user = {
+        "id": user_id,
+        "name": username,
+        "password": hash_password(password),
+        "role": role
+    }
+
+    _write_users(
+        lambda storage: storage.add_user(user),
+        lambda index: index.put(user_id, username, user["password"], role)
+    )
+
     return user_id
 
+@timed("quiz_data")
+def update_user_role(user_id, role):
+    """Change a user's role"""
+    _write_users(
+        lambda storage: storage.update_user(user_id, role=role),
+        lambda index: index.update(user_id, role=role)
+    )
+
+@timed("quiz_data")
+def update_user_password(user_id, password):
+    """Replace a user's password"""
+    hashed_password = hash_password(password)
+    _write_users(
+        lambda storage: storage.update_user(user_id, password=hashed_password),
+        lambda index: index.update(user_id, password=hashed_password)
+    )
+
+@timed("quiz_data")
+def delete_user(user_id):
+    """Delete a user"""
+    _write_users(
+        lambda storage: storage.delete_user(user_id),
+        lambda index: index.remove(user_id)
+    )
+    _leaderboard.remove_user(user_id)
+    _windowed_leaderboard.remove_user(user_id)
+    _player_stats.remove_user(user_id)
+
+@timed("quiz_data")
+def search_users(prefix="", sort_by="name", descending=False, offset=0, limit=50):
+    """Return one page of users (id, name, role) whose name starts with ``prefix``, and the match count"""
+    return get_storage().query_users(prefix, sort_by, descending, offset, limit)
+
+def find_user(username):
+    """Return the UserRecord (id, name, password, role) for a username, or None"""
+    return _ensure_user_index().get(username)
+
+def user_count():
+    """Return the number of registered users"""
+    return len(_ensure_user_index())
+
+@timed("quiz_data")
+def authenticate(username, password):
+    """Check credentials and return the user's UserRecord, or None"""
+    user = find_user(username)
+    if user is None:
+        return None
+    matches, needs_rehash = verify_password(password, user.password)
+    if not matches:
+        return None
+    if needs_rehash:
+        # Upgrade legacy or outdated hashes now that we know the password
+        update_user_password(user.id, password)
+        user = find_user(username)
+    return user
+
 def verify_login(username, password):
     """Verify login credentials"""
-    users = load_users()
-    
-    # Check if username exists
-    if username not in users["name"].values:
-        return False
-    
-    # Get stored password
-    hashed_password = hashlib.sha256(password.encode()).hexdigest()
-    stored_password = users.loc[users["name"] == username, "password"].values[0]
-    
-    return hashed_password == stored_password
+    return authenticate(username, password) is not None
 
 def get_user_id(username):
     """Get user ID from username"""
-    users = load_users()
-    if username in users["name"].values:
-        return users.loc[users["name"] == username, "id"].values[0]
-    return None
+    user = find_user(username)
+    return user.id if user is not None else None
 
 # --- Score management functions ---
+# Scores are written by a background writer unless QUIZ_WRITE_BEHIND=0
+WRITE_BEHIND = os.environ.get("QUIZ_WRITE_BEHIND", "1") != "0"
+# Each worker process sharing the data directory keeps its own journal
+WORKER_ID = os.environ.get("QUIZ_WORKER_ID")
+SCORE_JOURNAL = f"scores-{WORKER_ID}.journal" if WORKER_ID else "scores.journal"
+_score_writer = None
+_score_writer_lock = threading.Lock()
+
+def _get_score_writer():
+    """Return the background score writer, starting it on first use"""
+    global _score_writer
+    if not WRITE_BEHIND:
+        return None
+    with _score_writer_lock:
+        if _score_writer is None:
+            storage = get_storage()
+            writer = ScoreWriter(_commit_scores, os.path.join(storage.data_dir, SCORE_JOURNAL))
+            # Queues scores left in the journal by a crash; the writer thread commits them
+            writer.start(committed_ids=storage.load_scores()["id"])
+            _score_writer = writer
+    return _score_writer
+
+def _commit_scores(rows):
+    """Write a batch of queued scores to storage (runs on the writer thread)"""
+    # The indexes already hold these scores from save_score, so no lock is needed
+    get_storage().add_scores(rows)
+    _invalidate("scores")
+
+def score_queue_depth():
+    """Return the number of scores waiting to be written"""
+    return len(_score_writer.pending()) if _score_writer is not None else 0
+
+metrics.gauge("quiz_score_queue_depth", lambda: {(): score_queue_depth()}, description="Scores waiting to be written")
+
+def flush_scores():
+    """Wait until every queued score has reached storage; raises FlushTimeout if they do not"""
+    if _score_writer is not None and not _score_writer.flush():
+        # Rewriting or compacting the table now would leave the queued scores behind
+        raise FlushTimeout(f"{score_queue_depth()} score(s) are still waiting to be written, try again shortly")
+
+@timed("quiz_data")
 def load_scores():
-    """Load scores from CSV or create it if it doesn't exist"""
-    if not os.path.exists(SCORES_FILE):
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(SCORES_FILE), exist_ok=True)
-        
-        # Create empty scores file with columns
-        scores = pd.DataFrame(columns=["user_id", "score", "date"])
-        scores.to_csv(SCORES_FILE, index=False)
-        return scores
-    else:
-        return pd.read_csv(SCORES_FILE)
+    """Load all scores, including ones still queued for writing"""
+    writer = _get_score_writer()
+    # Take the queue snapshot first so a batch committed in between is not missed
+    pending = writer.pending() if writer is not None else []
+    return _with_pending(_load("scores"), pending)
+
+def _with_pending(scores, pending):
+    """Add queued score rows to scores loaded from storage"""
+    if pending:
+        scores = pd.concat([scores, pd.DataFrame(pending, columns=SCORE_COLUMNS)], ignore_index=True)
+        # A batch can be in storage and still listed as pending for a moment
+        scores = scores.drop_duplicates(subset=["id"])
+    return scores
+
+@timed("quiz_data")
+def search_scores(prefix="", sort_by="date", descending=True, offset=0, limit=50):
+    """Return one page of scores whose player name starts with ``prefix``, and the match count"""
+    # Queued scores are written first so the page and the count include them
+    flush_scores()
+    return get_storage().query_scores(prefix, sort_by, descending, offset, limit)
 
+@timed("quiz_data")
 def save_score(user_id, score, date):
-    """Save a user's score to the scores file"""
-    scores = load_scores()
-    
-    # Add the new score
-    new_score = pd.DataFrame({
-        "user_id": [user_id],
-        "score": [score],
-        "date": [date]
-    })
-    
-    scores = pd.concat([scores, new_score], ignore_index=True)
-    scores.to_csv(SCORES_FILE, index=False)
+    """Save a user's score"""
+    writer = _get_score_writer()
+    row = {
+        "id": new_id(),
+        "user_id": user_id,
+        "score": int(score),
+        "date": date
+    }
+    with _leaderboard_lock:
+        if _leaderboard_mark is not None:
+            # Keep the indexes current instead of reading the score back on the next view
+            _index_score(row)
+            _indexed_unread.add(row["id"])
+    if writer is not None:
+        writer.submit(row)
+        return
+    try:
+        get_storage().add_score(row)
+    except BaseException:
+        _mark_leaderboard_stale()
+        raise
+    _invalidate("scores")
+
+@timed("quiz_data")
+def update_scores(changes):
+    """Apply edited scores, a DataFrame of (id, score, date) keyed by score ID, in one batch"""
+    # Cleared cells are left as they were
+    changes = changes.dropna(subset=["score", "date"])
+    if changes.empty:
+        return
+    flush_scores()
+    get_storage().update_scores(changes)
+    _invalidate("scores")
+    _mark_leaderboard_stale()
+
+@timed("quiz_data")
+def delete_user_scores(user_id):
+    """Delete every score recorded for a user, archived ones included"""
+    flush_scores()
+    get_storage().delete_scores_for_user(user_id)
+    retention.purge_user(user_id)
+    _invalidate("scores")
+    _invalidate("score_summaries")
+    _leaderboard.remove_user(user_id)
+    _windowed_leaderboard.remove_user(user_id)
+    _player_stats.remove_user(user_id)
+
+# --- Leaderboard and player statistics functions ---
+# These indexes are kept in step with the scores table and share one signature
+_leaderboard = LeaderboardIndex()
+_windowed_leaderboard = WindowedLeaderboard()
+_player_stats = PlayerStatsIndex()
+_leaderboard_signature = None  # Scores signature the indexes are up to date with
+_leaderboard_mark = None  # Storage high-water mark of the scores read into the indexes
+_indexed_unread = set()  # IDs of our own scores already indexed but not yet read back past the mark
+_leaderboard_lock = threading.RLock()
+
+def _index_score(row):
+    _leaderboard.add(str(row["user_id"]), row["score"], row["date"])
+    _windowed_leaderboard.add(str(row["user_id"]), row["score"], row["date"])
+    _player_stats.add(str(row["user_id"]), row["score"], row["date"])
+
+@timed("quiz_data")
+def rebuild_leaderboard():
+    """Rebuild the best-score index and the player statistics from storage"""
+    global _leaderboard_signature, _leaderboard_mark, _indexed_unread
+    storage = get_storage()
+    writer = _get_score_writer()
+    with _leaderboard_lock:
+        signature = storage.signature("scores")
+        # Take the queue snapshot first so a batch committed in between is not missed
+        pending = writer.pending() if writer is not None else []
+        scores, mark = storage.load_scores_since()
+        scores = _with_pending(scores, pending)
+        users = load_users()
+        scores["user_id"] = scores["user_id"].astype(str)
+        # Scores of deleted users never show up on the leaderboard
+        scores = scores[scores["user_id"].isin(users["id"].astype(str))]
+        # Compacted scores are counted through their monthly summaries
+        summaries = _load("score_summaries")
+        summaries = summaries[summaries["user_id"].astype(str).isin(users["id"].astype(str))]
+        _leaderboard.rebuild(scores, summaries)
+        _windowed_leaderboard.rebuild(scores)
+        _player_stats.rebuild(scores, summaries)
+        _leaderboard_signature = signature
+        _leaderboard_mark = mark
+        # Queued scores are indexed now, and will turn up past the mark once written
+        _indexed_unread = {row["id"] for row in pending}
+
+def _mark_leaderboard_stale():
+    global _leaderboard_signature, _leaderboard_mark
+    with _leaderboard_lock:
+        _leaderboard_signature = None
+        _leaderboard_mark = None
+
+def _ensure_leaderboard():
+    """Bring the indexes up to date with scores written since they were last read"""
+    global _leaderboard_signature, _leaderboard_mark
+    storage = get_storage()
+    with _leaderboard_lock:
+        signature = storage.signature("scores")
+        if _leaderboard_signature == signature:
+            return
+        appended = storage.load_scores_since(_leaderboard_mark) if _leaderboard_mark is not None else None
+        if appended is None:
+            # Scores were edited, deleted or compacted: only a full rebuild is right
+            rebuild_leaderboard()
+            return
+        # Usually a few scores from other workers, or our own batches coming back
+        scores, _leaderboard_mark = appended
+        users = _ensure_user_index()
+        for row in scores.to_dict("records"):
+            if row["id"] in _indexed_unread:
+                _indexed_unread.discard(row["id"])
+            elif users.get_by_id(str(row["user_id"])) is not None:
+                _index_score(row)
+        _leaderboard_signature = signature
+
+@timed("quiz_data")
+def get_top_scores(limit=None, window="all"):
+    """Return each player's best score, best first, with columns name, score, date, user_id.
+
+    ``window`` is "all", or "today", "week" or "month" for the current period only.
+    """
+    _ensure_leaderboard()
+    users = _ensure_user_index()
+    top = _leaderboard.top(limit) if window == "all" else _windowed_leaderboard.top(window, limit)
+    rows = [
+        (users.get_by_id(user_id).name, score, date, user_id)
+        for user_id, score, date in top
+        if users.get_by_id(user_id) is not None
+    ]
+    return pd.DataFrame(rows, columns=["name", "score", "date", "user_id"])
+
+@timed("quiz_data")
+def get_player_stats(user_id):
+    """Return a player's statistics (attempts, best, average, streaks, trend, recent), or None"""
+    _ensure_leaderboard()
+    return _player_stats.get(str(user_id))
+
+# --- Score retention functions ---
+@timed("quiz_data")
+def compact_scores(now=None):
+    """Move scores older than the retention period into summaries and the archive; returns {period: count}"""
+    flush_scores()
+    archived = retention.compact(get_storage(), now)
+    if archived:
+        _invalidate("scores")
+        _invalidate("score_summaries")
+        _mark_leaderboard_stale()
+    return archived
+
+def archive_overview():
+    """Return the archived months with their games, players and file size"""
+    summaries = _load("score_summaries")
+    counts = summaries.groupby("period").agg(games=("games", "sum"), players=("user_id", "nunique"))
+    rows = [
+        (period, int(counts.at[period, "games"]) if period in counts.index else 0,
+         int(counts.at[period, "players"]) if period in counts.index else 0, size)
+        for period, _, size in retention.list_partitions()
+    ]
+    return pd.DataFrame(rows, columns=["period", "games", "players", "bytes"])
+
+def export_archived_scores(fmt, periods=None):
+    """Return the archived scores of ``periods`` (all if None) as CSV, JSON Lines or Parquet bytes"""
+    return retention.export_archive_bytes(fmt, periods)
 
 # --- Question management functions ---
+@timed("quiz_data")
 def load_questions():
-    """Load questions from CSV or create a sample file if it doesn't exist"""
-    if not os.path.exists(QUESTIONS_FILE):
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(QUESTIONS_FILE), exist_ok=True)
-        
-        # Create sample questions file
-        questions = pd.DataFrame({
-            "question": [
-                "Which of these is NOT one of the four parts in traditional hymn singing?",
-                "Who composed 'Amazing Grace'?",
-                "What instrument is traditionally used to lead congregational singing?",
-                "Which book of the Bible contains most of the Psalms?",
-                "What is the term for a song of praise to God?"
-            ],
-            "option_a": [
-                "Soprano", 
-                "John Newton", 
-                "Piano", 
-                "Proverbs", 
-                "Hymn"
-            ],
-            "option_b": [
-                "Alto", 
-                "Charles Wesley", 
-                "Guitar", 
-                "Psalms", 
-                "Anthem"
-            ],
-            "option_c": [
-                "Tenor", 
-                "Isaac Watts", 
-                "Organ", 
-                "Ecclesiastes", 
-                "Spiritual"
-            ],
-            "option_d": [
-                "Baritone", 
-                "Fanny Crosby", 
-                "Trumpet", 
-                "Song of Solomon", 
-                "Carol"
-            ],
-            "correct": ["D", "A", "C", "B", "A"]
-        })
-        questions.to_csv(QUESTIONS_FILE, index=False)
-        return questions
-    else:
-        return pd.read_csv(QUESTIONS_FILE)
+    """Load all questions, creating the sample questions if there are none yet"""
+    return _load("questions")
+
+# Shared question bank: (signature, question IDs, questions by ID)
+_question_bank = (None, [], {})
+
+def _get_question_bank():
+    """Return the question bank, reloading it only when the questions change"""
+    global _question_bank
+    signature = get_storage().signature("questions")
+    if _question_bank[0] != signature:
+        records = load_questions().to_dict("records")
+        ids = [int(record["id"]) for record in records]
+        _question_bank = (signature, ids, dict(zip(ids, records)))
+    return _question_bank
+
+def question_count():
+    """Return the number of questions in the bank"""
+    return len(_get_question_bank()[1])
+
+@timed("quiz_data")
+def draw_question_deck(size):
+    """Draw ``size`` distinct question IDs at random"""
+    ids = _get_question_bank()[1]
+    # Sampling positions from a range costs O(size), however big the bank is
+    positions = random.sample(range(len(ids)), min(size, len(ids)))
+    return [ids[i] for i in positions]
+
+@timed("quiz_data")
+def get_question(question_id):
+    """Return a question as a dict, or None if it no longer exists"""
+    return _get_question_bank()[2].get(question_id)
+
+@timed("quiz_data")
+def add_question(question, option_a, option_b, option_c, option_d, correct, media=None):
+    """Add a single question, with an optional audio clip reference, and return its ID"""
+    question_id = get_storage().add_question({
+        "question": question,
+        "option_a": option_a,
+        "option_b": option_b,
+        "option_c": option_c,
+        "option_d": option_d,
+        "correct": correct,
+        "media": media or None
+    })
+    _invalidate("questions")
+    return question_id
+
+@timed("quiz_data")
+def save_questions(questions):
+    """Replace the whole question bank"""
+    get_storage().replace_questions(questions)
+    _invalidate("questions")
+
+@timed("quiz_data")
+def load_question_page(offset, limit):
+    """Return ``limit`` questions starting at position ``offset``, and the total count"""
+    # Only the page is read from storage; the count comes from the question bank
+    return get_storage().load_questions_page(offset, limit), question_count()
+
+@timed("quiz_data")
+def upsert_questions(questions):
+    """Update the given questions by ID and add any without one; returns (inserted, updated)"""
+    counts = get_storage().upsert_questions(questions)
+    _invalidate("questions")
+    return counts
+
+@timed("quiz_data")
+def delete_questions(question_ids):
+    """Delete questions by ID"""
+    get_storage().delete_questions(question_ids)
+    _invalidate("questions")
+
+@timed("quiz_data")
+def import_questions(source, fmt, on_progress=None):
+    """Stream questions from a CSV, JSON Lines or Parquet file into the bank"""
+    try:
+        return bulk_io.import_questions(source, fmt, get_storage(), on_progress=on_progress)
+    finally:
+        # Earlier chunks are already stored even if a later one failed
+        _invalidate("questions")
+
+@timed("quiz_data")
+def export_questions(fmt):
+    """Export the whole question bank as CSV, JSON Lines or Parquet; use as ``with export_questions(fmt) as f``"""
+    return bulk_io.exported_questions(fmt, get_storage())
+
+
+# --- Answer analytics functions ---
+_answer_log = None
+_answer_log_lock = threading.Lock()
+
+def _get_answer_log():
+    """Return the answer event log, starting its background thread on first use"""
+    global _answer_log
+    with _answer_log_lock:
+        if _answer_log is None:
+            data_dir = get_storage().data_dir
+            # Workers share the log but each keeps its own compacted totals
+            stats_file = f"question_stats-{WORKER_ID}.json" if WORKER_ID else "question_stats.json"
+            log = AnswerLog(os.path.join(data_dir, "answers.log"), os.path.join(data_dir, stats_file))
+            log.add_listener(_update_difficulty)
+            log.start()
+            _answer_log = log
+    return _answer_log
+
+def record_answer(user_id, question_id, choice, seconds, correct):
+    """Log one answer (``choice`` None for a timeout) without waiting for the disk"""
+    _get_answer_log().record(user_id, question_id, choice, seconds, correct)
+
+metrics.gauge(
+    "quiz_answer_events_pending",
+    lambda: {(): _answer_log.pending() if _answer_log is not None else 0},
+    description="Answer events waiting to be written"
+)
+
+@timed("quiz_data")
+def compact_answer_log():
+    """Write buffered answer events and fold them into the question statistics now"""
+    log = _get_answer_log()
+    log.flush()
+    log.compact()
+
+@timed("quiz_data")
+def get_question_stats(question_ids=None):
+    """Return answers, accuracy, average response time and timeouts per question ID"""
+    totals = _get_answer_log().question_stats()
+    if question_ids is None:
+        question_ids = list(totals)
+    rows = []
+    for question_id in question_ids:
+        entry = totals.get(int(question_id))
+        if entry is None:
+            rows.append((question_id, 0, None, None, 0))
+            continue
+        answers = entry[ANSWERS]
+        rows.append((
+            question_id,
+            answers,
+            entry[CORRECT] / answers if answers else None,
+            entry[SECONDS] / answers if answers else None,
+            entry[TIMEOUTS]
+        ))
+    return pd.DataFrame(rows, columns=["id", "answers", "accuracy", "avg_seconds", "timeouts"])
+
+
+# --- Adaptive question selection ---
+_difficulty_index = DifficultyIndex()
+_difficulty_signature = None  # Questions signature the index was built from
+_difficulty_lock = threading.RLock()
+
+def _question_difficulty(totals):
+    if totals is None:
+        return difficulty_from_totals(0, 0, 0)
+    return difficulty_from_totals(totals[ANSWERS], totals[CORRECT], totals[TIMEOUTS])
+
+def _ensure_difficulty_index():
+    """Rebuild the difficulty index when the question bank changes"""
+    global _difficulty_signature
+    with _difficulty_lock:
+        signature, ids, _ = _get_question_bank()
+        if _difficulty_signature != signature:
+            totals = _get_answer_log().question_stats()
+            _difficulty_index.rebuild({question_id: _question_difficulty(totals.get(question_id)) for question_id in ids})
+            _difficulty_signature = signature
+    return _difficulty_index
+
+def _update_difficulty(changed):
+    """Move questions whose answer statistics changed (runs after each log compaction)"""
+    with _difficulty_lock:
+        if _difficulty_signature is None:
+            return
+        bank = _get_question_bank()[2]
+        for question_id, totals in changed.items():
+            if question_id in bank:
+                _difficulty_index.set(question_id, _question_difficulty(totals))
+
+@timed("quiz_data")
+def pick_adaptive_question(correct, answered, exclude=()):
+    """Return a question ID matched to a player's running accuracy, not in ``exclude``"""
+    # Smoothed accuracy, so the first question is of middling difficulty
+    accuracy = (correct + 1) / (answered + 2)
+    # Stronger players get questions more players miss
+    target = 0.1 + 0.8 * accuracy
+    return _ensure_difficulty_index().pick(target, exclude=set(exclude))
 
 
 # Add this to utils.py
 def create_admin_if_not_exists():
     """Create an admin user if one doesn't exist"""
-    users = load_users()
-    if "admin" not in users["role"].values:
-        save_user("admin", "admin123", role="admin")  # Default admin credentials
\ No newline at end of file
+    # Held across processes, so workers starting together create it once
+    with get_storage().locked():
+        users = load_users()
+        if "admin" not in users["role"].values:
+            save_user("admin", "admin123", role="admin")  # Default admin credentials
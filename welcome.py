@@ -1,4 +1,5 @@
 import streamlit as st
+from assets import SOURCE_IMAGE, welcome_image_html
 
 # In your welcome page function
 def show_welcome():
@@ -37,19 +38,30 @@ def show_welcome():
             
             # Add logout option
             if st.button("Logout", key="logout_button"):
-                # Clear session state variables related to login
-                for key in ["logged_in", "username", "user_id", "score", "question_index"]:
-                    if key in st.session_state:
+                # Clear session state, keeping scores still waiting to be saved
+                for key in list(st.session_state.keys()):
+                    if key not in ("page", "deferred_scores"):
                         del st.session_state[key]
+                st.session_state.logged_in = False
                 st.session_state.page = "welcome"
                 st.experimental_rerun()
         
     with col2:
-         st.image("data/church_quiz.jpg", use_column_width=True)
+        show_welcome_image()
     
     # Footer
     st.markdown("---")
     st.markdown("© 2025 Church Music Quiz Game")
 
+def show_welcome_image():
+    """Show the pre-built, browser-cached image variants, or the original if they cannot be served"""
+    if st.get_option("server.enableStaticServing"):
+        try:
+            st.markdown(welcome_image_html(), unsafe_allow_html=True)
+            return
+        except (ImportError, OSError):
+            pass
+    st.image(SOURCE_IMAGE, use_column_width=True)
+
 def set_page(page):
     st.session_state.page = page
\ No newline at end of file
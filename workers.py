@@ -0,0 +1,114 @@
+"""Run several app processes against one data directory.
+
+One Streamlit process runs every user's script on one interpreter, so it
+uses about one CPU core. To use more cores, start several workers::
+
+    python workers.py --workers 4 --port 8501
+
+Worker ``i`` listens on ``port + i`` and gets ``QUIZ_WORKER_ID=i``, which gives
+it its own score journal and answer statistics file. Storage defaults to
+SQLite, which handles concurrent writers; with CSV the workers serialize
+every write on ``data/.lock``. Each write bumps a per-table counter in
+``data/changes.seq`` (see ``changes.py``), so every worker drops its cached
+tables and rebuilds its user and difficulty indexes when another worker
+changes them; new scores from other workers are read past a high-water mark
+and added to the leaderboard indexes without a rebuild. If
+``QUIZ_METRICS_PORT`` is set, worker ``i`` serves metrics on that port + i;
+``QUIZ_METRICS_FILE`` becomes one file per worker (see ``metrics.py``).
+
+Put a reverse proxy in front that keeps each browser on one worker, because
+a Streamlit session lives in the process that created it, that passes the
+websocket upgrade through, and that sets ``X-Forwarded-For``: workers trust
+it (``QUIZ_TRUST_FORWARDED=1``) to tell players apart for rate limiting
+(see ``ratelimit.py``), so keep them listening on a local address only the
+proxy can reach. For nginx::
+
+    upstream quiz {
+        ip_hash;
+        server 127.0.0.1:8501;
+        server 127.0.0.1:8502;
+    }
+    server {
+        listen 80;
+        location / {
+            proxy_pass http://quiz;
+            proxy_http_version 1.1;
+            proxy_set_header Upgrade $http_upgrade;
+            proxy_set_header Connection "upgrade";
+            proxy_set_header Host $host;
+            proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+            proxy_read_timeout 86400;
+        }
+    }
+
+Live rooms (``rooms.py``) are held in memory by the worker that created
+them, so players can only join rooms on their own worker. For events where
+players on different networks join one room, run a single worker.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def worker_env(worker_id, base_env=None):
+    """Return the environment for worker ``worker_id``"""
+    env = dict(os.environ if base_env is None else base_env)
+    env["QUIZ_WORKER_ID"] = str(worker_id)
+    env.setdefault("QUIZ_STORAGE", "sqlite")
+    # Behind the proxy every request comes from the proxy's address
+    env.setdefault("QUIZ_TRUST_FORWARDED", "1")
+    if env.get("QUIZ_METRICS_PORT"):
+        env["QUIZ_METRICS_PORT"] = str(int(env["QUIZ_METRICS_PORT"]) + worker_id)
+    return env
+
+
+def start_workers(count, port, address="127.0.0.1"):
+    """Start ``count`` Streamlit processes on consecutive ports and return them"""
+    processes = []
+    for worker_id in range(count):
+        command = [
+            sys.executable, "-m", "streamlit", "run", APP,
+            "--server.port", str(port + worker_id),
+            "--server.address", address,
+            "--server.headless", "true",
+        ]
+        processes.append(subprocess.Popen(command, env=worker_env(worker_id)))
+    return processes
+
+
+def stop_workers(processes, timeout=10):
+    """Terminate the workers, killing any that do not exit within ``timeout`` seconds"""
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        try:
+            process.wait(max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several quiz app workers sharing one data directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=8501, help="Port of the first worker")
+    parser.add_argument("--address", default="127.0.0.1")
+    args = parser.parse_args()
+
+    processes = start_workers(args.workers, args.port, args.address)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Started {args.workers} workers on ports {args.port}-{args.port + args.workers - 1}")
+    try:
+        # Stop everything if any worker dies, so a supervisor can restart the set
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(processes)